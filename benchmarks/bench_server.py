@@ -0,0 +1,249 @@
+# Bộ benchmark cho các đường nóng của web_version/server.py, chạy qua Flask test client.
+#
+#   python benchmarks/bench_server.py --output bench.json
+#   python benchmarks/bench_server.py --baseline bench.json --output bench-new.json
+#
+# Sinh viên giả lập được sinh từ web_version/data/subjects.json cho từng mô hình nam1..nam4.
+# Mỗi workload báo cáo độ trễ p50/p95/p99, số request/giây và bộ nhớ đỉnh.
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SUBJECTS_JSON_PATH = ROOT / 'web_version' / 'data' / 'subjects.json'
+YEARS = ['nam1', 'nam2', 'nam3', 'nam4']
+LETTERS = 'ABCDF'
+WORKLOADS = ['single', 'batch', 'export', 'export-fast', 'export-batch']
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# Danh sách môn của từng năm: theo feature_names_in_ của mô hình nếu tải được,
+# nếu không thì lấy các môn thuộc học kỳ <= 2 * năm
+def year_subjects(server, subjects):
+    by_name = {s['tenHocPhan']: s for s in subjects}
+    result = {}
+    for i, year in enumerate(YEARS, 1):
+        model = server.load_model(year)
+        names = list(getattr(model, 'feature_names_in_', []))
+        selected = [by_name[name] for name in names if name in by_name]
+        result[year] = selected or [s for s in subjects if s['hocKy'] <= 2 * i]
+    return result
+
+
+class StudentGenerator:
+    def __init__(self, subjects_by_year, seed):
+        self.subjects_by_year = subjects_by_year
+        self.rng = random.Random(seed)
+
+    def scores(self, year):
+        subjects = self.subjects_by_year[year]
+        # Bỏ ngẫu nhiên vài môn để mô phỏng bảng điểm chưa đầy đủ
+        taken = [s for s in subjects if self.rng.random() > 0.1] or subjects[:1]
+        return [{
+            'subjectCode': s['maHocPhan'],
+            'subjectName': s['tenHocPhan'],
+            'credits': s['soTinChi'],
+            'semester': s['hocKy'],
+            'score': self.rng.choice(LETTERS)
+        } for s in taken]
+
+    def student(self, i, year=None):
+        year = year or self.rng.choice(YEARS)
+        return {'id': f'SV{i:06d}', 'name': f'Sinh viên {i}', 'year': year, 'scores': self.scores(year)}
+
+
+# Mỗi workload trả về một hàm sinh (request_fn, số sinh viên trong một request)
+def make_requests(workload, generator, args):
+    if workload == 'single':
+        def request_fn(client, i):
+            student = generator.student(i)
+            return client.post('/api/submit', json={'year': student['year'], 'scores': student['scores']})
+        return request_fn, 1
+    if workload == 'batch':
+        def request_fn(client, i):
+            students = [generator.student(i * args.batch_size + j) for j in range(args.batch_size)]
+            return client.post('/api/predict-batch', json={'students': students})
+        return request_fn, args.batch_size
+    if workload in ('export', 'export-fast'):
+        def request_fn(client, i):
+            student = generator.student(i, year='nam4')
+            payload = {'year': 'nam4', 'scores': student['scores']}
+            if workload == 'export-fast':
+                payload['mode'] = 'fast'
+            return client.post('/api/export-excel', json=payload)
+        return request_fn, 1
+    if workload == 'export-batch':
+        def request_fn(client, i):
+            students = [generator.student(i * args.export_batch_size + j, year='nam4') for j in range(args.export_batch_size)]
+            return client.post('/api/export-excel-batch', json={'students': students, 'layout': 'class'})
+        return request_fn, args.export_batch_size
+    raise ValueError(f"Workload không hợp lệ: {workload}")
+
+
+def run_workload(client, workload, generator, args):
+    request_fn, students_per_request = make_requests(workload, generator, args)
+    iterations = args.iterations if workload in ('single', 'export', 'export-fast') else max(1, args.iterations // 20)
+
+    for i in range(args.warmup):
+        request_fn(client, -1 - i)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        response = request_fn(client, i)
+        response.get_data()
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code != 200:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    # Bộ nhớ đỉnh đo ở một lượt riêng vì tracemalloc làm chậm đáng kể
+    tracemalloc.start()
+    for i in range(min(iterations, args.memory_iterations)):
+        request_fn(client, iterations + i).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'requests': iterations,
+        'students_per_request': students_per_request,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'requests_per_s': round(iterations / elapsed, 2),
+        'students_per_s': round(iterations * students_per_request / elapsed, 2),
+        'peak_traced_memory_mb': round(peak / (1 << 20), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# So sánh với một file kết quả trước đó; tỉ lệ < 1 với độ trễ nghĩa là nhanh hơn
+def compare(results, baseline):
+    rows = []
+    for workload, current in results['results'].items():
+        previous = baseline.get('results', {}).get(workload)
+        if not previous:
+            continue
+        row = {'workload': workload}
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'requests_per_s', 'peak_traced_memory_mb'):
+            if previous.get(key):
+                row[key] = round(current[key] / previous[key], 3)
+        rows.append(row)
+    return rows
+
+
+def print_table(results, comparison):
+    print(f"{'workload':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'sv/s':>11}{'peak MB':>10}")
+    for workload, r in results['results'].items():
+        print(f"{workload:<14}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['requests_per_s']:>10}"
+              f"{r['students_per_s']:>11}{r['peak_traced_memory_mb']:>10}")
+    if comparison:
+        print("\nSo với baseline (hiện tại / baseline):")
+        for row in comparison:
+            print("  " + ", ".join(f"{k}={v}" for k, v in row.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dự đoán và xuất Excel của web_version/server.py")
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help="Danh sách workload, phân tách bằng dấu phẩy")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--memory-iterations', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--export-batch-size', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=20240601)
+    parser.add_argument('--no-cache', action='store_true', help="Tắt cache dự đoán")
+    parser.add_argument('--output', '-o', help="Ghi kết quả ra file JSON")
+    parser.add_argument('--baseline', help="File JSON kết quả trước đó để so sánh")
+    parser.add_argument('--verbose', action='store_true', help="Giữ log INFO của server")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    # Không ghi bài nộp benchmark vào kho thật
+    os.environ.setdefault('SUBMISSIONS_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='bench-'), 'submissions.db'))
+
+    started = time.perf_counter()
+    from web_version import server
+    import_seconds = time.perf_counter() - started
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    if args.no_cache:
+        server._prediction_cache.max_entries = 0
+
+    t0 = time.perf_counter()
+    server.preload_models()
+    preload_seconds = time.perf_counter() - t0
+
+    with open(SUBJECTS_JSON_PATH, 'r', encoding='utf-8') as f:
+        subjects = json.load(f)
+    generator = StudentGenerator(year_subjects(server, subjects), args.seed)
+    client = server.app.test_client()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'batch_size': args.batch_size,
+            'export_batch_size': args.export_batch_size,
+            'seed': args.seed,
+            'prediction_cache': not args.no_cache,
+            'import_seconds': round(import_seconds, 4),
+            'preload_models_seconds': round(preload_seconds, 4),
+        },
+        'results': {}
+    }
+    for workload in [w.strip() for w in args.workloads.split(',') if w.strip()]:
+        results['results'][workload] = run_workload(client, workload, generator, args)
+    # ru_maxrss tính theo KiB trên Linux
+    results['meta']['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for key in ('batch_size', 'export_batch_size', 'prediction_cache'):
+            if baseline.get('meta', {}).get(key) != results['meta'][key]:
+                print(f"Cảnh báo: {key} khác baseline ({baseline.get('meta', {}).get(key)} != {results['meta'][key]})")
+        comparison = compare(results, baseline)
+        results['comparison'] = comparison
+    print_table(results, comparison)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Đo thời gian khởi động nguội của web_version/server.py: mỗi lượt chạy một
+# tiến trình Python mới (như một instance autoscale vừa được tạo), import server,
+# gửi request đầu tiên và ghi lại các giai đoạn khởi động cùng các module nặng đã nạp.
+#
+#   python benchmarks/bench_startup.py --runs 5 --output startup.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Chạy trong tiến trình con; in một dòng JSON kết quả
+CHILD_SCRIPT = r'''
+import json, logging, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from web_version import server
+import_seconds = time.perf_counter() - started
+logging.disable(logging.CRITICAL)
+client = server.app.test_client()
+t0 = time.perf_counter()
+client.get('/api/subjects').get_data()
+subjects_seconds = time.perf_counter() - t0
+t0 = time.perf_counter()
+client.post('/api/submit', json={'year': 'nam4', 'scores': [
+    {'subjectName': s['tenHocPhan'], 'subjectCode': s['maHocPhan'], 'credits': s['soTinChi'], 'semester': s['hocKy'], 'score': 'B'}
+    for s in server.subjects_data
+]}).get_data()
+submit_seconds = time.perf_counter() - t0
+report = server.startup_report()
+print(json.dumps({
+    'import_s': import_seconds,
+    'first_subjects_s': subjects_seconds,
+    'first_submit_s': submit_seconds,
+    'ready_s': time.perf_counter() - started,
+    'phases': report['phases'],
+    'heavy_modules_loaded': report['heavy_modules_loaded'],
+    'native_predictors': report['native_predictors'],
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+
+def run_once(env):
+    started = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', CHILD_SCRIPT, str(ROOT)], cwd=ROOT, env=env, text=True)
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - started
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động nguội của web_version/server.py")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--no-native', action='store_true', help="Tắt bộ dự đoán native (NATIVE_PREDICTORS=0)")
+    parser.add_argument('--output', '-o', help="Ghi kết quả ra file JSON")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env['SUBMISSIONS_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench-startup-'), 'submissions.db')
+    if args.no_native:
+        env['NATIVE_PREDICTORS'] = '0'
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    keys = ('import_s', 'first_subjects_s', 'first_submit_s', 'ready_s', 'process_s', 'max_rss_mb')
+    summary = {key: round(median([run[key] for run in runs]), 4) for key in keys}
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'runs': args.runs,
+            'native_predictors': not args.no_native,
+        },
+        'median': summary,
+        'heavy_modules_loaded': runs[-1]['heavy_modules_loaded'],
+        'runs': runs,
+    }
+
+    print(f"{'giai đoạn (trung vị)':<24}{'giây':>10}")
+    for key in keys[:-1]:
+        print(f"{key:<24}{summary[key]:>10}")
+    print(f"{'max_rss_mb':<24}{summary['max_rss_mb']:>10}")
+    loaded = [name for name, present in results['heavy_modules_loaded'].items() if present]
+    print("Module nặng đã nạp sau request đầu tiên: " + (", ".join(loaded) or "không có"))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
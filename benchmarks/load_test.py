@@ -0,0 +1,522 @@
+# Kiểm thử tải: chạy ứng dụng dưới gunicorn trên máy cục bộ (cùng entry point và
+# gunicorn.conf.py như Procfile), phát lại hỗn hợp request /api/subjects,
+# /api/submit, /api/export-excel và trạng thái theo sinh viên (cập nhật điểm
+# POST /api/students/<id>/grades, đọc GET /api/students/<id>) sinh từ
+# web_version/data/subjects.json với số kết nối đồng thời tăng dần, rồi dựng đường
+# cong năng lực: thông lượng (request/giây, sinh viên/phút) theo độ trễ p99, CPU
+# của server và RSS từng worker. Trước khi đo, mỗi sinh viên của tải trạng thái được
+# gửi sẵn một bảng điểm đầy đủ để request đọc/cập nhật không gặp 404.
+#
+#   python benchmarks/load_test.py --workers 2 --threads 4 --concurrency 1,2,4,8,16,32 --output capacity.json
+#   python benchmarks/load_test.py --mix subjects=1,submit=8,export=1 --duration 20 --slo-p99-ms 300
+#   python benchmarks/load_test.py --url http://127.0.0.1:8000 --server-pid 1234   # server đang chạy sẵn
+#
+# Client chạy trong nhiều tiến trình (--client-processes) để tránh GIL của chính
+# client giới hạn kết quả; CPU của client cũng được báo cáo để nhận biết khi client
+# mới là nút thắt. CPU/RSS của server đọc từ /proc nên chỉ có trên Linux.
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from bench_server import LETTERS, YEARS, git_revision, percentile
+
+ROOT = Path(__file__).resolve().parents[1]
+SUBJECTS_JSON_PATH = ROOT / 'web_version' / 'data' / 'subjects.json'
+ENDPOINTS = ('subjects', 'submit', 'export', 'grades', 'student')
+# Tải trạng thái: mỗi lượt mở trang đọc trạng thái một lần rồi sửa vài điểm
+# (mỗi lần sửa đã trả kèm dự đoán), nên cập nhật gấp đôi lượt đọc
+DEFAULT_MIX = 'subjects=2,submit=6,export=2,grades=2,student=1'
+# Các endpoint ứng với một sinh viên được xử lý (tính vào sinh viên/phút)
+STUDENT_ENDPOINTS = ('submit', 'export', 'grades', 'student')
+# Số sinh viên có trạng thái lưu trên server so với số bảng điểm sinh sẵn
+STATE_STUDENT_RATIO = 10
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint không hợp lệ trong --mix: {name} (chọn trong {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("--mix phải có ít nhất một endpoint với trọng số dương")
+    return mix
+
+
+# Bảng điểm giống giao diện web gửi: các môn thuộc học kỳ <= 2 * năm, thiếu ngẫu
+# nhiên vài môn, điểm hệ 10 kèm điểm chữ (server quy đổi lại theo thang điểm)
+def student_scores(rng, subjects, year_index):
+    taken = [s for s in subjects if s['hocKy'] <= 2 * year_index and rng.random() > 0.1] or subjects[:1]
+    scores = []
+    for s in taken:
+        value = round(rng.uniform(3.0, 10.0), 1)
+        scores.append({
+            'subjectCode': s['maHocPhan'],
+            'subjectName': s['tenHocPhan'],
+            'credits': s['soTinChi'],
+            'semester': s['hocKy'],
+            'score': rng.choice(LETTERS),
+            'original_score': value,
+        })
+    return scores
+
+
+def _json_body(body):
+    return json.dumps(body).encode('utf-8')
+
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+# Header cho request trạng thái sinh viên: token cố định theo mã sinh viên để
+# các tiến trình client cùng đọc/sửa được trạng thái đã tạo lúc seed
+def _student_headers(student_id, body):
+    headers = {'X-Student-Token': hashlib.sha256(student_id.encode('utf-8')).hexdigest()}
+    if body:
+        headers.update(JSON_HEADERS)
+    return headers
+
+
+# Sinh sẵn (method, path, body bytes, headers) để việc tạo dữ liệu không nằm trong thời gian đo.
+# payloads['states'] không thuộc --mix: bảng điểm đầy đủ gửi một lần trước khi đo
+# cho các sinh viên của tải 'grades'/'student'.
+def build_payloads(subjects, count, seed):
+    rng = random.Random(seed)
+    payloads = {'subjects': [('GET', '/api/subjects', None, {})], 'submit': [], 'export': [],
+                'grades': [], 'student': [], 'states': []}
+    for _ in range(count):
+        year_index = rng.randint(1, len(YEARS))
+        body = {'year': YEARS[year_index - 1], 'scores': student_scores(rng, subjects, year_index)}
+        payloads['submit'].append(('POST', '/api/submit', _json_body(body), JSON_HEADERS))
+        payloads['export'].append(('POST', '/api/export-excel', _json_body(body), JSON_HEADERS))
+
+    for i in range(max(1, count // STATE_STUDENT_RATIO)):
+        student_id = f'load-{seed}-{i}'
+        year_index = rng.randint(1, len(YEARS))
+        year = YEARS[year_index - 1]
+        scores = student_scores(rng, subjects, year_index)
+        changes = [{'subjectName': score['subjectName'], 'score': score['score']} for score in scores]
+        body = _json_body({'year': year, 'changes': changes, 'replace': True})
+        payloads['states'].append(('POST', f'/api/students/{student_id}/grades', body,
+                                   _student_headers(student_id, body)))
+        payloads['student'].append(('GET', f'/api/students/{student_id}?year={year}', None,
+                                    _student_headers(student_id, None)))
+        # Mỗi lần cập nhật sửa 1-3 môn trong khung chương trình của năm đó
+        eligible = [s for s in subjects if s['hocKy'] <= 2 * year_index] or subjects[:1]
+        for _ in range(STATE_STUDENT_RATIO):
+            edited = rng.sample(eligible, min(len(eligible), rng.randint(1, 3)))
+            changes = [{'subjectName': s['tenHocPhan'], 'score': rng.choice(LETTERS)} for s in edited]
+            body = _json_body({'year': year, 'changes': changes})
+            payloads['grades'].append(('POST', f'/api/students/{student_id}/grades', body,
+                                       _student_headers(student_id, body)))
+    return payloads
+
+
+# Gửi bảng điểm đầy đủ cho các sinh viên của tải trạng thái (ngoài thời gian đo)
+def seed_student_states(url, requests, timeout):
+    for method, path, body, headers in requests:
+        status, response = request_once(url, method, path, body, timeout=timeout, headers=headers)
+        if status != 200:
+            raise RuntimeError(f"Không tạo được trạng thái sinh viên ({path}): HTTP {status} {response[:200]!r}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Thời gian CPU (user + system, giây) và RSS (MiB) của một tiến trình, đọc từ /proc
+def proc_cpu_seconds(pid):
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    # Sau tên tiến trình: utime, stime là trường thứ 12, 13 (đếm từ 0)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def proc_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+# Các tiến trình con trực tiếp (worker gunicorn) và toàn bộ hậu duệ (pool suy luận)
+def proc_children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def proc_tree(pid):
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(proc_children(current))
+    return pids
+
+
+class ServerProbe:
+    def __init__(self, pid):
+        self.pid = pid
+        self.available = pid is not None and os.path.isdir(f'/proc/{pid}')
+
+    def cpu_seconds(self):
+        if not self.available:
+            return None
+        return sum(proc_cpu_seconds(pid) or 0.0 for pid in proc_tree(self.pid))
+
+    # RSS theo worker (tiến trình con trực tiếp của master gunicorn)
+    def worker_rss(self):
+        if not self.available:
+            return {}
+        workers = proc_children(self.pid) or [self.pid]
+        return {pid: rss for pid in workers if (rss := proc_rss_mb(pid)) is not None}
+
+
+# Chạy gunicorn với entry point của Procfile; dữ liệu bài nộp/trạng thái ghi vào thư mục tạm
+class GunicornServer:
+    def __init__(self, workers, threads, port, extra_args=(), log_path=None):
+        self.port = port
+        self.url = f'http://127.0.0.1:{port}'
+        self.workdir = tempfile.mkdtemp(prefix='loadtest-')
+        self.log_path = log_path or os.path.join(self.workdir, 'gunicorn.log')
+        self.command = [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+            '--workers', str(workers), '--threads', str(threads),
+            '--bind', f'127.0.0.1:{port}', *extra_args, 'web_version.server:app'
+        ]
+        self.process = None
+
+    def start(self, timeout):
+        env = dict(os.environ)
+        env.setdefault('SUBMISSIONS_DB_PATH', os.path.join(self.workdir, 'submissions.db'))
+        env.setdefault('STUDENT_STATE_DB_PATH', os.path.join(self.workdir, 'student_state.db'))
+        self._log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen(self.command, cwd=ROOT, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn dừng với mã {self.process.returncode}, xem {self.log_path}")
+            try:
+                status, _ = request_once(self.url, 'GET', '/api/ready', None, timeout=2)
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"gunicorn chưa sẵn sàng sau {timeout} giây, xem {self.log_path}")
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self._log.close()
+
+
+def request_once(url, method, path, body, timeout=30, headers=None):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    if headers is None:
+        headers = JSON_HEADERS if body else {}
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+# ---- Client (chạy trong tiến trình con) ----
+
+_client_payloads = None
+
+
+def _init_client(payloads):
+    global _client_payloads
+    _client_payloads = payloads
+
+
+# Một luồng client: gửi request tuần tự trên một kết nối (tự kết nối lại khi server
+# đóng), chỉ ghi nhận các request bắt đầu trong khoảng [measure_start, end)
+def _client_thread(url, mix, measure_start, end, seed, timeout, records):
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    while True:
+        started = time.time()
+        if started >= end:
+            break
+        name = rng.choices(names, weights)[0]
+        method, path, body, headers = rng.choice(_client_payloads[name])
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            status = 0
+            conn.close()
+        latency = time.perf_counter() - t0
+        if started >= measure_start:
+            records.append((name, latency, status))
+    conn.close()
+
+
+def run_client(url, mix, threads, measure_start, end, seed, timeout):
+    records = []
+    workers = [
+        threading.Thread(target=_client_thread, args=(url, mix, measure_start, end, seed * 1000 + i, timeout, records))
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    # CPU của client chỉ tính trong khoảng đo
+    time.sleep(max(0.0, measure_start - time.time()))
+    cpu_start = sum(os.times()[:2])
+    for worker in workers:
+        worker.join()
+    return records, sum(os.times()[:2]) - cpu_start
+
+
+# ---- Tổng hợp ----
+
+def latency_stats(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def summarize_step(concurrency, records, duration, client_cpu, server_cpu, rss_samples):
+    ok = [r for r in records if r[2] == 200 or (r[0] == 'subjects' and r[2] == 304)]
+    step = {
+        'concurrency': concurrency,
+        'requests': len(records),
+        'errors': len(records) - len(ok),
+        'requests_per_s': round(len(ok) / duration, 2),
+        'students_per_min': round(sum(1 for r in ok if r[0] in STUDENT_ENDPOINTS) / duration * 60, 1),
+        **latency_stats([r[1] for r in records]),
+        'server_cpu_percent': round(server_cpu / duration * 100, 1) if server_cpu is not None else None,
+        'client_cpu_percent': round(client_cpu / duration * 100, 1),
+        'endpoints': {},
+    }
+    for name in ENDPOINTS:
+        subset = [r for r in records if r[0] == name]
+        if subset:
+            step['endpoints'][name] = {
+                'requests': len(subset),
+                'errors': sum(1 for r in subset if r[2] not in (200, 304)),
+                **latency_stats([r[1] for r in subset]),
+            }
+    if rss_samples:
+        peaks = {}
+        for sample in rss_samples:
+            for pid, rss in sample.items():
+                peaks[pid] = max(peaks.get(pid, 0.0), rss)
+        step['worker_rss_mb'] = {str(pid): round(rss, 1) for pid, rss in sorted(peaks.items())}
+        step['max_worker_rss_mb'] = round(max(peaks.values()), 1)
+    else:
+        step['worker_rss_mb'] = {}
+        step['max_worker_rss_mb'] = None
+    return step
+
+
+def run_step(executor, args, mix, concurrency, probe):
+    # Chia đều các luồng client cho các tiến trình client
+    processes = min(args.client_processes, concurrency)
+    shares = [concurrency // processes + (1 if i < concurrency % processes else 0) for i in range(processes)]
+    measure_start = time.time() + args.warmup + 0.5
+    end = measure_start + args.duration
+    futures = [
+        executor.submit(run_client, args.url, mix, threads, measure_start, end, args.seed + concurrency * 100 + i, args.timeout)
+        for i, threads in enumerate(shares)
+    ]
+
+    time.sleep(max(0.0, measure_start - time.time()))
+    cpu_start = probe.cpu_seconds()
+    rss_samples = []
+    while time.time() < end:
+        rss_samples.append(probe.worker_rss())
+        time.sleep(min(0.5, max(0.0, end - time.time())))
+    cpu_end = probe.cpu_seconds()
+
+    records, client_cpu = [], 0.0
+    for future in futures:
+        client_records, cpu = future.result()
+        records.extend(client_records)
+        client_cpu += cpu
+    server_cpu = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+    return summarize_step(concurrency, records, args.duration, client_cpu, server_cpu, rss_samples)
+
+
+# Bước có thông lượng cao nhất mà p99 vẫn trong SLO
+def capacity(curve, slo_p99_ms):
+    within = [s for s in curve if s['p99_ms'] is not None and s['p99_ms'] <= slo_p99_ms and not s['errors']]
+    if not within:
+        return None
+    best = max(within, key=lambda s: s['requests_per_s'])
+    return {
+        'slo_p99_ms': slo_p99_ms,
+        'concurrency': best['concurrency'],
+        'requests_per_s': best['requests_per_s'],
+        'students_per_min': best['students_per_min'],
+        'p99_ms': best['p99_ms'],
+    }
+
+
+def print_table(curve, cap, client_processes):
+    print(f"{'conc':>5}{'req/s':>9}{'sv/phút':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'lỗi':>6}"
+          f"{'CPU srv%':>10}{'RSS max MB':>12}{'CPU client%':>13}")
+    for s in curve:
+        print(f"{s['concurrency']:>5}{s['requests_per_s']:>9}{s['students_per_min']:>10}{s['p50_ms']!s:>9}"
+              f"{s['p95_ms']!s:>9}{s['p99_ms']!s:>9}{s['errors']:>6}{s['server_cpu_percent']!s:>10}"
+              f"{s['max_worker_rss_mb']!s:>12}{s['client_cpu_percent']:>13}")
+        # Mỗi tiến trình client tối đa ~100% một lõi
+        if s['client_cpu_percent'] > 80 * min(client_processes, s['concurrency']):
+            print("      ^ client gần bão hòa CPU, hãy tăng --client-processes hoặc chạy client trên máy khác")
+    if cap:
+        print(f"\nNăng lực với p99 <= {cap['slo_p99_ms']} ms: {cap['students_per_min']} sinh viên/phút "
+              f"({cap['requests_per_s']} req/s, {cap['concurrency']} kết nối đồng thời, p99 {cap['p99_ms']} ms)")
+    else:
+        print("\nKhông có bước nào đạt SLO p99 (hoặc tất cả có lỗi)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm thử tải web_version.server dưới gunicorn và dựng đường cong năng lực")
+    parser.add_argument('--workers', type=int, default=2, help="Số worker gunicorn")
+    parser.add_argument('--threads', type=int, default=1, help="Số luồng mỗi worker (> 1 dùng worker gthread)")
+    parser.add_argument('--gunicorn-arg', action='append', default=[], help="Tham số thêm cho gunicorn (lặp lại được)")
+    parser.add_argument('--url', help="Đo server đang chạy tại URL này thay vì khởi động gunicorn")
+    parser.add_argument('--server-pid', type=int, help="PID master của server đang chạy (--url) để đo CPU/RSS")
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help="Các mức kết nối đồng thời, phân tách bằng dấu phẩy")
+    parser.add_argument('--duration', type=float, default=10.0, help="Thời gian đo mỗi mức (giây)")
+    parser.add_argument('--warmup', type=float, default=2.0, help="Thời gian chạy trước khi đo mỗi mức (giây)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Trọng số endpoint, ví dụ {DEFAULT_MIX}")
+    parser.add_argument('--students', type=int, default=2000, help="Số bảng điểm sinh sẵn")
+    parser.add_argument('--client-processes', type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    parser.add_argument('--timeout', type=float, default=30.0, help="Timeout mỗi request (giây)")
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--slo-p99-ms', type=float, default=500.0, help="Ngưỡng p99 để xác định năng lực")
+    parser.add_argument('--stop-p99-ms', type=float, help="Dừng tăng tải khi p99 vượt ngưỡng này")
+    parser.add_argument('--seed', type=int, default=20240601)
+    parser.add_argument('--output', '-o', help="Ghi kết quả ra file JSON")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    with open(SUBJECTS_JSON_PATH, 'r', encoding='utf-8') as f:
+        subjects = json.load(f)
+    payloads = build_payloads(subjects, args.students, args.seed)
+
+    server = None
+    if args.url:
+        probe = ServerProbe(args.server_pid)
+    else:
+        server = GunicornServer(args.workers, args.threads, free_port(), args.gunicorn_arg)
+        print(f"Khởi động: {' '.join(server.command)}")
+        started = time.perf_counter()
+        server.start(args.startup_timeout)
+        print(f"gunicorn sẵn sàng sau {time.perf_counter() - started:.1f} giây (log: {server.log_path})")
+        args.url = server.url
+        probe = ServerProbe(server.process.pid)
+    if not probe.available:
+        print("Không đo được CPU/RSS của server (cần Linux và PID của master gunicorn)")
+
+    curve = []
+    try:
+        if 'grades' in mix or 'student' in mix:
+            seed_student_states(args.url, payloads['states'], args.timeout)
+            print(f"Đã tạo trạng thái cho {len(payloads['states'])} sinh viên")
+        with ProcessPoolExecutor(max_workers=args.client_processes, initializer=_init_client, initargs=(payloads,)) as executor:
+            for concurrency in levels:
+                step = run_step(executor, args, mix, concurrency, probe)
+                curve.append(step)
+                print(f"  {concurrency} kết nối: {step['requests_per_s']} req/s, p99 {step['p99_ms']} ms, {step['errors']} lỗi")
+                if args.stop_p99_ms and step['p99_ms'] is not None and step['p99_ms'] > args.stop_p99_ms:
+                    print(f"  p99 vượt {args.stop_p99_ms} ms, dừng tăng tải")
+                    break
+    finally:
+        if server is not None:
+            server.stop()
+
+    cap = capacity(curve, args.slo_p99_ms)
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'url': args.url if server is None else None,
+            'workers': args.workers if server is not None else None,
+            'threads': args.threads if server is not None else None,
+            'gunicorn_args': args.gunicorn_arg,
+            'mix': mix,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'client_processes': args.client_processes,
+            'seed': args.seed,
+        },
+        'curve': curve,
+        'capacity': cap,
+    }
+    print()
+    print_table(curve, cap, args.client_processes)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+# Cấu hình gunicorn cho web_version.server:app
+
+# Tải ứng dụng trong tiến trình master trước khi fork để các worker
+# dùng chung bộ nhớ mô hình theo cơ chế copy-on-write
+preload_app = True
+
+
+# Master: nạp sẵn toàn bộ mô hình trước khi fork worker
+def when_ready(server):
+    from web_version.server import preload_models
+    preload_models()
+
+
+# Worker: nếu mô hình chưa có sẵn (ví dụ chạy với --no-preload) thì nạp nền
+def post_worker_init(worker):
+    from web_version.server import start_model_warmup
+    start_model_warmup()
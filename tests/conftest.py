@@ -0,0 +1,46 @@
+# Cấu hình chung cho bộ test: server dùng đường dẫn tương đối tới thư mục gốc của
+# repo (attached_assets, web_version/data) nên chạy từ đó, còn các DB SQLite được
+# đặt trong thư mục tạm để không đụng dữ liệu thật.
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+_tmp = tempfile.mkdtemp(prefix='web-version-tests-')
+os.environ.update(
+    SUBMISSIONS_DB_PATH=os.path.join(_tmp, 'submissions.db'),
+    STUDENT_STATE_DB_PATH=os.path.join(_tmp, 'student_state.db'),
+    SUBMISSIONS_LEGACY_JSON='',
+    PROFILE_DIR=os.path.join(_tmp, 'profiles'),
+    PROGRAMS_DIR=os.path.join(_tmp, 'programs'),
+)
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+
+STUDENT_TOKEN = 'test-token-' + 'a' * 16
+
+
+@pytest.fixture(scope='session')
+def server():
+    from web_version import server
+    return server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def student_client(server):
+    client = server.app.test_client()
+    client.environ_base['HTTP_X_STUDENT_TOKEN'] = STUDENT_TOKEN
+    return client
+
+
+@pytest.fixture(scope='session')
+def subjects(server):
+    return server.app.test_client().get('/api/subjects').get_json()
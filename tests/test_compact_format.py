@@ -0,0 +1,64 @@
+# Định dạng gửi gọn (chuỗi điểm theo thứ tự khung chương trình + ETag) phải cho
+# cùng kết quả với danh sách điểm JSON đầy đủ, kể cả khi nén gzip.
+import gzip
+import json
+import random
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def etag(server):
+    return server.app.test_client().get('/api/subjects').headers['ETag']
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_compact_matches_json(client, subjects, etag, seed):
+    rng = random.Random(seed)
+    year = ['nam1', 'nam2', 'nam3', 'nam4'][seed % 4]
+    grades = ''.join(rng.choice('ABCDF--') for _ in subjects)
+    scores = [
+        {'subjectName': s['tenHocPhan'], 'subjectCode': s['maHocPhan'], 'credits': s['soTinChi'],
+         'semester': s['hocKy'], 'score': grade}
+        for s, grade in zip(subjects, grades) if grade != '-'
+    ]
+    full = client.post('/api/submit', json={'year': year, 'scores': scores}).get_json()
+
+    # ETag có hoặc không có dấu ngoặc kép, chữ thường, nén gzip đều được chấp nhận
+    body = {'year': year, 'curriculum': etag if seed % 2 else etag.strip('"'), 'grades': grades.lower() if seed % 3 == 0 else grades}
+    compact = client.post('/api/submit', json=body).get_json()
+    compressed = client.post(
+        '/api/submit', data=gzip.compress(json.dumps(body).encode('utf-8')),
+        headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/json'}
+    ).get_json()
+
+    assert full['status'] == 'success'
+    assert compact == full
+    assert compressed == full
+
+
+def test_stale_curriculum_conflict(client, etag):
+    response = client.post('/api/submit', json={'year': 'nam1', 'curriculum': 'stale', 'grades': 'A'})
+    assert response.status_code == 409
+    assert response.get_json()['curriculum'] == etag.strip('"')
+
+
+def test_invalid_grade_string(client, subjects, etag):
+    # Sai số môn, ký tự không hợp lệ, thiếu ETag khung chương trình
+    for body in (
+        {'year': 'nam1', 'curriculum': etag, 'grades': 'A'},
+        {'year': 'nam1', 'curriculum': etag, 'grades': 'X' + 'A' * (len(subjects) - 1)},
+        {'year': 'nam1', 'grades': 'A' * len(subjects)},
+    ):
+        assert client.post('/api/submit', json=body).status_code == 400
+
+
+def test_unsupported_encoding(client):
+    response = client.post('/api/submit', data=b'xx', headers={'Content-Encoding': 'br', 'Content-Type': 'application/json'})
+    assert response.status_code == 415
+
+
+def test_decompression_limit(client):
+    bomb = gzip.compress(b'{' * (20 << 20))
+    response = client.post('/api/submit', data=bomb, headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/json'})
+    assert response.status_code == 413
@@ -0,0 +1,53 @@
+# Bộ dự đoán numpy (native_predictor) phải cho cùng nhãn và cùng điểm tin cậy
+# với mô hình scikit-learn gốc trên mọi file mô hình có sẵn.
+import glob
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+MODEL_FILES = sorted(glob.glob('attached_assets/best_model_Year_*.pkl'))
+
+
+@pytest.mark.parametrize('model_path', MODEL_FILES, ids=lambda path: path.rsplit('/', 1)[-1])
+def test_native_matches_sklearn(server, model_path):
+    import joblib
+    from web_version.confidence import predict_with_confidence
+    from web_version.native_predictor import load_native_predictor
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = joblib.load(model_path)
+    native = load_native_predictor(model_path)
+    assert native is not None
+
+    rng = np.random.default_rng(7)
+    letters = rng.choice(list('ABCDF'), size=(500, len(model.feature_names_in_))).astype(object)
+    to_frame = lambda rows: pd.DataFrame(rows, columns=model.feature_names_in_)
+
+    native_labels, native_scores, native_kind = predict_with_confidence(native, letters, to_frame)
+    labels, scores, kind = predict_with_confidence(model, letters, to_frame)
+
+    assert native_kind == kind
+    np.testing.assert_array_equal(native_labels, labels)
+    np.testing.assert_array_equal(native_labels, model.predict(to_frame(letters)))
+    np.testing.assert_allclose(native_scores, scores, rtol=0, atol=1e-9)
+
+
+def test_native_rebuilds_stale_export(tmp_path):
+    import shutil
+    from web_version.native_predictor import load_native_predictor
+
+    source = MODEL_FILES[0]
+    model_path = tmp_path / source.rsplit('/', 1)[-1]
+    shutil.copy(source, model_path)
+    first = load_native_predictor(str(model_path))
+    # File mô hình khác nội dung nhưng giữ mtime cũ: vẫn phải xuất lại theo sha256
+    stamp = os.stat(model_path).st_mtime
+    shutil.copy(MODEL_FILES[-1], model_path)
+    os.utime(model_path, (stamp, stamp))
+    assert load_native_predictor(str(model_path), export=False) is None
+    second = load_native_predictor(str(model_path))
+    assert second.source_sha256 != first.source_sha256
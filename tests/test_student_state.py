@@ -0,0 +1,111 @@
+# Cập nhật trạng thái điểm tăng dần (/api/students/<id>/grades) phải cho cùng kết
+# quả với việc gửi lại toàn bộ bảng điểm qua /api/submit, và các lỗi 400/401/403/409.
+import random
+
+import pytest
+
+from conftest import STUDENT_TOKEN
+
+
+def _compare(incremental, full, expected_subjects):
+    assert incremental['status'] == full['status'] == 'success'
+    assert incremental['message'] == full['message']
+    assert incremental['average_score'] == pytest.approx(full['average_score'], abs=1e-9)
+    assert incremental['subjects'] == expected_subjects
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_delta_matches_full_recompute(server, student_client, subjects, seed):
+    rng = random.Random(seed)
+    student_id = f'delta-{seed}'
+    year = ['nam1', 'nam2', 'nam3', 'nam4'][seed]
+    current = {}
+    for _ in range(12):
+        changes = []
+        for _ in range(rng.randint(1, 4)):
+            name = rng.choice(subjects)['tenHocPhan']
+            if name in current and rng.random() < 0.2:
+                changes.append({'subjectName': name, 'score': None})
+                current.pop(name)
+            elif rng.random() < 0.5:
+                value = round(rng.uniform(0, 10), 1)
+                changes.append({'subjectName': name, 'score': 'F', 'original_score': value})
+                current[name] = server.numeric_to_letter(value)
+            else:
+                letter = rng.choice('ABCDF')
+                changes.append({'subjectName': name, 'score': letter.lower()})
+                current[name] = letter
+        incremental = student_client.post(
+            f'/api/students/{student_id}/grades', json={'year': year, 'changes': changes}
+        ).get_json()
+        full = student_client.post('/api/submit', json={
+            'year': year,
+            'scores': [{'subjectName': name, 'subjectCode': '', 'score': letter} for name, letter in current.items()],
+        }).get_json()
+        _compare(incremental, full, len(current))
+
+    # Đọc lại cho năm khác: hàng đặc trưng được dựng lại từ toàn bộ điểm đã lưu
+    other_year = 'nam4' if year != 'nam4' else 'nam1'
+    state = student_client.get(f'/api/students/{student_id}?year={other_year}').get_json()
+    full = student_client.post('/api/submit', json={
+        'year': other_year,
+        'scores': [{'subjectName': name, 'subjectCode': '', 'score': letter} for name, letter in current.items()],
+    }).get_json()
+    _compare(state, full, len(current))
+
+
+def test_replace_drops_missing_subjects(student_client, subjects):
+    first, second = subjects[0]['tenHocPhan'], subjects[1]['tenHocPhan']
+    url = '/api/students/replace-1/grades'
+    student_client.post(url, json={'year': 'nam1', 'replace': True, 'changes': [{'subjectName': first, 'score': 'A'}]})
+    result = student_client.post(url, json={
+        'year': 'nam1', 'replace': True, 'changes': [{'subjectName': second, 'score': 'C'}]
+    }).get_json()
+    assert result['subjects'] == 1
+    assert result['revision'] == 2
+
+
+def test_revision_conflict(student_client, subjects):
+    url = '/api/students/conflict-1/grades'
+    change = [{'subjectName': subjects[0]['tenHocPhan'], 'score': 'B'}]
+    assert student_client.post(url, json={'year': 'nam1', 'changes': change, 'revision': 0}).status_code == 200
+    response = student_client.post(url, json={'year': 'nam1', 'changes': change, 'revision': 5})
+    assert response.status_code == 409
+    assert response.get_json()['revision'] == 1
+
+
+@pytest.mark.parametrize('body', [
+    {'changes': 'A'},
+    {'changes': [], 'revision': -1},
+    {'changes': [], 'revision': 'x'},
+    {'changes': [], 'replace': 1},
+    {'changes': [{'score': 'A'}]},
+    {'changes': [{'subjectName': 'x', 'score': 'Z'}]},
+    {'changes': [{'subjectName': 'x', 'score': 'A', 'original_score': 11}]},
+])
+def test_invalid_update_body(student_client, body):
+    assert student_client.post('/api/students/invalid-1/grades', json=body).status_code == 400
+
+
+def test_invalid_student_id(student_client):
+    assert student_client.post('/api/students/a b/grades', json={'changes': []}).status_code == 400
+    assert student_client.get('/api/students/a b').status_code == 400
+    assert student_client.delete('/api/students/a b').status_code == 400
+
+
+def test_owner_token_required(client, student_client, subjects):
+    url = '/api/students/owner-1'
+    change = {'year': 'nam1', 'changes': [{'subjectName': subjects[0]['tenHocPhan'], 'score': 'A'}]}
+    assert client.post(url + '/grades', json=change).status_code == 401
+    assert student_client.post(url + '/grades', json=change).status_code == 200
+
+    other = {'X-Student-Token': 'other-token-' + 'b' * 16}
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=other).status_code == 403
+    assert client.post(url + '/grades', json=change, headers=other).status_code == 403
+    assert client.delete(url, headers=other).status_code == 403
+
+    assert client.get(url, headers={'X-Student-Token': STUDENT_TOKEN}).status_code == 200
+    assert student_client.delete(url).status_code == 200
+    assert student_client.get(url).status_code == 404
+    assert student_client.delete(url).status_code == 404
@@ -0,0 +1,295 @@
+# Chế độ phục vụ bất đồng bộ (ASGI) cho web_version.server:app.
+#
+#   uvicorn web_version.asgi:app --host 0.0.0.0 --port 5000
+#   gunicorn -k uvicorn.workers.UvicornWorker web_version.asgi:app
+#
+# Ứng dụng Flask vẫn xử lý toàn bộ route; lớp ASGI này chỉ quyết định request
+# chạy ở đâu. Request được phân loại theo endpoint Flask (không theo phương thức
+# HTTP, vì GET /api/students/<id> cũng chạy dự đoán): endpoint nhẹ trong
+# LIGHT_ENDPOINTS (/api/subjects, file tĩnh, /metrics...), OPTIONS và request không
+# khớp route chạy trên một pool luồng riêng nên không bao giờ phải xếp hàng sau các
+# request nặng (model.predict, dựng workbook openpyxl) chạy trên pool có giới hạn.
+# Endpoint mới mặc định là nặng.
+# Endpoint nhẹ có ?program= trỏ tới chương trình chưa nạp (phải đọc Excel, dựng
+# registry) cũng được tính là nặng.
+# Body được đọc hết (giới hạn ASGI_MAX_BODY_BYTES, mỗi lần nhận tối đa
+# ASGI_BODY_TIMEOUT giây) trước khi giữ chỗ trong pool nặng, nên client gửi chậm
+# không chiếm chỗ của request khác.
+# Khi pool nặng đã đầy và hàng đợi chạm ngưỡng, request bị từ chối ngay với
+# 503 + Retry-After thay vì treo worker.
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import HTTPException
+
+try:
+    from . import server
+except ImportError:
+    import server
+
+logger = logging.getLogger(__name__)
+
+# Số request nặng chạy đồng thời (mặc định bằng số lõi CPU)
+ASGI_MAX_CONCURRENCY = int(os.environ.get('ASGI_MAX_CONCURRENCY', str(os.cpu_count() or 4)))
+# Số request nặng được phép chờ thêm khi pool đã đầy
+ASGI_MAX_QUEUE = int(os.environ.get('ASGI_MAX_QUEUE', str(2 * ASGI_MAX_CONCURRENCY)))
+# Số luồng cho request nhẹ
+ASGI_LIGHT_THREADS = int(os.environ.get('ASGI_LIGHT_THREADS', '8'))
+# Giá trị header Retry-After (giây) khi quá tải
+ASGI_RETRY_AFTER = int(os.environ.get('ASGI_RETRY_AFTER', '2'))
+# Kích thước body tối đa (byte, trước giải nén) và thời gian chờ tối đa giữa hai phần body
+ASGI_MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', str(16 << 20)))
+ASGI_BODY_TIMEOUT = float(os.environ.get('ASGI_BODY_TIMEOUT', '30'))
+
+# Endpoint chỉ đọc dữ liệu có sẵn trong bộ nhớ/file tĩnh, không chạy mô hình
+LIGHT_ENDPOINTS = frozenset([
+    'static', 'index', 'send_css', 'send_js', 'send_data',
+    'readiness', 'prometheus_metrics', 'startup_stats', 'model_versions',
+    'list_programs', 'cache_stats', 'get_subjects',
+])
+
+
+# Body vượt giới hạn hoặc client gửi quá chậm; status là mã HTTP trả về
+class BodyError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _build_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    path = scope.get('path', '/')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        # PEP 3333: đường dẫn được giải mã UTF-8 rồi mã hóa lại dạng latin-1
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server_name),
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsgiApp:
+    def __init__(self, wsgi_app, max_concurrency=ASGI_MAX_CONCURRENCY, max_queue=ASGI_MAX_QUEUE,
+                 light_threads=ASGI_LIGHT_THREADS, retry_after=ASGI_RETRY_AFTER,
+                 max_body_bytes=ASGI_MAX_BODY_BYTES, body_timeout=ASGI_BODY_TIMEOUT):
+        self.wsgi_app = wsgi_app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.max_body_bytes = max_body_bytes
+        self.body_timeout = body_timeout
+        self.heavy_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='asgi-heavy')
+        self.light_executor = ThreadPoolExecutor(max_workers=light_threads, thread_name_prefix='asgi-light')
+        self._url_adapter = wsgi_app.url_map.bind('localhost')
+        self._lock = threading.Lock()
+        self.heavy_in_flight = 0
+        self.rejected = 0
+        self.body_errors = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise RuntimeError(f"Không hỗ trợ ASGI scope {scope['type']}")
+
+        # Đọc hết body trước: thời gian chờ client gửi không chiếm chỗ trong pool nặng
+        try:
+            body = await self._read_body(scope, receive)
+        except BodyError as e:
+            with self._lock:
+                self.body_errors += 1
+            logger.warning("Từ chối request %s %s: %s", scope['method'], scope.get('path', '/'), str(e))
+            await self._send_error(send, e.status, str(e))
+            return
+        if body is None:
+            # Client đã ngắt kết nối
+            return
+
+        if self._is_light(scope):
+            executor = self.light_executor
+        else:
+            if not self._try_acquire():
+                await self._send_overloaded(send)
+                return
+            executor = self.heavy_executor
+
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(executor, self._run_wsgi, scope, body, send, loop)
+        finally:
+            if executor is self.heavy_executor:
+                self._release()
+
+    # OPTIONS và request không khớp route (404/405/chuyển hướng) được Flask trả lời ngay
+    def _is_light(self, scope):
+        method = scope['method']
+        if method == 'OPTIONS':
+            return True
+        try:
+            endpoint, _ = self._url_adapter.match(scope.get('path', '/'), method=method)
+        except HTTPException:
+            return True
+        if endpoint not in LIGHT_ENDPOINTS:
+            return False
+        # Lần đầu chọn một chương trình phải đọc file Excel và dựng registry của nó
+        program = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('program')
+        return not program or server._programs.is_loaded(program[0])
+
+    def _try_acquire(self):
+        with self._lock:
+            if self.heavy_in_flight >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                return False
+            self.heavy_in_flight += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self.heavy_in_flight -= 1
+
+    # Body của request; None nếu client ngắt kết nối giữa chừng. Ném BodyError khi
+    # Content-Length/body vượt max_body_bytes (413) hoặc quá body_timeout giây không
+    # nhận được phần tiếp theo (408).
+    async def _read_body(self, scope, receive):
+        for name, value in scope.get('headers', []):
+            if name == b'content-length' and value.isdigit() and int(value) > self.max_body_bytes:
+                raise BodyError(413, f"Body vượt quá {self.max_body_bytes} byte")
+        chunks = []
+        size = 0
+        while True:
+            try:
+                message = await asyncio.wait_for(receive(), self.body_timeout)
+            except asyncio.TimeoutError:
+                raise BodyError(408, f"Quá {self.body_timeout:g} giây không nhận được body") from None
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise BodyError(413, f"Body vượt quá {self.max_body_bytes} byte")
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    async def _send_json(self, send, status, message, headers=()):
+        body = json.dumps({'status': 'error', 'message': message}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                *headers,
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _send_error(self, send, status, message):
+        # Body chưa đọc hết nên đóng kết nối sau response
+        await self._send_json(send, status, message, [(b'connection', b'close')])
+
+    async def _send_overloaded(self, send):
+        logger.warning("Quá tải: %d request nặng đang chạy/chờ, trả về 503", self.heavy_in_flight)
+        await self._send_json(send, 503, "Máy chủ đang quá tải, vui lòng thử lại sau.",
+                              [(b'retry-after', str(self.retry_after).encode('latin-1'))])
+
+    # Chạy ứng dụng WSGI trong luồng của executor và truyền từng phần body
+    # về event loop, nên response lớn (file Excel) được gửi dạng luồng
+    def _run_wsgi(self, scope, body, send, loop):
+        response_start = {}
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+            return lambda data: None
+
+        started = False
+        result = self.wsgi_app(_build_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not started:
+                    send_sync({'type': 'http.response.start', **response_start})
+                    started = True
+                send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        if not started:
+            send_sync({'type': 'http.response.start', **response_start})
+        send_sync({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                server.start_model_warmup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.heavy_executor.shutdown(wait=False)
+                self.light_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'heavy_in_flight': self.heavy_in_flight,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'rejected': self.rejected,
+                'body_errors': self.body_errors,
+            }
+
+
+app = AsgiApp(server.app)
+
+
+@server.metrics.register_collector
+def _asgi_metrics():
+    stats = app.stats()
+    return [
+        ('asgi_heavy_requests_in_flight', 'gauge', "Số request nặng đang chạy hoặc chờ trong pool ASGI", [({}, stats['heavy_in_flight'])]),
+        ('asgi_rejected_requests_total', 'counter', "Số request bị từ chối 503 do quá tải", [({}, stats['rejected'])]),
+        ('asgi_body_errors_total', 'counter', "Số request bị từ chối do body quá lớn hoặc gửi quá chậm", [({}, stats['body_errors'])]),
+    ]
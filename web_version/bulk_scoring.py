@@ -0,0 +1,337 @@
+# Chấm điểm hàng loạt ngoài giờ cho file điểm lớn của phòng đào tạo.
+#
+# File đầu vào (.csv hoặc .xlsx) có mỗi hàng là một sinh viên, mỗi cột là một môn
+# học đặt tên theo khung chương trình (Tên Học Phần hoặc Mã Học Phần); các cột
+# khác (MSSV, họ tên, ...) được chép nguyên sang file kết quả. Ô điểm có thể là
+# điểm hệ 10 (kể cả dạng "8,5") hoặc điểm chữ A-F; ô trống là môn chưa học.
+#
+# File được đọc theo từng khối (pandas read_csv chunksize / openpyxl read-only)
+# và mỗi khối được chấm trong một tiến trình con: đổi điểm số sang điểm chữ bằng
+# phép toán trên cả ma trận, sắp cột theo feature_names_in_ của mô hình từng năm,
+# dự đoán cả khối trong một lần gọi. Số khối đang xử lý bị giới hạn và kết quả
+# được ghi ra theo đúng thứ tự ngay khi có, nên bộ nhớ không tăng theo kích thước file.
+#
+#   python -m web_version.bulk_scoring diem_k2021.xlsx -o ket_qua.csv --year nam4
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from .curriculum import CurriculumCache
+    from .features import VALID_LETTERS, FeatureEncoder
+    from .grading import DEFAULT_SCALE, LETTER_TO_NUMERIC, GradeScale, parse_thresholds
+    from .model_registry import discover_model_paths
+    from .model_store import load_model_file, resolve_model_path
+    from .native_predictor import NATIVE_PREDICTORS, load_native_predictor
+except ImportError:
+    from curriculum import CurriculumCache
+    from features import VALID_LETTERS, FeatureEncoder
+    from grading import DEFAULT_SCALE, LETTER_TO_NUMERIC, GradeScale, parse_thresholds
+    from model_registry import discover_model_paths
+    from model_store import load_model_file, resolve_model_path
+    from native_predictor import NATIVE_PREDICTORS, load_native_predictor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Cột GPA trong file kết quả
+AVERAGE_COLUMN = 'average_score'
+
+# Trạng thái trong tiến trình con, dựng một lần ở _init_worker
+_worker_state = {}
+
+
+# Giá trị một ô điểm -> (điểm chữ hoặc None, điểm hệ 10 hoặc NaN)
+def _parse_cell(value):
+    if isinstance(value, str):
+        text = value.strip()
+        if text.upper() in VALID_LETTERS:
+            return text.upper(), np.nan
+        try:
+            return None, float(text.replace(',', '.'))
+        except ValueError:
+            return None, np.nan
+    try:
+        return None, float(value)
+    except (TypeError, ValueError):
+        return None, np.nan
+
+
+# Chuyển các ô điểm thô của một khối sang (ma trận điểm chữ, điểm hệ 4, mặt nạ ô có điểm,
+# số ô ngoài khoảng đã bị kẹp). Cả khối được mã hóa theo giá trị (pd.factorize, băm
+# trong C); chỉ các giá trị khác nhau (vài trăm, dù khối có hàng trăm nghìn ô) được
+# phân tích bằng Python, thang điểm áp dụng một lần cho cả mảng rồi ánh xạ ngược về ma trận.
+def cells_to_letters(frame, scale=DEFAULT_SCALE):
+    import pandas as pd
+
+    cells = frame.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(cells.ravel())
+    parsed = [_parse_cell(value) for value in uniques]
+    # Phần tử cuối dành cho ô trống (mã -1): 'F', chưa học
+    numeric = np.array([score for _, score in parsed] + [np.nan])
+    letters, out_of_range = scale.grade(numeric)
+    taken = ~np.isnan(numeric)
+    for i, (letter, _) in enumerate(parsed):
+        if letter is not None:
+            letters[i] = letter
+            taken[i] = True
+    points = np.array([LETTER_TO_NUMERIC[letter] for letter in letters.tolist()])
+    clamped = int(np.bincount(codes[codes >= 0], minlength=len(uniques))[out_of_range[:-1]].sum())
+    shape = cells.shape
+    return letters[codes].reshape(shape), points[codes].reshape(shape), taken[codes].reshape(shape), clamped
+
+
+# Tải bộ dự đoán native nếu có, ngược lại pipeline sklearn (giống tiến trình con của pool suy luận)
+def _load_year_model(model_path):
+    model = load_native_predictor(model_path) if NATIVE_PREDICTORS else None
+    if model is None:
+        model = load_model_file(resolve_model_path(model_path))
+    return model, FeatureEncoder(model.feature_names_in_)
+
+
+def _init_worker(model_paths, subject_names, credits, thresholds=None):
+    index = {name: j for j, name in enumerate(subject_names)}
+    models = {}
+    for year, model_path in model_paths.items():
+        model, encoder = _load_year_model(model_path)
+        # Cặp (cột đặc trưng của mô hình, cột môn trong file) có cùng tên
+        pairs = [(i, index[name]) for i, name in enumerate(encoder.feature_names) if name in index]
+        feature_cols = np.array([i for i, _ in pairs], dtype=np.intp)
+        subject_cols = np.array([j for _, j in pairs], dtype=np.intp)
+        models[year] = (model, encoder, feature_cols, subject_cols)
+        logger.info("Tiến trình %d: mô hình năm %s dùng %d/%d môn có trong file",
+                    os.getpid(), year, len(pairs), len(encoder))
+    _worker_state['models'] = models
+    _worker_state['credits'] = np.asarray(credits, dtype=np.float64)
+    _worker_state['scale'] = GradeScale(thresholds) if thresholds else DEFAULT_SCALE
+
+
+def _predict_labels(model, encoder, features):
+    if hasattr(model, 'predict_encoded'):
+        return model.predict_encoded(features)
+    return model.predict(encoder.to_frame(features))
+
+
+# Chạy trong tiến trình con: chấm một khối, trả về các hàng kết quả
+def _score_chunk(passthrough, subjects):
+    letters, points, taken, clamped = cells_to_letters(subjects, _worker_state['scale'])
+    m = len(letters)
+    if clamped:
+        logger.warning("Tiến trình %d: %d ô điểm nằm ngoài khoảng hợp lệ đã được đưa về giới hạn", os.getpid(), clamped)
+
+    # GPA theo tín chỉ trên các môn có điểm (môn ngoài khung chương trình có 0 tín chỉ)
+    weights = taken * _worker_state['credits']
+    total_credits = weights.sum(axis=1)
+    averages = np.zeros(m)
+    np.divide((points * weights).sum(axis=1), total_credits, out=averages, where=total_credits > 0)
+
+    columns = [passthrough.to_numpy(dtype=object), np.round(averages, 2).reshape(-1, 1)]
+    for model, encoder, feature_cols, subject_cols in _worker_state['models'].values():
+        features = np.empty((m, len(encoder)), dtype=object)
+        features[:] = encoder.default
+        features[:, feature_cols] = np.where(taken[:, subject_cols], letters[:, subject_cols], encoder.default)
+        columns.append(np.asarray(_predict_labels(model, encoder, features), dtype=object).reshape(-1, 1))
+    rows = np.hstack(columns)
+    rows[rows != rows] = ''  # NaN ở các cột chép nguyên
+    return rows.tolist()
+
+
+# Ghép tên cột trong file với môn học: tên môn, mã môn hoặc đúng tên đặc trưng của mô hình
+def resolve_columns(header, catalog, feature_names):
+    subjects, passthrough = [], []
+    seen = {}
+    for position, raw in enumerate(header):
+        name = str(raw).strip() if raw is not None else ''
+        record = catalog.get_by_name(name) or catalog.get_by_code(name)
+        if record is not None:
+            name = record.name
+        elif name not in feature_names:
+            passthrough.append(position)
+            continue
+        if name in seen:
+            logger.warning("Cột '%s' trùng môn '%s' với cột '%s', dùng cột sau", raw, name, header[seen[name]])
+            subjects = [(p, n) for p, n in subjects if n != name]
+        seen[name] = position
+        subjects.append((position, name))
+    return subjects, passthrough
+
+
+# Đọc file theo khối, mỗi khối là một DataFrame các giá trị thô
+def read_chunks(path, chunk_size, sheet=None, encoding='utf-8-sig'):
+    import pandas as pd
+
+    path = Path(path)
+    if path.suffix.lower() in ('.xlsx', '.xlsm'):
+        import openpyxl
+
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet] if sheet else wb.worksheets[0]
+            rows = ws.iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            while header and header[-1] is None:
+                header.pop()
+            block = []
+            for row in rows:
+                if not any(value is not None for value in row):
+                    continue
+                block.append(row[:len(header)])
+                if len(block) >= chunk_size:
+                    yield pd.DataFrame(block, columns=range(len(header)), dtype=object), header
+                    block = []
+            if block:
+                yield pd.DataFrame(block, columns=range(len(header)), dtype=object), header
+        finally:
+            wb.close()
+        return
+
+    # CSV: đọc mọi cột dạng chuỗi để MSSV giữ nguyên số 0 ở đầu
+    reader = pd.read_csv(path, chunksize=chunk_size, dtype=str, encoding=encoding, skipinitialspace=True)
+    for chunk in reader:
+        header = list(chunk.columns)
+        chunk.columns = range(len(header))
+        yield chunk, header
+
+
+# Ghi kết quả tăng dần: CSV (utf-8-sig để Excel hiển thị đúng tiếng Việt) hoặc xlsx write-only
+class ResultWriter:
+    def __init__(self, path, header):
+        self.path = Path(path)
+        self.rows = 0
+        if self.path.suffix.lower() == '.xlsx':
+            import openpyxl
+
+            self._wb = openpyxl.Workbook(write_only=True)
+            self._ws = self._wb.create_sheet('Kết quả')
+            self._ws.append(header)
+            self._file = None
+        else:
+            self._wb = None
+            self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(header)
+
+    def write(self, rows):
+        if self._wb is not None:
+            for row in rows:
+                self._ws.append(row)
+        else:
+            self._csv.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.save(self.path)
+        else:
+            self._file.close()
+
+
+def score_file(input_path, output_path, model_paths, catalog, chunk_size=DEFAULT_CHUNK_SIZE, workers=None,
+               sheet=None, encoding='utf-8-sig', thresholds=None):
+    workers = workers or os.cpu_count() or 1
+    chunks = read_chunks(input_path, chunk_size, sheet=sheet, encoding=encoding)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError(f"File {input_path} không có dữ liệu")
+    header = first[1]
+
+    feature_names = set()
+    for model_path in model_paths.values():
+        model, _ = _load_year_model(model_path)
+        feature_names.update(model.feature_names_in_)
+    subjects, passthrough = resolve_columns(header, catalog, feature_names)
+    if not subjects:
+        raise ValueError("Không có cột nào trùng tên hoặc mã môn học trong khung chương trình")
+    subject_positions = [position for position, _ in subjects]
+    subject_names = [name for _, name in subjects]
+    credits = [catalog.get_by_name(name).credits if catalog.get_by_name(name) else 0 for name in subject_names]
+    logger.info("File %s: %d cột môn học, %d cột chép nguyên, năm %s",
+                input_path, len(subjects), len(passthrough), ", ".join(model_paths))
+
+    def tasks():
+        yield first[0]
+        for frame, _ in chunks:
+            yield frame
+
+    writer = ResultWriter(output_path, [header[p] for p in passthrough] + [AVERAGE_COLUMN] + list(model_paths))
+    started = time.perf_counter()
+    try:
+        if workers == 1:
+            _init_worker(model_paths, subject_names, credits, thresholds)
+            for frame in tasks():
+                writer.write(_score_chunk(frame[passthrough], frame[subject_positions]))
+        else:
+            # spawn: tiến trình con không kế thừa trạng thái của tiến trình đọc file
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_paths, subject_names, credits, thresholds),
+            ) as executor:
+                # Tối đa 2 khối cho mỗi tiến trình con đang chờ/đang chạy
+                pending = deque()
+                for frame in tasks():
+                    pending.append(executor.submit(_score_chunk, frame[passthrough], frame[subject_positions]))
+                    while len(pending) >= 2 * workers:
+                        writer.write(pending.popleft().result())
+                        logger.info("Đã chấm %d sinh viên", writer.rows)
+                while pending:
+                    writer.write(pending.popleft().result())
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    logger.info("Đã chấm %d sinh viên trong %.1f giây (%.0f sinh viên/giây), kết quả ở %s",
+                writer.rows, elapsed, writer.rows / elapsed if elapsed else 0.0, output_path)
+    return writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chấm hàng loạt file điểm sinh viên (.csv/.xlsx)")
+    parser.add_argument('input', help="File điểm: mỗi hàng một sinh viên, mỗi cột một môn học")
+    parser.add_argument('--output', '-o', required=True, help="File kết quả (.csv hoặc .xlsx)")
+    parser.add_argument('--year', action='append', help="Năm học cần dự đoán (lặp lại được, mặc định: mọi năm)")
+    parser.add_argument('--model-dir', default='./attached_assets')
+    parser.add_argument('--excel', default='./attached_assets/GiaoDien_KhungChuongTrinh.xlsx')
+    parser.add_argument('--json', default='./web_version/data/subjects.json')
+    parser.add_argument('--cache', default='./web_version/data/curriculum.cache.json')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Số sinh viên mỗi khối")
+    parser.add_argument('--workers', type=int, default=None, help="Số tiến trình con (mặc định: số lõi CPU)")
+    parser.add_argument('--sheet', help="Tên sheet trong file .xlsx (mặc định: sheet đầu tiên)")
+    parser.add_argument('--encoding', default='utf-8-sig', help="Bảng mã của file CSV")
+    parser.add_argument('--thresholds', help="Ngưỡng điểm A,B,C,D hệ 10, ví dụ 8.5,7.0,5.5,4.0 (mặc định: GRADE_THRESHOLDS)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    model_paths = discover_model_paths(args.model_dir)
+    if args.year:
+        unknown = [year for year in args.year if year not in model_paths]
+        if unknown:
+            parser.error(f"không có mô hình cho năm {', '.join(unknown)} trong {args.model_dir}")
+        model_paths = {year: model_paths[year] for year in args.year}
+    if not model_paths:
+        parser.error(f"không có file mô hình nào trong {args.model_dir}")
+
+    thresholds = None
+    try:
+        thresholds = parse_thresholds(args.thresholds)
+        if thresholds:
+            GradeScale(thresholds)
+    except ValueError as e:
+        parser.error(f"--thresholds không hợp lệ: {e}")
+
+    catalog = CurriculumCache(args.excel, args.json, cache_path=args.cache).refresh().catalog
+    score_file(args.input, args.output, model_paths, catalog, chunk_size=args.chunk_size, workers=args.workers,
+               sheet=args.sheet, encoding=args.encoding, thresholds=thresholds)
+
+
+if __name__ == '__main__':
+    main()
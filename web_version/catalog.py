@@ -0,0 +1,63 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Bản ghi gọn cho một môn học trong khung chương trình
+SubjectRecord = namedtuple('SubjectRecord', ['index', 'name', 'code', 'credits', 'semester'])
+
+
+# Danh mục môn học có chỉ mục băm theo tên (tenHocPhan) và mã (maHocPhan)
+class SubjectCatalog:
+    def __init__(self, subjects):
+        self.records = [
+            SubjectRecord(i, s['tenHocPhan'], s['maHocPhan'], int(s['soTinChi']), int(s['hocKy']))
+            for i, s in enumerate(subjects)
+        ]
+        self.by_name = {record.name: record for record in self.records}
+        self.by_code = {record.code: record for record in self.records}
+        self.credits = np.array([record.credits for record in self.records], dtype=np.float64)
+        self.semesters = np.array([record.semester for record in self.records], dtype=np.int16)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+    def get_by_code(self, code):
+        return self.by_code.get(code)
+
+    # Chuyển lại về dạng danh sách dict như subjects.json
+    def to_list(self):
+        return [
+            {'tenHocPhan': r.name, 'maHocPhan': r.code, 'soTinChi': r.credits, 'hocKy': r.semester}
+            for r in self.records
+        ]
+
+    # Tính GPA theo tín chỉ cho nhiều sinh viên cùng lúc.
+    # Mỗi điểm hợp lệ thành một phần tử (hàng, cột, điểm hệ 4); tổng có trọng số
+    # được cộng dồn bằng np.bincount nên chi phí tuyến tính theo tổng số điểm.
+    def weighted_averages(self, students_scores, letter_points):
+        rows, cols, points = [], [], []
+        by_name = self.by_name
+        for row, scores in enumerate(students_scores):
+            for score in scores:
+                letter_grade = score['score'].upper() if isinstance(score['score'], str) else score['score']
+                record = by_name.get(score['subjectName'])
+                if record is None or letter_grade not in letter_points:
+                    continue
+                rows.append(row)
+                cols.append(record.index)
+                points.append(letter_points[letter_grade])
+
+        n_students = len(students_scores)
+        rows = np.asarray(rows, dtype=np.intp)
+        credits = self.credits[np.asarray(cols, dtype=np.intp)]
+        weighted = np.bincount(rows, weights=np.asarray(points, dtype=np.float64) * credits, minlength=n_students)
+        total_credits = np.bincount(rows, weights=credits, minlength=n_students)
+        averages = np.zeros(n_students, dtype=np.float64)
+        np.divide(weighted, total_credits, out=averages, where=total_credits > 0)
+        return averages
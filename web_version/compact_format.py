@@ -0,0 +1,177 @@
+# Định dạng request gọn cho hệ thống tích hợp gửi số lượng lớn.
+#
+# Thay vì mỗi môn là một object JSON lặp lại subjectCode/subjectName/credits/semester,
+# client gửi một chuỗi điểm chữ (hoặc mảng byte ASCII), mỗi ký tự ứng với một môn
+# theo đúng thứ tự của /api/subjects:
+#
+#   {"year": "nam4", "curriculum": "<ETag của /api/subjects>", "grades": "AB-CF..."}
+#
+# 'A'..'D', 'F' (không phân biệt hoa thường) là điểm chữ; '-', '.', '_' hoặc khoảng
+# trắng là môn chưa có điểm. 'curriculum' là phiên bản chỉ mục khung chương trình
+# (ETag); nếu khung chương trình đã đổi, server trả 409 kèm phiên bản hiện tại để
+# client tải lại /api/subjects. Body có thể là JSON hoặc msgpack (Content-Type
+# application/msgpack, cần cài gói msgpack), nén gzip/deflate (Content-Encoding).
+# Chuỗi điểm được giải mã bằng một bảng tra trên cả mảng byte, GPA tính bằng một
+# phép nhân vector với số tín chỉ và hàng đặc trưng của mô hình được điền trực
+# tiếp mà không dựng danh sách dict nào.
+import json
+import zlib
+
+import numpy as np
+
+try:
+    from .grading import GRADE_LETTERS, LETTER_TO_NUMERIC
+except ImportError:
+    from grading import GRADE_LETTERS, LETTER_TO_NUMERIC
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Ký tự đánh dấu môn chưa có điểm
+ABSENT_MARKS = b'-._ '
+
+# Mã của môn chưa có điểm; mã 0..4 là chỉ số trong GRADE_LETTERS
+ABSENT = len(GRADE_LETTERS)
+_INVALID = 255
+
+# Bảng tra byte -> mã điểm
+_CODES = np.full(256, _INVALID, dtype=np.uint8)
+for _code, _letter in enumerate(GRADE_LETTERS):
+    _CODES[ord(_letter)] = _code
+    _CODES[ord(_letter.lower())] = _code
+_CODES[np.frombuffer(ABSENT_MARKS, dtype=np.uint8)] = ABSENT
+
+# Mã điểm -> điểm chữ / điểm hệ 4 (môn chưa có điểm không được dùng)
+_LETTERS = np.array(GRADE_LETTERS + (None,), dtype=object)
+_POINTS = np.array([LETTER_TO_NUMERIC[letter] for letter in GRADE_LETTERS] + [0.0])
+
+
+# Lỗi định dạng request gọn; status là mã HTTP trả về cho client
+class CompactFormatError(ValueError):
+    status = 400
+
+    def __init__(self, message, status=None, **details):
+        super().__init__(message)
+        if status is not None:
+            self.status = status
+        self.details = details
+
+
+# Request dùng định dạng gọn nếu có trường 'grades'
+def is_compact(data):
+    return isinstance(data, dict) and 'grades' in data
+
+
+# Giải nén body theo Content-Encoding, giới hạn kích thước sau giải nén
+def _decompress(body, content_encoding, max_bytes):
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return body
+    if encoding in ('gzip', 'x-gzip'):
+        wbits = 16 + zlib.MAX_WBITS
+    elif encoding == 'deflate':
+        wbits = zlib.MAX_WBITS
+    else:
+        raise CompactFormatError(f"Không hỗ trợ Content-Encoding {content_encoding}", status=415)
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        data = decompressor.decompress(body, max_bytes)
+    except zlib.error as e:
+        raise CompactFormatError(f"Body nén không hợp lệ: {e}")
+    if decompressor.unconsumed_tail:
+        raise CompactFormatError(f"Body sau khi giải nén vượt quá {max_bytes} byte", status=413)
+    return data
+
+
+# Đọc body request (JSON hoặc msgpack, có thể nén) thành dict
+def read_payload(body, mimetype, content_encoding=None, max_bytes=16 << 20):
+    body = _decompress(body, content_encoding, max_bytes)
+    if mimetype in MSGPACK_MIMETYPES:
+        try:
+            import msgpack
+        except ImportError:
+            raise CompactFormatError("Server chưa cài gói msgpack, hãy gửi JSON", status=415)
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise CompactFormatError(f"Body msgpack không hợp lệ: {e}")
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise CompactFormatError(f"Body JSON không hợp lệ: {e}")
+
+
+# ETag có thể được gửi nguyên dạng header ('W/"..."' hoặc '"..."')
+def _normalize_version(version):
+    version = str(version or '').strip()
+    if version.startswith('W/'):
+        version = version[2:]
+    return version.strip('"')
+
+
+# Mã điểm (mảng uint8, mỗi môn một phần tử) từ request gọn, kiểm tra phiên bản
+# chỉ mục khung chương trình và độ dài/ký tự của chuỗi điểm
+def decode_grades(data, snapshot):
+    version = _normalize_version(data.get('curriculum'))
+    if version != snapshot.etag:
+        raise CompactFormatError(
+            "Chỉ mục khung chương trình đã thay đổi, hãy tải lại /api/subjects" if version
+            else "Thiếu trường 'curriculum' (ETag của /api/subjects)",
+            status=409 if version else 400, curriculum=snapshot.etag
+        )
+    grades = data.get('grades')
+    if isinstance(grades, str):
+        try:
+            grades = grades.encode('ascii')
+        except UnicodeEncodeError:
+            raise CompactFormatError("Chuỗi điểm chỉ được chứa ký tự ASCII")
+    elif not isinstance(grades, (bytes, bytearray, memoryview)):
+        raise CompactFormatError("Trường 'grades' phải là chuỗi hoặc mảng byte")
+    codes = _CODES[np.frombuffer(grades, dtype=np.uint8)]
+    if len(codes) != len(snapshot.catalog):
+        raise CompactFormatError(
+            f"Chuỗi điểm có {len(codes)} ký tự, khung chương trình có {len(snapshot.catalog)} môn",
+            curriculum=snapshot.etag
+        )
+    invalid = np.flatnonzero(codes == _INVALID)
+    if len(invalid):
+        position = int(invalid[0])
+        raise CompactFormatError(
+            f"Ký tự {bytes(grades[position:position + 1])!r} tại vị trí {position} không hợp lệ. "
+            f"Điểm phải là A, B, C, D, F hoặc '-' nếu chưa có điểm."
+        )
+    return codes
+
+
+# Chuỗi điểm chuẩn hóa (chữ hoa, '-' cho môn chưa có điểm), dùng để lưu bài nộp
+def grades_text(codes):
+    return ''.join(letter or '-' for letter in _LETTERS[codes])
+
+
+# GPA hệ 4 theo tín chỉ của các môn đã có điểm
+def weighted_average(codes, catalog):
+    credits = np.where(codes != ABSENT, catalog.credits, 0.0)
+    total_credits = credits.sum()
+    if total_credits <= 0:
+        return 0.0
+    return float(_POINTS[codes] @ credits / total_credits)
+
+
+# Hàng đặc trưng (ma trận 1 x n) theo thứ tự feature_names_in_ của mô hình
+def encode_features(codes, catalog, encoder):
+    row = encoder.encode(())
+    index = encoder.index
+    for record, code in zip(catalog.records, codes.tolist()):
+        if code != ABSENT:
+            i = index.get(record.name)
+            if i is not None:
+                row[0, i] = GRADE_LETTERS[code]
+    return row
+
+
+# Danh sách điểm dạng đầy đủ như /api/submit (dùng cho xuất Excel)
+def expand_scores(codes, catalog):
+    return [
+        {'subjectName': record.name, 'subjectCode': record.code, 'credits': record.credits,
+         'semester': record.semester, 'score': GRADE_LETTERS[code]}
+        for record, code in zip(catalog.records, codes.tolist()) if code != ABSENT
+    ]
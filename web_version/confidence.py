@@ -0,0 +1,55 @@
+# Nhãn dự đoán kèm độ tin cậy (xác suất hoặc biên quyết định) trong một lượt suy luận.
+#
+# - Bộ dự đoán native: nhãn và điểm được tính từ cùng một lần tính kernel/tích vô hướng.
+# - Pipeline sklearn có predict_proba nhưng không phải SVM (Logistic Regression):
+#   nhãn là argmax của xác suất, đúng như predict.
+# - SVM (sklearn và native): nhãn của libsvm là kết quả bỏ phiếu one-vs-one, không phải
+#   argmax xác suất Platt (hai giá trị này khác nhau ở phần lớn các hàng), nên dù mô hình
+#   có probability=True vẫn chỉ trả decision_function dạng 'ovr' (= số phiếu + phần tin
+#   cậy trong khoảng (-1/3, 1/3)): làm tròn ra số phiếu, lớp đầu tiên nhiều phiếu nhất
+#   thắng; với break_ties nhãn là argmax của chính biên đó.
+import numpy as np
+
+PROBABILITY = 'probability'
+DECISION_FUNCTION = 'decision_function'
+
+
+def _final_estimator(model):
+    steps = getattr(model, 'steps', None)
+    return steps[-1][1] if steps else model
+
+
+# Trả về (nhãn, ma trận điểm hoặc None, loại điểm hoặc None) cho ma trận điểm chữ.
+# to_frame(features) dựng DataFrame cho pipeline sklearn.
+def predict_with_confidence(model, features, to_frame):
+    if hasattr(model, 'predict_scores_encoded'):
+        return model.predict_scores_encoded(features)
+
+    X = to_frame(features)
+    final = _final_estimator(model)
+    classes = np.asarray(model.classes_, dtype=object)
+    if hasattr(final, 'support_vectors_'):
+        if hasattr(model, 'decision_function'):
+            dec = np.asarray(model.decision_function(X))
+            if dec.ndim == 1:
+                return classes[(dec > 0).astype(np.intp)], dec.reshape(-1, 1), DECISION_FUNCTION
+            if getattr(final, 'decision_function_shape', 'ovr') == 'ovr':
+                votes = dec if getattr(final, 'break_ties', False) else np.rint(dec)
+                return classes[votes.argmax(axis=1)], dec, DECISION_FUNCTION
+        return np.asarray(model.predict(X), dtype=object), None, None
+    if hasattr(model, 'predict_proba'):
+        proba = np.asarray(model.predict_proba(X))
+        return classes[proba.argmax(axis=1)], proba, PROBABILITY
+    return np.asarray(model.predict(X), dtype=object), None, None
+
+
+# Độ tin cậy của một hàng dưới dạng {'type', 'scores': {nhãn: giá trị}} cho response JSON
+def confidence_payload(classes, row_scores, score_type):
+    if row_scores is None or score_type is None:
+        return None
+    if len(row_scores) == len(classes):
+        scores = {str(label): round(float(value), 6) for label, value in zip(classes, row_scores)}
+    else:
+        # SVM nhị phân: một biên duy nhất, dương nghiêng về lớp thứ hai
+        scores = {str(classes[-1]): round(float(row_scores[0]), 6)}
+    return {'type': score_type, 'scores': scores}
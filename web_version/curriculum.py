@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from .catalog import SubjectCatalog
+except ImportError:
+    from catalog import SubjectCatalog
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng file cache khung chương trình
+CURRICULUM_CACHE_VERSION = 1
+
+# Ảnh chụp khung chương trình đã phân tích: danh sách môn, danh mục có chỉ mục,
+# nội dung JSON đã tuần tự hóa sẵn cho /api/subjects cùng ETag/Last-Modified
+CurriculumSnapshot = namedtuple(
+    'CurriculumSnapshot', ['subjects', 'catalog', 'body', 'etag', 'last_modified', 'source_digest']
+)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Đọc file Excel khung chương trình bằng các phép toán theo cột (không dùng iterrows)
+def parse_curriculum_excel(excel_path):
+    import pandas as pd
+
+    df = pd.read_excel(excel_path)
+    df = df[df['Mã Học Phần'].notna() & df['Học Kỳ'].notna()]
+    credits = df['Số Tín Chỉ'].fillna(0).astype(int)
+    semesters = df['Học Kỳ'].astype(int)
+    return [
+        {'tenHocPhan': name, 'maHocPhan': code, 'soTinChi': credit, 'hocKy': semester}
+        for name, code, credit, semester in zip(
+            df['Tên Học Phần'].tolist(), df['Mã Học Phần'].tolist(), credits.tolist(), semesters.tolist()
+        )
+    ]
+
+
+# Cache khung chương trình trong tiến trình. File Excel chỉ được phân tích lại
+# khi mtime/kích thước thay đổi và nội dung (sha256) thực sự khác.
+# Kết quả phân tích được lưu vào cache_path (JSON gọn, khóa theo sha256 của file
+# Excel) nên tiến trình mới khởi động không cần import pandas/openpyxl nếu Excel
+# không đổi. Dựng trước khi triển khai: python -m web_version.curriculum
+class CurriculumCache:
+    def __init__(self, excel_path, json_path, check_interval=5.0, cache_path=None):
+        self.excel_path = excel_path
+        self.json_path = json_path
+        self.cache_path = cache_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._last_check = 0.0
+        self._snapshot = self._build_snapshot([], None, 0)
+
+    @staticmethod
+    def _build_snapshot(subjects, source_digest, last_modified):
+        body = json.dumps(subjects, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        return CurriculumSnapshot(subjects, SubjectCatalog(subjects), body, etag, int(last_modified), source_digest)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    # Trả về ảnh chụp hiện tại, kiểm tra file nguồn tối đa mỗi check_interval giây
+    def get(self):
+        if time.monotonic() - self._last_check < self.check_interval:
+            return self._snapshot
+        return self.refresh()
+
+    # Kiểm tra file nguồn ngay lập tức
+    def refresh(self):
+        with self._lock:
+            self._last_check = time.monotonic()
+            self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.excel_path)
+        except OSError as e:
+            if self._snapshot.source_digest is None:
+                logger.error("Không đọc được file Excel %s: %s, dùng %s", self.excel_path, str(e), self.json_path)
+                self._load_json_fallback()
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        digest = _file_digest(self.excel_path)
+        self._stamp = stamp
+        if digest == self._snapshot.source_digest:
+            return
+        subjects = self._read_cache(digest)
+        if subjects is not None:
+            self._snapshot = self._build_snapshot(subjects, digest, stat.st_mtime)
+            logger.info("Đã đọc khung chương trình (%d môn) từ cache %s", len(subjects), self.cache_path)
+            return
+        try:
+            subjects = parse_curriculum_excel(self.excel_path)
+        except Exception as e:
+            logger.error("Lỗi khi đọc file Excel: %s", str(e))
+            if self._snapshot.source_digest is None:
+                self._load_json_fallback()
+            return
+        self._snapshot = self._build_snapshot(subjects, digest, stat.st_mtime)
+        try:
+            self._write_json(subjects)
+            self._write_cache(subjects, digest)
+        except OSError as e:
+            logger.error("Lỗi khi ghi %s/%s: %s", self.json_path, self.cache_path, str(e))
+        logger.info("Đã đọc khung chương trình (%d môn) từ %s", len(subjects), self.excel_path)
+
+    # Danh sách môn đã phân tích từ đúng nội dung Excel này, hoặc None nếu cache thiếu/cũ
+    def _read_cache(self, digest):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get('version') != CURRICULUM_CACHE_VERSION or cached.get('source_digest') != digest:
+            return None
+        return cached.get('subjects')
+
+    def _write_cache(self, subjects, digest):
+        if not self.cache_path:
+            return
+        content = json.dumps(
+            {'version': CURRICULUM_CACHE_VERSION, 'source_digest': digest, 'subjects': subjects},
+            ensure_ascii=False, separators=(',', ':')
+        )
+        # Tên file tạm theo pid vì nhiều worker có thể ghi cùng lúc
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, self.cache_path)
+
+    # Ghi subjects.json cho frontend, bỏ qua nếu nội dung không đổi
+    def _write_json(self, subjects):
+        content = json.dumps(subjects, ensure_ascii=False, indent=2)
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                if f.read() == content:
+                    return
+        except OSError:
+            pass
+        tmp_path = self.json_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, self.json_path)
+
+    # Không có file Excel: dùng subjects.json đã tạo từ trước
+    def _load_json_fallback(self):
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                subjects = json.load(f)
+            self._snapshot = self._build_snapshot(subjects, None, os.stat(self.json_path).st_mtime)
+        except (OSError, ValueError) as e:
+            logger.error("Lỗi khi đọc %s: %s", self.json_path, str(e))
+
+
+# Dựng lại cache khung chương trình và subjects.json từ file Excel (bước build khi triển khai)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dựng cache khung chương trình từ file Excel")
+    parser.add_argument('--excel', default='./attached_assets/GiaoDien_KhungChuongTrinh.xlsx')
+    parser.add_argument('--json', default='./web_version/data/subjects.json')
+    parser.add_argument('--cache', default='./web_version/data/curriculum.cache.json')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    digest = _file_digest(args.excel)
+    subjects = parse_curriculum_excel(args.excel)
+    cache = CurriculumCache(args.excel, args.json, cache_path=args.cache)
+    cache._write_json(subjects)
+    cache._write_cache(subjects, digest)
+    logger.info("Đã ghi %d môn vào %s và %s", len(subjects), args.cache, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import re
+import tempfile
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+SCORE_HEADERS = ["Học kỳ", "Mã học phần", "Môn học", "Số tín chỉ", "Điểm"]
+CLASS_HEADERS = ["Sinh viên", "Năm học"] + SCORE_HEADERS
+
+# Ký tự không được phép trong tên sheet Excel
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+# Các style được đăng ký một lần cho mỗi workbook; ô chỉ tham chiếu theo tên
+# thay vì tạo Border/Side/Alignment mới cho từng ô
+def _register_styles(wb):
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    center = Alignment(horizontal='center')
+    styles = [
+        NamedStyle(name='kq_title', font=Font(bold=True, size=14), alignment=center),
+        NamedStyle(name='kq_header', font=Font(bold=True), alignment=center, border=border,
+                   fill=PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")),
+        NamedStyle(name='kq_cell', border=border),
+        NamedStyle(name='kq_cell_center', border=border, alignment=center),
+        NamedStyle(name='kq_avg_label', font=Font(bold=True), alignment=Alignment(horizontal='right')),
+        NamedStyle(name='kq_avg_value', font=Font(bold=True), alignment=center),
+    ]
+    for style in styles:
+        wb.add_named_style(style)
+
+
+def _cell(ws, value, style):
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+# Điểm hiển thị: ưu tiên điểm số gốc nếu có, ngược lại dùng điểm chữ
+def _display_score(score):
+    display_score = score.get('original_score', '')
+    if not isinstance(display_score, (int, float)):
+        display_score = score['score']
+    return display_score
+
+
+def _score_row(ws, score, prefix=()):
+    values = [
+        f"Học kỳ {score['semester']}",
+        score['subjectCode'],
+        score['subjectName'],
+        score['credits'],
+        _display_score(score)
+    ]
+    row = [_cell(ws, value, 'kq_cell') for value in prefix]
+    for col, value in enumerate(values, 1):
+        row.append(_cell(ws, value, 'kq_cell_center' if col in (1, 4, 5) else 'kq_cell'))
+    return row
+
+
+def _sheet_title(name, used):
+    base = _INVALID_SHEET_CHARS.sub('_', str(name)).strip() or 'Sinh viên'
+    base = base[:31]
+    title = base
+    suffix = 2
+    while title.lower() in used:
+        tail = f" ({suffix})"
+        title = base[:31 - len(tail)] + tail
+        suffix += 1
+    used.add(title.lower())
+    return title
+
+
+# Một sheet kết quả điểm giống hệt bản xuất từng sinh viên của /api/export-excel
+def _write_student_sheet(wb, title, scores, avg_score):
+    ws = wb.create_sheet(title=title)
+    for col in 'ABCDE':
+        ws.column_dimensions[col].width = 15
+    ws.merged_cells.add('A1:E1')
+    ws.append([_cell(ws, "Kết quả điểm học tập", 'kq_title')])
+    ws.append([])
+    ws.append([_cell(ws, header, 'kq_header') for header in SCORE_HEADERS])
+    for score in sorted(scores, key=lambda x: x['semester']):
+        ws.append(_score_row(ws, score))
+    ws.append([None, None, None,
+               _cell(ws, "Điểm trung bình:", 'kq_avg_label'),
+               _cell(ws, round(avg_score, 2), 'kq_avg_value')])
+
+
+# Cả lớp trong một sheet chi tiết (mỗi dòng một môn) cùng một sheet tổng hợp GPA
+def _write_class_sheets(wb, students, avg_scores):
+    ws = wb.create_sheet(title="Chi tiết")
+    for col, width in zip('ABCDEFG', (20, 10, 12, 15, 35, 12, 10)):
+        ws.column_dimensions[col].width = width
+    ws.freeze_panes = 'A2'
+    ws.append([_cell(ws, header, 'kq_header') for header in CLASS_HEADERS])
+    for student in students:
+        prefix = (student.get('name') or student.get('id') or '', student.get('year', 'nam1'))
+        for score in sorted(student.get('scores', []), key=lambda x: x['semester']):
+            ws.append(_score_row(ws, score, prefix))
+
+    summary = wb.create_sheet(title="Tổng hợp")
+    for col, width in zip('ABCD', (20, 25, 10, 15)):
+        summary.column_dimensions[col].width = width
+    summary.freeze_panes = 'A2'
+    summary.append([_cell(summary, header, 'kq_header') for header in ("Mã sinh viên", "Họ tên", "Năm học", "Điểm trung bình")])
+    for student, avg_score in zip(students, avg_scores):
+        summary.append([
+            _cell(summary, student.get('id', ''), 'kq_cell'),
+            _cell(summary, student.get('name', ''), 'kq_cell'),
+            _cell(summary, student.get('year', 'nam1'), 'kq_cell_center'),
+            _cell(summary, round(avg_score, 2), 'kq_cell_center'),
+        ])
+
+
+# Dựng workbook ở chế độ write-only (các dòng được ghi thẳng ra file tạm,
+# không giữ toàn bộ ô trong bộ nhớ) và trả về file tạm đã tua về đầu.
+# layout='sheets': mỗi sinh viên một sheet; layout='class': cả lớp trong một sheet.
+# openpyxl chỉ được import khi thực sự xuất file
+def write_scores_workbook(students, avg_scores, layout='sheets'):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    _register_styles(wb)
+    if layout == 'class':
+        _write_class_sheets(wb, students, avg_scores)
+    else:
+        used_titles = set()
+        for i, (student, avg_score) in enumerate(zip(students, avg_scores), 1):
+            name = student.get('name') or student.get('id') or ("Kết quả điểm" if len(students) == 1 else f"Sinh viên {i}")
+            _write_student_sheet(wb, _sheet_title(name, used_titles), student.get('scores', []), avg_score)
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return output
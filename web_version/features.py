@@ -0,0 +1,54 @@
+import numpy as np
+
+# Điểm chữ hợp lệ làm đầu vào cho mô hình
+VALID_LETTERS = frozenset('ABCDF')
+
+
+# Bộ mã hóa đặc trưng được dựng một lần khi tải mô hình:
+# ánh xạ tên môn học -> chỉ số cột theo đúng thứ tự feature_names_in_
+class FeatureEncoder:
+    def __init__(self, feature_names, default='F'):
+        self.feature_names = list(feature_names)
+        # pd.Index dựng khi cần DataFrame lần đầu, để bộ dự đoán native không phải import pandas
+        self._columns = None
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+        self.default = default
+        # Hàng mẫu đã điền sẵn điểm mặc định, mỗi request chỉ cần sao chép
+        self._template = np.full(len(self.feature_names), default, dtype=object)
+
+    def __len__(self):
+        return len(self.feature_names)
+
+    # Ghi điểm chữ của một sinh viên vào một hàng đã cấp phát
+    def fill_row(self, row, scores):
+        index = self.index
+        for score in scores:
+            i = index.get(score['subjectName'])
+            if i is None:
+                continue
+            letter_grade = score['score'].upper() if isinstance(score['score'], str) else score['score']
+            if letter_grade in VALID_LETTERS:
+                row[i] = letter_grade
+        return row
+
+    # Mã hóa một sinh viên thành ma trận 1 x n_features
+    def encode(self, scores):
+        row = self._template.copy()
+        self.fill_row(row, scores)
+        return row.reshape(1, -1)
+
+    # Mã hóa nhiều sinh viên thành ma trận m x n_features
+    def encode_many(self, students_scores):
+        matrix = np.empty((len(students_scores), len(self.feature_names)), dtype=object)
+        matrix[:] = self._template
+        for row, scores in zip(matrix, students_scores):
+            self.fill_row(row, scores)
+        return matrix
+
+    # Pipeline sklearn chọn cột theo tên nên cần DataFrame; dựng một lần từ ma trận
+    def to_frame(self, matrix):
+        import pandas as pd
+
+        if self._columns is None:
+            self._columns = pd.Index(self.feature_names)
+        return pd.DataFrame(matrix, columns=self._columns, copy=False)
@@ -0,0 +1,91 @@
+# Quy đổi điểm hệ 10 sang điểm chữ và điểm hệ 4 trên cả mảng.
+#
+# Ngưỡng điểm được áp dụng bằng một lần np.digitize cho cả cột/ma trận điểm nên
+# chi phí quy đổi không đáng kể kể cả với cả khóa sinh viên. Ngưỡng mặc định
+# 8.5/7.0/5.5/4.0 có thể đổi bằng biến môi trường GRADE_THRESHOLDS="8.5,7,5.5,4".
+import os
+
+import numpy as np
+
+# Điểm chữ từ cao đến thấp
+GRADE_LETTERS = ('A', 'B', 'C', 'D', 'F')
+
+# Ngưỡng thấp nhất (hệ 10) để đạt từng điểm chữ A, B, C, D; dưới ngưỡng cuối là F
+DEFAULT_THRESHOLDS = (8.5, 7.0, 5.5, 4.0)
+
+# Khoảng điểm hệ 10 hợp lệ
+SCORE_MIN = 0.0
+SCORE_MAX = 10.0
+
+# Định nghĩa chuyển đổi từ điểm chữ sang điểm số (GPA)
+LETTER_TO_NUMERIC = {
+    'A': 4.0,
+    'B': 3.0,
+    'C': 2.0,
+    'D': 1.0,
+    'F': 0.0
+}
+
+
+# Đọc danh sách ngưỡng dạng "8.5,7.0,5.5,4.0"; chuỗi rỗng trả về None
+def parse_thresholds(text):
+    if not text or not text.strip():
+        return None
+    return tuple(float(value) for value in text.split(','))
+
+
+class GradeScale:
+    def __init__(self, thresholds=DEFAULT_THRESHOLDS, score_min=SCORE_MIN, score_max=SCORE_MAX):
+        thresholds = tuple(float(value) for value in thresholds)
+        if len(thresholds) != len(GRADE_LETTERS) - 1:
+            raise ValueError(f"Cần {len(GRADE_LETTERS) - 1} ngưỡng điểm cho {', '.join(GRADE_LETTERS[:-1])}, nhận {len(thresholds)}")
+        if any(high <= low for high, low in zip(thresholds, thresholds[1:])):
+            raise ValueError(f"Ngưỡng điểm phải giảm dần: {thresholds}")
+        if thresholds[0] > score_max or thresholds[-1] < score_min:
+            raise ValueError(f"Ngưỡng điểm phải nằm trong khoảng {score_min}-{score_max}: {thresholds}")
+        self.thresholds = thresholds
+        self.score_min = score_min
+        self.score_max = score_max
+        # np.digitize cần ngưỡng tăng dần: chỉ số 0 là F, chỉ số cuối là A
+        self._bins = np.array(thresholds[::-1])
+        self._letters = np.array(GRADE_LETTERS[::-1], dtype=object)
+        self._points = np.array([LETTER_TO_NUMERIC[letter] for letter in GRADE_LETTERS[::-1]])
+
+    # Đưa điểm về khoảng hợp lệ; trả về (điểm đã kẹp, mặt nạ ô ngoài khoảng).
+    # NaN (ô không phải số) giữ nguyên và không tính là ngoài khoảng.
+    def clamp(self, scores):
+        scores = np.asarray(scores, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            out_of_range = (scores < self.score_min) | (scores > self.score_max)
+        return np.clip(scores, self.score_min, self.score_max), out_of_range
+
+    # Chỉ số điểm chữ (0 = F ... 4 = A) cho từng điểm; NaN nhận F
+    def _indices(self, scores):
+        clamped, out_of_range = self.clamp(scores)
+        indices = np.digitize(clamped, self._bins)
+        indices[np.isnan(clamped)] = 0
+        return indices, out_of_range
+
+    # Điểm chữ và mặt nạ ô ngoài khoảng, cùng hình dạng với đầu vào
+    def grade(self, scores):
+        indices, out_of_range = self._indices(scores)
+        return self._letters[indices], out_of_range
+
+    def to_letters(self, scores):
+        return self.grade(scores)[0]
+
+    # Điểm hệ 4 tương ứng với điểm chữ của từng điểm hệ 10
+    def to_points(self, scores):
+        return self._points[self._indices(scores)[0]]
+
+
+DEFAULT_SCALE = GradeScale(parse_thresholds(os.environ.get('GRADE_THRESHOLDS', '')) or DEFAULT_THRESHOLDS)
+
+
+# Chuyển một điểm số sang điểm chữ theo thang điểm (giá trị không phải số nhận F)
+def numeric_to_letter(score, scale=DEFAULT_SCALE):
+    try:
+        score = float(score)
+    except (TypeError, ValueError):
+        return GRADE_LETTERS[-1]
+    return scale.to_letters([score])[0]
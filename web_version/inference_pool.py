@@ -0,0 +1,239 @@
+# Backend suy luận đa tiến trình (tùy chọn, bật bằng INFERENCE_BACKEND=pool).
+#
+# Mỗi tiến trình con giữ sẵn cả bốn mô hình nam1..nam4 (nạp qua model_store nên
+# bản .joblib được memory-map và dùng chung page cache). Luồng điều phối trong
+# tiến trình web gom các request đến trong vài mili giây thành một lô theo năm
+# học và gọi model.predict một lần cho cả lô trong một tiến trình con, nên
+# thông lượng tăng theo số lõi thay vì bị giới hạn bởi GIL.
+# Mỗi tác vụ mang theo mã phiên bản mô hình mà tiến trình web đang phục vụ; tiến
+# trình con thấy phiên bản khác thì nạp lại file của năm đó trước khi dự đoán, nên
+# tải lại nóng mô hình không cần khởi động lại pool.
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from .confidence import confidence_payload, predict_with_confidence
+    from .model_registry import loaded_version_id
+    from .model_store import load_model_file, resolve_model_path
+    from .native_predictor import NATIVE_PREDICTORS, load_native_predictor
+except ImportError:
+    from confidence import confidence_payload, predict_with_confidence
+    from model_registry import loaded_version_id
+    from model_store import load_model_file, resolve_model_path
+    from native_predictor import NATIVE_PREDICTORS, load_native_predictor
+
+logger = logging.getLogger(__name__)
+
+# Mô hình đã nạp trong tiến trình con: năm -> (mã phiên bản, mô hình)
+_worker_models = {}
+
+
+def _load_worker_model(model_path):
+    model = load_native_predictor(model_path) if NATIVE_PREDICTORS else None
+    if model is None:
+        model = load_model_file(resolve_model_path(model_path))
+    return loaded_version_id(model, model_path), model
+
+
+def _init_worker(model_paths):
+    for year, model_path in model_paths.items():
+        try:
+            _worker_models[year] = _load_worker_model(model_path)
+        except Exception as e:
+            # Năm không nạp được sẽ báo lỗi khi có request, tiến trình web dùng GPA dự phòng
+            logger.error("Tiến trình suy luận %d không tải được mô hình năm %s: %s", os.getpid(), year, str(e))
+
+
+# Giữ tiến trình con bận một chút để mỗi tác vụ khởi động rơi vào một tiến trình khác nhau
+def _worker_ready(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _to_frame(model, matrix):
+    import pandas as pd
+    return pd.DataFrame(matrix, columns=model.feature_names_in_)
+
+
+# Mô hình của năm trong tiến trình con; nạp lại từ model_path nếu phiên bản khác
+# phiên bản tiến trình web yêu cầu (None: dùng mô hình đang có)
+def _worker_model(year, version, model_path):
+    loaded = _worker_models.get(year)
+    if loaded is not None and (version is None or loaded[0] == version):
+        return loaded[1]
+    if version is None or not model_path:
+        raise RuntimeError(f"Tiến trình suy luận không có mô hình cho năm {year}")
+    loaded = _load_worker_model(model_path)
+    if loaded[0] != version:
+        # File lại thay đổi sau khi tiến trình web tải phiên bản này
+        raise RuntimeError(f"File mô hình năm {year} là phiên bản {loaded[0]}, yêu cầu {version}")
+    _worker_models[year] = loaded
+    logger.info("Tiến trình suy luận %d đã nạp mô hình năm %s phiên bản %s", os.getpid(), year, version)
+    return loaded[1]
+
+
+# Chạy trong tiến trình con. Mỗi hàng là một chuỗi điểm chữ theo đúng thứ tự
+# feature_names_in_ (mỗi môn một ký tự), gọn để truyền qua pipe.
+# Trả về (nhãn, độ tin cậy) cho từng hàng.
+def _predict_rows(year, rows, version=None, model_path=None):
+    model = _worker_model(year, version, model_path)
+    matrix = np.array([list(row) for row in rows], dtype=object)
+    labels, scores, score_type = predict_with_confidence(model, matrix, lambda m: _to_frame(model, m))
+    return [
+        (label, confidence_payload(model.classes_, scores[i] if scores is not None else None, score_type))
+        for i, label in enumerate(labels.tolist())
+    ]
+
+
+class InferencePool:
+    def __init__(self, model_paths, workers=None, batch_window=0.002, max_batch=256, chunk_size=2048):
+        self.model_paths = dict(model_paths)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._queue = None
+        self._dispatcher = None
+        self.batches = 0
+        self.batched_rows = 0
+        atexit.register(self.shutdown)
+
+    # Pool và luồng điều phối được tạo theo từng tiến trình web (sau fork của gunicorn).
+    # Gọi khi đang giữ self._lock: mọi lần gửi tác vụ đều giữ khóa nên shutdown() không
+    # thể chen vào giữa, và không request nào rơi vào hàng đợi đã được đóng.
+    def _start_locked(self):
+        if self._pid == os.getpid() and self._executor is not None:
+            return
+        # spawn: tiến trình con không kế thừa luồng/khóa của tiến trình web
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_paths,)
+        )
+        self._queue = queue.Queue()
+        self._pid = os.getpid()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop, args=(self._executor, self._queue), name='inference-dispatcher', daemon=True
+        )
+        self._dispatcher.start()
+        logger.info("Đã khởi động pool suy luận với %d tiến trình", self.workers)
+
+    # Khởi động trước các tiến trình con (tải mô hình) để request đầu không phải chờ
+    def warm_up(self):
+        with self._lock:
+            self._start_locked()
+            futures = [self._executor.submit(_worker_ready, 0.05) for _ in range(self.workers)]
+        return sorted({future.result() for future in futures})
+
+    # Đưa một hàng vào hàng đợi micro-batch, trả về Future chứa (nhãn, độ tin cậy).
+    # version/model_path: phiên bản mô hình cần dùng và file để nạp nếu tiến trình con chưa có.
+    def submit(self, year, row, version=None, model_path=None):
+        future = Future()
+        item = ((year, version, model_path), ''.join(row), future)
+        with self._lock:
+            self._start_locked()
+            self._queue.put(item)
+        return future
+
+    def predict_one(self, year, row, timeout=None, version=None, model_path=None):
+        return self.submit(year, row, version, model_path).result(timeout=timeout)
+
+    # Dự đoán cả ma trận: chia thành các khối chunk_size gửi song song tới các tiến trình con
+    def predict_many(self, year, matrix, timeout=None, version=None, model_path=None):
+        rows = [''.join(row) for row in matrix]
+        with self._lock:
+            self._start_locked()
+            futures = [
+                self._executor.submit(_predict_rows, year, rows[start:start + self.chunk_size], version, model_path)
+                for start in range(0, len(rows), self.chunk_size)
+            ]
+        predictions = []
+        for future in futures:
+            predictions.extend(future.result(timeout=timeout))
+        return predictions
+
+    # Luồng điều phối gắn với một executor/hàng đợi; khi gặp None (shutdown) thì mọi
+    # request trước đó đã được gửi đi, executor được đóng mà không hủy tác vụ nào
+    def _dispatch_loop(self, executor, pending):
+        while True:
+            item = pending.get()
+            if item is None:
+                # Chờ trong luồng điều phối (không chặn request) tới khi các tác vụ đã gửi xong
+                executor.shutdown(wait=True)
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    pending.put(None)
+                    break
+                batch.append(item)
+
+            # Mỗi lô chỉ gồm các hàng cùng năm và cùng phiên bản mô hình
+            by_model = {}
+            for key, row, future in batch:
+                by_model.setdefault(key, []).append((row, future))
+            for (year, version, model_path), entries in by_model.items():
+                self.batches += 1
+                self.batched_rows += len(entries)
+                try:
+                    task = executor.submit(_predict_rows, year, [row for row, _ in entries], version, model_path)
+                except Exception as e:
+                    for _, future in entries:
+                        future.set_exception(e)
+                    continue
+                task.add_done_callback(lambda task, entries=entries: self._resolve(task, entries))
+
+    @staticmethod
+    def _resolve(task, entries):
+        # task.exception() ném CancelledError với tác vụ đã bị hủy, các request chờ sẽ treo tới timeout
+        if task.cancelled():
+            error = RuntimeError("Tác vụ suy luận đã bị hủy")
+            for _, future in entries:
+                future.set_exception(error)
+            return
+        error = task.exception()
+        if error is not None:
+            for _, future in entries:
+                future.set_exception(error)
+            return
+        for (_, future), prediction in zip(entries, task.result()):
+            future.set_result(prediction)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'batches': self.batches,
+            'batched_rows': self.batched_rows,
+            'mean_batch_size': round(self.batched_rows / self.batches, 2) if self.batches else 0.0,
+        }
+
+    # Đóng pool: request đã vào hàng đợi vẫn được dự đoán hết (luồng điều phối cũ gửi
+    # nốt rồi mới đóng executor), request mới sẽ khởi động một pool mới
+    def shutdown(self):
+        with self._lock:
+            if self._pid != os.getpid() or self._executor is None:
+                return
+            self._queue.put(None)
+            self._executor = None
+            self._queue = None
+            self._dispatcher = None
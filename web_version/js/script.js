@@ -9,6 +9,20 @@ let subjectsData = [];
 let currentYear = 'nam1';
 let isViewBySemester = false;
 let currentActiveSemester = 'all';
+// Chương trình đào tạo chọn qua URL (?program=...); mặc định là chương trình gốc
+const currentProgram = new URLSearchParams(window.location.search).get('program');
+// Mã phiên cho trạng thái điểm tăng dần trên server (mỗi lần tải trang một phiên)
+const sessionId = (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : `s${Date.now()}${Math.random().toString(36).slice(2)}`;
+// Token bí mật của phiên: server chỉ cho đọc/sửa/xóa trạng thái khi gửi đúng token đã tạo ra nó
+const stateToken = (window.crypto && crypto.getRandomValues)
+    ? Array.from(crypto.getRandomValues(new Uint8Array(24)), b => b.toString(16).padStart(2, '0')).join('')
+    : `t${Date.now()}${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+// Điểm (hệ 10) đã gửi lần trước theo tên môn, để lần sau chỉ gửi các môn thay đổi
+let lastSentScores = {};
+// Phiên bản trạng thái server trả về lần trước (0: chưa gửi lần nào)
+let stateRevision = 0;
 
 // Store input values
 let storedInputValues = {};
@@ -55,7 +69,9 @@ function numericToLetter(score) {
 // Load subjects data from JSON file
 async function loadSubjectsData() {
     try {
-        const response = await fetch('/data/subjects.json');
+        const response = await fetch(currentProgram
+            ? `/api/subjects?program=${encodeURIComponent(currentProgram)}`
+            : '/data/subjects.json');
         if (!response.ok) {
             throw new Error('Không thể tải dữ liệu môn học');
         }
@@ -554,22 +570,61 @@ function processForm(event) {
 }
 
 // Submit scores to server
+// Gửi điểm lên trạng thái của phiên: full = false chỉ gửi môn mới/đổi điểm và môn
+// đã bị xóa so với lần gửi trước kèm phiên bản trạng thái mong đợi; full = true gửi
+// toàn bộ bảng điểm thay thế trạng thái trên server
+function postGrades(subjectScores, full) {
+    const changes = [];
+    const present = {};
+    subjectScores.forEach(score => {
+        present[score.subjectName] = true;
+        if (full || lastSentScores[score.subjectName] !== score.original_score) {
+            changes.push({
+                subjectName: score.subjectName,
+                score: score.score,
+                original_score: score.original_score
+            });
+        }
+    });
+    if (!full) {
+        Object.keys(lastSentScores).forEach(subjectName => {
+            if (!present[subjectName]) {
+                changes.push({ subjectName: subjectName, score: null });
+            }
+        });
+    }
+    return fetch(`/api/students/${encodeURIComponent(sessionId)}/grades`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Student-Token': stateToken
+        },
+        body: JSON.stringify({
+            changes: changes,
+            year: currentYear,
+            program: currentProgram || undefined,
+            revision: full ? undefined : stateRevision,
+            replace: full
+        })
+    });
+}
+
 async function submitScores(subjectScores) {
     try {
-        const response = await fetch('/api/submit', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                scores: subjectScores,
-                year: currentYear
-            })
-        });
+        let response = await postGrades(subjectScores, false);
+        // Trạng thái trên server đã mất hoặc lệch (hết hạn, instance khác): gửi lại toàn bộ
+        if (response.status === 409) {
+            response = await postGrades(subjectScores, true);
+        }
         
         const result = await response.json();
         
         if (result.status === 'success') {
+            lastSentScores = {};
+            subjectScores.forEach(score => {
+                lastSentScores[score.subjectName] = score.original_score;
+            });
+            stateRevision = result.revision;
             // Cập nhật điểm trung bình
             averageScore.textContent = result.average_score.toFixed(2);
             
@@ -698,7 +753,8 @@ function exportResultsToCSV() {
             },
             body: JSON.stringify({
                 scores: subjectScores,
-                year: currentYear
+                year: currentYear,
+                program: currentProgram || undefined
             })
         }).then(response => {
             // Kiểm tra nếu response không phải là JSON (tức là file Excel)
@@ -0,0 +1,274 @@
+# Registry mô hình theo năm học, theo dõi thư mục mô hình và tải lại nóng.
+#
+# Mỗi năm học có một phiên bản đang phục vụ (current) và một phiên bản trước đó
+# (previous) để rollback. Khi file best_model_Year_<n>_*.pkl (hoặc bản .joblib /
+# .native.npz sinh ra từ nó) thay đổi, phiên bản mới được tải và kiểm tra trong
+# một luồng nền; request vẫn dùng phiên bản cũ cho tới khi phiên bản mới vượt
+# qua kiểm tra và được hoán đổi bằng một phép gán duy nhất. Mô hình và bộ mã hóa
+# nằm chung trong một ModelVersion nên request không bao giờ thấy cặp lệch nhau.
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+try:
+    from .model_store import file_sha256, mmap_path_for, source_hash_path_for
+    from .native_predictor import native_path_for
+except ImportError:
+    from model_store import file_sha256, mmap_path_for, source_hash_path_for
+    from native_predictor import native_path_for
+
+logger = logging.getLogger(__name__)
+
+# best_model_Year_<n>_<thuật toán>.pkl -> năm học 'nam<n>'
+MODEL_FILE_PATTERN = re.compile(r'^best_model_Year_(\d+)_.+\.pkl$')
+
+ModelVersion = namedtuple(
+    'ModelVersion', ['year', 'version', 'model', 'encoder', 'path', 'source_path', 'stamp', 'loaded_at', 'rolled_back']
+)
+
+
+# Tìm file mô hình trong thư mục; nếu một năm có nhiều file thì lấy file mới nhất
+def discover_model_paths(model_dir):
+    found = {}
+    for path in Path(model_dir).glob('best_model_Year_*.pkl'):
+        match = MODEL_FILE_PATTERN.match(path.name)
+        if not match:
+            continue
+        year = f'nam{int(match.group(1))}'
+        if year not in found or path.stat().st_mtime > found[year].stat().st_mtime:
+            found[year] = path
+    return {year: f'./{path.as_posix()}' if not path.is_absolute() else str(path) for year, path in sorted(found.items())}
+
+
+# Dấu vết của mọi file có thể được dùng cho một mô hình (.pkl, .joblib và file sha256
+# đi kèm, .native.npz), để thêm/xóa/ghi đè bất kỳ file nào cũng kích hoạt tải lại
+def model_file_stamp(model_path):
+    stamp = []
+    mmap_path = mmap_path_for(model_path)
+    for path in (Path(model_path), mmap_path, source_hash_path_for(mmap_path), native_path_for(model_path)):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        stamp.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+# Mã phiên bản: 12 ký tự đầu sha256 của file .pkl gốc, giống nhau giữa các worker và lần khởi động
+def model_version_id(model_path):
+    return file_sha256(model_path)[:12]
+
+
+# Mã phiên bản của mô hình đã tải: bộ dự đoán native mang sha256 của đúng file .pkl
+# đã xuất ra nó, nên mã phiên bản không lệch nếu file .pkl bị thay trong lúc tải
+def loaded_version_id(model, model_path):
+    digest = getattr(model, 'source_sha256', None)
+    return digest[:12] if digest else model_version_id(model_path)
+
+
+# Bộ nạp có thể sinh lại file .native.npz/.joblib từ file .pkl; nếu file .pkl không
+# đổi trong lúc tải thì ghi nhận dấu vết sau khi tải để không tải lại thêm một lần
+def _settled_stamp(path, stamp):
+    current = model_file_stamp(path)
+    return current if current[:1] == stamp[:1] else stamp
+
+
+class ModelRegistry:
+    # loader(year, path) -> (model, encoder, loaded_path) hoặc None
+    # validator(year, model, encoder) -> None nếu hợp lệ, ngược lại là thông báo lỗi
+    # on_swap(year, old_version, new_version) được gọi sau mỗi lần hoán đổi
+    # paths: dict năm -> file dùng chung với nơi gọi (mặc định tự tìm trong model_dir)
+    def __init__(self, model_dir, loader, validator, check_interval=5.0, on_swap=None, paths=None):
+        self.model_dir = model_dir
+        self.loader = loader
+        self.validator = validator
+        self.check_interval = check_interval
+        self.on_swap = on_swap
+        self.paths = paths if paths is not None else discover_model_paths(model_dir)
+        self._current = {}
+        self._previous = {}
+        self._errors = {}
+        # Dấu vết file đã thử tải gần nhất (thành công hay không) để không thử lại liên tục
+        self._seen_stamps = {}
+        self._reloading = set()
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.rollbacks = 0
+
+    def _year_lock(self, year):
+        with self._lock:
+            return self._locks.setdefault(year, threading.Lock())
+
+    def get(self, year):
+        return self._current.get(year)
+
+    def __contains__(self, year):
+        return year in self._current
+
+    # Tải đồng bộ lần đầu (request đầu tiên hoặc nạp sẵn lúc khởi động)
+    def load(self, year):
+        version = self._current.get(year)
+        if version is not None:
+            return version
+        with self._year_lock(year):
+            version = self._current.get(year)
+            if version is not None:
+                return version
+            path = self.paths.get(year)
+            if not path:
+                logger.error("Không có file mô hình cho năm %s trong %s", year, self.model_dir)
+                return None
+            stamp = model_file_stamp(path)
+            version = self._build_version(year, path, stamp)
+            self._seen_stamps[year] = _settled_stamp(path, stamp)
+            if version is not None:
+                self._swap(year, version)
+            return version
+
+    # Tải và kiểm tra một phiên bản mới; không thay đổi phiên bản đang phục vụ
+    def _build_version(self, year, path, stamp):
+        if not Path(path).exists():
+            self._errors[year] = f"Không tìm thấy file mô hình tại {path}"
+            logger.error("Không tìm thấy file mô hình tại %s cho năm %s", path, year)
+            return None
+        try:
+            loaded = self.loader(year, path)
+            if loaded is None:
+                self._errors[year] = "Không tải được mô hình"
+                return None
+            model, encoder, loaded_path = loaded
+            error = self.validator(year, model, encoder)
+            if error:
+                self._errors[year] = error
+                logger.error("Mô hình mới cho năm %s (%s) không hợp lệ: %s", year, path, error)
+                return None
+            version = ModelVersion(
+                year, loaded_version_id(model, path), model, encoder, str(loaded_path), str(path), stamp, time.time(), False
+            )
+        except Exception as e:
+            self._errors[year] = str(e)
+            logger.error("Lỗi khi tải mô hình cho năm %s từ %s: %s", year, path, str(e))
+            return None
+        self._errors.pop(year, None)
+        return version
+
+    def _swap(self, year, version):
+        old = self._current.get(year)
+        if old is not None:
+            self._previous[year] = old
+        self._current[year] = version
+        logger.info("Năm %s dùng mô hình phiên bản %s (%s)%s", year, version.version, version.path,
+                    f", thay cho {old.version}" if old is not None else "")
+        if self.on_swap is not None:
+            self.on_swap(year, old, version)
+
+    # Kiểm tra thư mục mô hình (tối đa mỗi check_interval giây); file thay đổi
+    # được tải lại trong luồng nền, request hiện tại không phải chờ
+    def check(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+        try:
+            paths = discover_model_paths(self.model_dir)
+        except OSError as e:
+            logger.error("Không đọc được thư mục mô hình %s: %s", self.model_dir, str(e))
+            return
+        for year, path in paths.items():
+            stamp = model_file_stamp(path)
+            if year in self._seen_stamps and stamp == self._seen_stamps[year] and path == self.paths.get(year):
+                continue
+            if year not in self._seen_stamps and year not in self._current:
+                # Năm chưa từng được dùng: chỉ ghi nhận đường dẫn, tải khi có request
+                self.paths[year] = path
+                continue
+            self._start_reload(year, path, stamp)
+
+    def _start_reload(self, year, path, stamp):
+        with self._lock:
+            if year in self._reloading:
+                return
+            self._reloading.add(year)
+        thread = threading.Thread(target=self._reload, args=(year, path, stamp), name=f'model-reload-{year}', daemon=True)
+        thread.start()
+        return thread
+
+    def _reload(self, year, path, stamp):
+        try:
+            logger.info("File mô hình cho năm %s đã thay đổi, tải phiên bản mới ở nền", year)
+            version = self._build_version(year, path, stamp)
+            with self._year_lock(year):
+                self._seen_stamps[year] = _settled_stamp(path, stamp)
+                self.paths[year] = path
+                if version is None:
+                    self.failed_reloads += 1
+                    current = self._current.get(year)
+                    logger.warning("Giữ mô hình năm %s ở phiên bản %s", year, current.version if current else None)
+                    return
+                self.reloads += 1
+                self._swap(year, version)
+        finally:
+            with self._lock:
+                self._reloading.discard(year)
+
+    # Quay về phiên bản trước; phiên bản đang phục vụ trở thành previous để có thể quay lại
+    def rollback(self, year):
+        with self._year_lock(year):
+            previous = self._previous.get(year)
+            if previous is None:
+                return None
+            current = self._current.get(year)
+            restored = previous._replace(rolled_back=True)
+            self._previous[year] = current._replace(rolled_back=False) if current is not None else None
+            self._current[year] = restored
+            self.rollbacks += 1
+            logger.warning("Đã rollback mô hình năm %s: %s -> %s", year, current.version if current else None, restored.version)
+            if self.on_swap is not None:
+                self.on_swap(year, current, restored)
+            return restored
+
+    # Bỏ phiên bản đang phục vụ (ví dụ khi mô hình không qua kiểm tra lúc nạp sẵn)
+    def discard(self, year):
+        with self._year_lock(year):
+            self._current.pop(year, None)
+            self._seen_stamps.pop(year, None)
+
+    def error(self, year):
+        return self._errors.get(year)
+
+    def stats(self):
+        def describe(version):
+            if version is None:
+                return None
+            return {
+                'version': version.version,
+                'path': version.path,
+                'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(version.loaded_at)),
+                'rolled_back': version.rolled_back,
+            }
+
+        years = sorted(set(self.paths) | set(self._current))
+        return {
+            'model_dir': str(self.model_dir),
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'rollbacks': self.rollbacks,
+            'models': {
+                year: {
+                    'current': describe(self._current.get(year)),
+                    'previous': describe(self._previous.get(year)),
+                    'reloading': year in self._reloading,
+                    'error': self._errors.get(year),
+                }
+                for year in years
+            },
+        }
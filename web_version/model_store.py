@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Đuôi file mô hình dạng joblib không nén, có thể ánh xạ bộ nhớ (memory-map)
+MMAP_SUFFIX = '.joblib'
+# File đi kèm bản .joblib, chứa sha256 của file .pkl đã chuyển ra nó
+SOURCE_HASH_SUFFIX = '.sha256'
+
+# Chế độ mmap khi tải mô hình. Mặc định 'c' (copy-on-write): các trang dữ liệu
+# vẫn dùng chung qua page cache giữa các worker, nhưng mảng có cờ ghi nên
+# libsvm (predict_proba của SVC) chấp nhận. 'r' là chỉ đọc; để trống để tắt mmap.
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE', 'c') or None
+
+DEFAULT_MODEL_GLOB = './attached_assets/best_model_Year_*.pkl'
+
+
+# sha256 (hex) nội dung file; file sinh ra từ .pkl (.joblib, .native.npz) lưu giá trị
+# này của file gốc để biết còn khớp hay không, kể cả khi file .pkl mới được chép vào
+# với mtime cũ hơn (rsync -a, tar, cp -p)
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Đường dẫn file mmap tương ứng với một file .pkl
+def mmap_path_for(model_path):
+    return Path(model_path).with_suffix(MMAP_SUFFIX)
+
+
+# File chứa sha256 của file .pkl gốc, đi kèm một bản .joblib
+def source_hash_path_for(mmap_path):
+    return Path(mmap_path).with_name(Path(mmap_path).name + SOURCE_HASH_SUFFIX)
+
+
+# sha256 của file .pkl mà bản .joblib được chuyển ra (None nếu không có file đi kèm)
+def _recorded_source_hash(mmap_path):
+    try:
+        return source_hash_path_for(mmap_path).read_text(encoding='ascii').strip()
+    except OSError:
+        return None
+
+
+# Bản .joblib còn dùng được nếu được chuyển từ đúng nội dung file .pkl hiện tại
+# (so sha256, không so mtime); chỉ có file .joblib (không có .pkl) cũng được dùng
+def is_converted(model_path):
+    model_path = Path(model_path)
+    mmap_path = mmap_path_for(model_path)
+    if not mmap_path.exists():
+        return False
+    if not model_path.exists():
+        return True
+    return _recorded_source_hash(mmap_path) == file_sha256(model_path)
+
+
+# Ưu tiên bản .joblib nếu đã được chuyển đổi từ đúng file .pkl gốc hiện tại
+def resolve_model_path(model_path):
+    model_path = Path(model_path)
+    if model_path.suffix == MMAP_SUFFIX:
+        return model_path
+    if is_converted(model_path):
+        return mmap_path_for(model_path)
+    if mmap_path_for(model_path).exists():
+        logger.warning("Bỏ qua %s: không được chuyển từ file %s hiện tại", mmap_path_for(model_path), model_path)
+    return model_path
+
+
+# Tải mô hình: file .joblib được ánh xạ bộ nhớ, file .pkl đọc như cũ
+def load_model_file(model_path, mmap_mode=MODEL_MMAP_MODE):
+    import joblib
+
+    model_path = Path(model_path)
+    if model_path.suffix == MMAP_SUFFIX and mmap_mode:
+        # mmap chỉ hoạt động khi joblib được truyền tên file, không phải file handle
+        return joblib.load(str(model_path), mmap_mode=mmap_mode)
+    with open(model_path, 'rb') as f:
+        return joblib.load(f)
+
+
+# Lưu mô hình ở dạng joblib không nén để các mảng numpy được ghi thành
+# vùng nhớ liên tục, có thể ánh xạ trực tiếp. Ghi ra file tạm rồi đổi tên
+# để worker đang chạy không bao giờ đọc phải file ghi dở. sha256 của file
+# gốc được ghi sau file .joblib: nếu dừng giữa chừng, bản .joblib bị coi là
+# chưa khớp và file .pkl được dùng thay vì một bản cũ.
+def save_mmap_model(model, output_path, source_sha256=None):
+    import joblib
+
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    joblib.dump(model, str(tmp_path), compress=0)
+    os.replace(tmp_path, output_path)
+    hash_path = source_hash_path_for(output_path)
+    if source_sha256 is None:
+        hash_path.unlink(missing_ok=True)
+    else:
+        tmp_hash_path = hash_path.with_name(f"{hash_path.name}.{os.getpid()}.tmp")
+        tmp_hash_path.write_text(source_sha256 + '\n', encoding='ascii')
+        os.replace(tmp_hash_path, hash_path)
+    return output_path
+
+
+# Chuyển đổi các file .pkl hiện có sang định dạng mmap
+def convert_models(model_paths, force=False):
+    import joblib
+
+    converted = []
+    for model_path in model_paths:
+        model_path = Path(model_path)
+        output_path = mmap_path_for(model_path)
+        # Băm và tải cùng một bản đọc của file, để sha256 ghi lại đúng là của mô hình đã chuyển
+        content = model_path.read_bytes()
+        source_sha256 = hashlib.sha256(content).hexdigest()
+        if output_path.exists() and not force and _recorded_source_hash(output_path) == source_sha256:
+            logger.info("Bỏ qua %s: %s đã khớp", model_path, output_path)
+            continue
+        model = joblib.load(io.BytesIO(content))
+        save_mmap_model(model, output_path, source_sha256)
+        # Đọc lại bằng mmap để chắc chắn file mới dùng được
+        load_model_file(output_path)
+        logger.info("Đã chuyển %s -> %s", model_path, output_path)
+        converted.append(output_path)
+    return converted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chuyển các mô hình .pkl sang định dạng joblib có thể memory-map")
+    parser.add_argument('paths', nargs='*', help="Các file .pkl cần chuyển (mặc định: %s)" % DEFAULT_MODEL_GLOB)
+    parser.add_argument('--force', action='store_true', help="Ghi đè kể cả khi file .joblib đã khớp file .pkl")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    paths = args.paths or sorted(Path('.').glob(DEFAULT_MODEL_GLOB.lstrip('./')))
+    converted = convert_models(paths, force=args.force)
+    logger.info("Đã chuyển %d/%d mô hình", len(converted), len(paths))
+
+
+if __name__ == '__main__':
+    main()
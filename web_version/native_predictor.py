@@ -0,0 +1,542 @@
+# Bộ dự đoán thuần NumPy trích xuất từ pipeline sklearn đã huấn luyện.
+#
+#   python -m web_version.native_predictor              # xuất cho mọi best_model_Year_*.pkl
+#   python -m web_version.native_predictor path/to/model.pkl
+#
+# Pipeline của các mô hình gồm ColumnTransformer(SimpleImputer + OrdinalEncoder
+# trên các cột điểm chữ) -> StandardScaler -> LogisticRegression hoặc SVC.
+# Bước xuất lưu bảng mã hóa, tham số chuẩn hóa và hệ số/support vector vào một
+# file .native.npz cạnh file .pkl. Khi phục vụ:
+#   - Logistic Regression: một phép nhân ma trận + argmax (softmax cho xác suất)
+#   - SVC: tính kernel vector hóa, quyết định one-vs-one và bỏ phiếu như libsvm
+# File .npz chứa sẵn một tập kiểm tra (đầu vào + nhãn sklearn dự đoán lúc xuất);
+# khi tải, bộ dự đoán phải tái tạo đúng các nhãn đó, nếu không server dùng lại sklearn.
+# File .npz cũng lưu sha256 của file .pkl đã xuất ra nó: khi tải, file .npz chưa có
+# hoặc không khớp file .pkl hiện tại được xuất lại (NATIVE_AUTO_EXPORT=0 để tắt, khi
+# đó dùng sklearn). Việc tải file .npz đã khớp không cần import sklearn.
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import operator
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from .model_store import file_sha256
+except ImportError:
+    from model_store import file_sha256
+
+logger = logging.getLogger(__name__)
+
+NATIVE_SUFFIX = '.native.npz'
+FORMAT_VERSION = 1
+DEFAULT_MODEL_GLOB = 'attached_assets/best_model_Year_*.pkl'
+# Đặt NATIVE_PREDICTORS=0 để luôn dùng pipeline sklearn
+NATIVE_PREDICTORS = os.environ.get('NATIVE_PREDICTORS', '1') != '0'
+# Đặt NATIVE_AUTO_EXPORT=0 để không tự xuất lại file .npz thiếu hoặc cũ khi tải
+NATIVE_AUTO_EXPORT = os.environ.get('NATIVE_AUTO_EXPORT', '1') != '0'
+
+# Bảng tra mã hóa theo điểm mã ASCII của ký tự điểm chữ
+_TABLE_WIDTH = 128
+
+# Số hàng tối đa để ghép cặp xác suất SVM bằng vòng lặp Python thay vì vector hóa
+SMALL_BATCH_ROWS = 8
+
+
+def native_path_for(model_path):
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + NATIVE_SUFFIX)
+
+
+class NativePredictor:
+    def __init__(self, arrays, meta, path=None):
+        self.meta = meta
+        self.path = path
+        self.kind = meta['kind']
+        self.feature_names_in_ = np.asarray(meta['feature_names'], dtype=object)
+        self.classes_ = np.asarray(meta['classes'], dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self._table = arrays['encode_table']
+        self._fill_codes = arrays['fill_codes']
+        self._columns = np.arange(self.n_features_in_)
+        self._mean = arrays['scaler_mean'] if 'scaler_mean' in arrays else None
+        self._scale = arrays['scaler_scale'] if 'scaler_scale' in arrays else None
+        self._arrays = arrays
+        self.has_proba = bool(meta.get('has_proba'))
+        # sha256 của file .pkl đã xuất ra bộ dự đoán này
+        self.source_sha256 = meta.get('source_sha256')
+        if self.kind == 'svc':
+            self._build_pairwise()
+
+    # ---- tiền xử lý: điểm chữ -> mã thứ tự -> chuẩn hóa ----
+
+    # Ma trận điểm chữ (mỗi phần tử một ký tự, theo thứ tự feature_names_in_) -> ma trận số thực
+    def transform(self, letters):
+        letters = np.asarray(letters, dtype=object)
+        if letters.ndim == 1:
+            letters = letters.reshape(1, -1)
+        codes = np.asarray(letters, dtype='U1').view(np.uint32).reshape(letters.shape).astype(np.intp)
+        # Ký tự ngoài bảng (và chuỗi rỗng) được coi như giá trị không xác định
+        codes[codes >= _TABLE_WIDTH] = 0
+        X = self._table[self._columns, codes]
+        if self._mean is not None:
+            X = X - self._mean
+        if self._scale is not None:
+            X = X / self._scale
+        return X
+
+    # Giá trị thiếu (None/NaN) được thay bằng giá trị của SimpleImputer như trong pipeline gốc
+    def _fill_missing(self, values):
+        values = np.array(values, dtype=object, copy=True)
+        missing = np.frompyfunc(lambda v: v is None or v != v, 1, 1)(values).astype(bool)
+        if missing.any():
+            rows, cols = np.nonzero(missing)
+            values[rows, cols] = self._fill_codes[cols]
+        return values
+
+    def _as_letters(self, X):
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)].to_numpy(dtype=object)
+        X = np.asarray(X, dtype=object)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self._fill_missing(X)
+
+    # ---- API tương thích sklearn (nhận DataFrame hoặc mảng điểm chữ) ----
+
+    def predict(self, X):
+        return self.predict_encoded(self._as_letters(X))
+
+    def predict_proba(self, X):
+        return self.predict_proba_encoded(self._as_letters(X))
+
+    def decision_function(self, X):
+        return self.decision_function_encoded(self._as_letters(X))
+
+    # ---- đường nhanh: nhận trực tiếp ma trận từ FeatureEncoder ----
+
+    def predict_encoded(self, letters):
+        X = self.transform(letters)
+        if self.kind == 'logistic':
+            return self.classes_[self._linear_indices(self._linear_scores(X))]
+        return self.classes_[self._svc_indices(self._svc_ovo(X))]
+
+    def decision_function_encoded(self, letters):
+        X = self.transform(letters)
+        if self.kind == 'logistic':
+            scores = self._linear_scores(X)
+            return scores[:, 0] if scores.shape[1] == 1 else scores
+        return self._svc_margins(self._svc_ovo(X))
+
+    def predict_proba_encoded(self, letters):
+        if not self.has_proba:
+            raise AttributeError("Bộ dự đoán native không hỗ trợ predict_proba cho mô hình này")
+        X = self.transform(letters)
+        if self.kind == 'logistic':
+            return self._logistic_proba(self._linear_scores(X))
+        return self._svc_proba(self._svc_ovo(X))
+
+    # Nhãn kèm điểm tin cậy từ cùng một lần tính tích vô hướng/kernel, cùng loại điểm
+    # với đường sklearn trong confidence.predict_with_confidence: trả về (nhãn, điểm, loại).
+    # Logistic Regression: xác suất (nếu có). SVC: luôn là biên quyết định 'ovr' (nhãn là
+    # kết quả bỏ phiếu, khớp với biên đã làm tròn); không dùng xác suất Platt vì argmax
+    # của nó thường khác nhãn bỏ phiếu. SVC đa lớp dạng 'ovo': không có điểm.
+    def predict_scores_encoded(self, letters):
+        X = self.transform(letters)
+        if self.kind == 'logistic':
+            scores = self._linear_scores(X)
+            labels = self.classes_[self._linear_indices(scores)]
+            if self.has_proba:
+                return labels, self._logistic_proba(scores), 'probability'
+            return labels, scores, 'decision_function'
+        dec = self._svc_ovo(X)
+        labels = self.classes_[self._svc_indices(dec)]
+        if len(self.classes_) == 2:
+            return labels, self._svc_margins(dec).reshape(-1, 1), 'decision_function'
+        if self.meta['decision_function_shape'] == 'ovr':
+            return labels, self._svc_ovr(dec), 'decision_function'
+        return labels, None, None
+
+    # ---- Logistic Regression ----
+
+    def _linear_scores(self, X):
+        return X @ self._arrays['coef'].T + self._arrays['intercept']
+
+    @staticmethod
+    def _linear_indices(scores):
+        if scores.shape[1] == 1:
+            return (scores[:, 0] > 0).astype(np.intp)
+        return scores.argmax(axis=1)
+
+    def _logistic_proba(self, scores):
+        if scores.shape[1] == 1:
+            p = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        if self.meta['multinomial']:
+            exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return exp / exp.sum(axis=1, keepdims=True)
+        p = 1.0 / (1.0 + np.exp(-scores))
+        return p / p.sum(axis=1, keepdims=True)
+
+    # ---- SVC ----
+
+    def _kernel(self, X):
+        sv = self._arrays['support_vectors']
+        kernel = self.meta['kernel']
+        gamma = self.meta['gamma']
+        if kernel == 'rbf':
+            sq = (X * X).sum(axis=1)[:, None] + self._arrays['sv_sq_norms'][None, :] - 2.0 * (X @ sv.T)
+            return np.exp(-gamma * np.maximum(sq, 0.0))
+        dot = X @ sv.T
+        if kernel == 'linear':
+            return dot
+        if kernel == 'poly':
+            return (gamma * dot + self.meta['coef0']) ** self.meta['degree']
+        return np.tanh(gamma * dot + self.meta['coef0'])
+
+    # Ma trận hệ số (số support vector x số cặp lớp) theo đúng thứ tự cặp của libsvm,
+    # để mọi giá trị quyết định one-vs-one tính bằng một phép nhân ma trận
+    def _build_pairwise(self):
+        dual_coef = self._arrays['dual_coef']
+        starts = self._arrays['sv_starts']
+        n_classes = len(self.classes_)
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        weights = np.zeros((dual_coef.shape[1], len(pairs)))
+        # Ma trận one-hot cặp -> lớp thắng khi quyết định dương/âm
+        pair_first = np.zeros((len(pairs), n_classes))
+        pair_second = np.zeros((len(pairs), n_classes))
+        for p, (i, j) in enumerate(pairs):
+            si, ei = starts[i], starts[i + 1]
+            sj, ej = starts[j], starts[j + 1]
+            weights[si:ei, p] = dual_coef[j - 1, si:ei]
+            weights[sj:ej, p] = dual_coef[i, sj:ej]
+            pair_first[p, i] = 1
+            pair_second[p, j] = 1
+        self._pair_weights = weights
+        self._pair_first = pair_first
+        self._pair_second = pair_second
+
+    def _svc_ovo(self, X):
+        return self._kernel(X) @ self._pair_weights + self._arrays['intercept']
+
+    def _svc_indices(self, dec):
+        if self.meta['break_ties'] and self.meta['decision_function_shape'] == 'ovr' and len(self.classes_) > 2:
+            return self._svc_ovr(dec).argmax(axis=1)
+        return self._svc_votes(dec).argmax(axis=1)
+
+    # Biên quyết định theo decision_function_shape như sklearn
+    def _svc_margins(self, dec):
+        if len(self.classes_) == 2:
+            # sklearn đổi dấu quyết định của SVC nhị phân
+            return -dec[:, 0]
+        if self.meta['decision_function_shape'] == 'ovr':
+            return self._svc_ovr(dec)
+        return dec
+
+    def _svc_votes(self, dec):
+        positive = dec > 0
+        return positive @ self._pair_first + ~positive @ self._pair_second
+
+    # Tương đương sklearn.utils.multiclass._ovr_decision_function
+    def _svc_ovr(self, dec):
+        negative = dec < 0
+        votes = ~negative @ self._pair_first + negative @ self._pair_second
+        sum_of_confidences = dec @ (self._pair_first - self._pair_second)
+        return votes + sum_of_confidences / (3 * (np.abs(sum_of_confidences) + 1))
+
+    # Xác suất Platt theo cặp + ghép cặp (pairwise coupling) như multiclass_probability của libsvm,
+    # vector hóa theo mẫu: mỗi mẫu dừng lặp độc lập khi hội tụ
+    def _svc_proba(self, dec):
+        n_classes = len(self.classes_)
+        m = dec.shape[0]
+        prob_a = self._arrays['prob_a']
+        prob_b = self._arrays['prob_b']
+        min_prob = 1e-7
+        f = dec * prob_a + prob_b
+        pairwise = np.where(f >= 0, np.exp(-np.abs(f)) / (1.0 + np.exp(-np.abs(f))), 1.0 / (1.0 + np.exp(-np.abs(f))))
+        pairwise = np.clip(pairwise, min_prob, 1 - min_prob)
+        if n_classes == 2:
+            return np.column_stack([pairwise[:, 0], 1 - pairwise[:, 0]])
+
+        if m <= SMALL_BATCH_ROWS:
+            # Vài hàng (request đơn lẻ): các phép numpy trên mảng 5 phần tử tốn chi phí
+            # gọi hàm nhiều hơn tính toán, lặp bằng số thực Python nhanh hơn nhiều lần
+            return np.array([self._couple_row(row, n_classes) for row in pairwise.tolist()])
+
+        r = np.zeros((m, n_classes, n_classes))
+        p = 0
+        for i in range(n_classes):
+            for j in range(i + 1, n_classes):
+                r[:, i, j] = pairwise[:, p]
+                r[:, j, i] = 1 - pairwise[:, p]
+                p += 1
+
+        Q = -r.transpose(0, 2, 1) * r
+        diag = (r * r).sum(axis=1) - np.einsum('mii->mi', r * r)
+        idx = np.arange(n_classes)
+        Q[:, idx, idx] = diag
+        probs = np.full((m, n_classes), 1.0 / n_classes)
+        active = np.ones(m, dtype=bool)
+        eps = 0.005 / n_classes
+        for _ in range(max(100, n_classes)):
+            Qp = np.einsum('mtj,mj->mt', Q, probs)
+            pQp = (probs * Qp).sum(axis=1)
+            converged = np.abs(Qp - pQp[:, None]).max(axis=1) < eps
+            active &= ~converged
+            if not active.any():
+                break
+            rows = np.nonzero(active)[0]
+            Qa, Qpa, pa, pQpa = Q[rows], Qp[rows], probs[rows], pQp[rows]
+            for t in range(n_classes):
+                diff = (-Qpa[:, t] + pQpa) / Qa[:, t, t]
+                pa[:, t] += diff
+                pQpa = (pQpa + diff * (diff * Qa[:, t, t] + 2 * Qpa[:, t])) / (1 + diff) / (1 + diff)
+                Qpa = (Qpa + diff[:, None] * Qa[:, t, :]) / (1 + diff)[:, None]
+                pa /= (1 + diff)[:, None]
+            probs[rows] = pa
+        return probs
+
+    # Ghép cặp cho một hàng trên list Python, cùng thuật toán và thứ tự phép tính với libsvm
+    @staticmethod
+    def _couple_row(pairwise, k):
+        r = [[0.0] * k for _ in range(k)]
+        pairs = iter(pairwise)
+        for i in range(k):
+            for j in range(i + 1, k):
+                r[i][j] = next(pairs)
+                r[j][i] = 1 - r[i][j]
+        Q = [[-r[j][t] * r[t][j] for j in range(k)] for t in range(k)]
+        for t in range(k):
+            Q[t][t] = sum(r[j][t] * r[j][t] for j in range(k) if j != t)
+        p = [1.0 / k] * k
+        eps = 0.005 / k
+        for _ in range(max(100, k)):
+            Qp = [sum(map(operator.mul, Qt, p)) for Qt in Q]
+            pQp = sum(map(operator.mul, p, Qp))
+            if max(abs(value - pQp) for value in Qp) < eps:
+                break
+            for t, Qt in enumerate(Q):
+                diff = (-Qp[t] + pQp) / Qt[t]
+                p[t] += diff
+                pQp = (pQp + diff * (diff * Qt[t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+                scale = 1 + diff
+                Qp = [(value + diff * q) / scale for value, q in zip(Qp, Qt)]
+                p = [value / scale for value in p]
+        return p
+
+    # Chạy lại tập kiểm tra đã lưu lúc xuất và so với nhãn của sklearn
+    def verify(self):
+        letters = self._arrays['verify_letters'].astype(object)
+        expected = self._arrays['verify_labels'].astype(object)
+        return bool(np.array_equal(self.predict_encoded(letters), expected))
+
+
+# ---------------- Trích xuất từ pipeline sklearn ----------------
+
+def _extract_preprocessing(model):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+
+    if not isinstance(model, Pipeline):
+        raise ValueError("Mô hình không phải sklearn Pipeline")
+    steps = [step for _, step in model.steps]
+    preprocessor, rest = steps[0], steps[1:]
+    feature_names = list(model.feature_names_in_)
+    if not isinstance(preprocessor, ColumnTransformer):
+        raise ValueError("Bước đầu không phải ColumnTransformer")
+    transformers = [t for t in preprocessor.transformers_ if t[0] != 'remainder' or t[1] != 'drop']
+    if len(transformers) != 1 or list(transformers[0][2]) != feature_names:
+        raise ValueError("ColumnTransformer phải có đúng một transformer trên toàn bộ cột theo thứ tự")
+    inner = transformers[0][1]
+    inner_steps = [step for _, step in inner.steps] if isinstance(inner, Pipeline) else [inner]
+    imputer = next((s for s in inner_steps if isinstance(s, SimpleImputer)), None)
+    encoder = inner_steps[-1]
+    if not isinstance(encoder, OrdinalEncoder) or len(inner_steps) > (2 if imputer is not None else 1):
+        raise ValueError("Chỉ hỗ trợ [SimpleImputer] + OrdinalEncoder")
+
+    unknown = float(encoder.unknown_value) if encoder.handle_unknown == 'use_encoded_value' else np.nan
+    table = np.full((len(feature_names), _TABLE_WIDTH), unknown)
+    for col, categories in enumerate(encoder.categories_):
+        for code, category in enumerate(categories):
+            if not isinstance(category, str) or len(category) != 1 or ord(category) >= _TABLE_WIDTH:
+                raise ValueError(f"Danh mục {category!r} không phải một ký tự ASCII")
+            table[col, ord(category)] = code
+    if imputer is not None:
+        fill_codes = np.asarray(imputer.statistics_, dtype='U1')
+    else:
+        fill_codes = np.full(len(feature_names), '', dtype='U1')
+
+    arrays = {'encode_table': table, 'fill_codes': fill_codes}
+    for step in rest[:-1]:
+        if not isinstance(step, StandardScaler):
+            raise ValueError(f"Không hỗ trợ bước {type(step).__name__}")
+        if step.with_mean:
+            arrays['scaler_mean'] = np.asarray(step.mean_, dtype=np.float64)
+        if step.with_std:
+            arrays['scaler_scale'] = np.asarray(step.scale_, dtype=np.float64)
+    return feature_names, arrays, rest[-1]
+
+
+def extract_native(model):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import SVC
+
+    feature_names, arrays, classifier = _extract_preprocessing(model)
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'feature_names': feature_names,
+        'classes': [str(c) for c in classifier.classes_],
+    }
+    if isinstance(classifier, LogisticRegression):
+        multi_class = getattr(classifier, 'multi_class', 'auto')
+        ovr = multi_class in ('ovr', 'warn') or (
+            multi_class in ('auto', 'deprecated') and (len(classifier.classes_) <= 2 or classifier.solver == 'liblinear')
+        )
+        meta.update(kind='logistic', multinomial=not ovr, has_proba=True)
+        arrays['coef'] = np.asarray(classifier.coef_, dtype=np.float64)
+        arrays['intercept'] = np.asarray(classifier.intercept_, dtype=np.float64)
+    elif isinstance(classifier, SVC):
+        if classifier.kernel not in ('rbf', 'linear', 'poly', 'sigmoid'):
+            raise ValueError(f"Không hỗ trợ kernel {classifier.kernel}")
+        meta.update(
+            kind='svc', kernel=classifier.kernel, gamma=float(classifier._gamma), coef0=float(classifier.coef0),
+            degree=int(classifier.degree), break_ties=bool(classifier.break_ties),
+            decision_function_shape=classifier.decision_function_shape,
+            has_proba=bool(classifier.probability)
+        )
+        support_vectors = np.asarray(classifier.support_vectors_, dtype=np.float64)
+        arrays['support_vectors'] = support_vectors
+        arrays['sv_sq_norms'] = (support_vectors * support_vectors).sum(axis=1)
+        arrays['dual_coef'] = np.asarray(classifier._dual_coef_, dtype=np.float64)
+        arrays['intercept'] = np.asarray(classifier._intercept_, dtype=np.float64)
+        arrays['sv_starts'] = np.concatenate([[0], np.cumsum(classifier._n_support)]).astype(np.intp)
+        if classifier.probability:
+            arrays['prob_a'] = np.asarray(classifier._probA, dtype=np.float64)
+            arrays['prob_b'] = np.asarray(classifier._probB, dtype=np.float64)
+    else:
+        raise ValueError(f"Không hỗ trợ bộ phân loại {type(classifier).__name__}")
+    return arrays, meta
+
+
+# Tập kiểm tra: các bảng điểm toàn một loại điểm + các bảng điểm ngẫu nhiên
+def _verification_letters(n_features, n_random, seed):
+    rng = np.random.default_rng(seed)
+    uniform = np.array([[letter] * n_features for letter in 'ABCDF'], dtype='U1')
+    random = rng.choice(np.array(list('ABCDF'), dtype='U1'), size=(n_random, n_features))
+    return np.vstack([uniform, random])
+
+
+def export_native(model_path, n_verify=512, seed=0, atol=1e-6):
+    import joblib
+    import pandas as pd
+
+    model_path = Path(model_path)
+    # Băm và tải cùng một bản đọc của file, để sha256 lưu lại đúng là của mô hình đã xuất
+    content = model_path.read_bytes()
+    model = joblib.load(io.BytesIO(content))
+    arrays, meta = extract_native(model)
+    meta['source_sha256'] = hashlib.sha256(content).hexdigest()
+
+    letters = _verification_letters(len(meta['feature_names']), n_verify, seed)
+    df = pd.DataFrame(letters.astype(object), columns=model.feature_names_in_)
+    expected = np.asarray(model.predict(df)).astype(str)
+
+    predictor = NativePredictor(arrays, meta)
+    mismatches = int((predictor.predict_encoded(letters.astype(object)).astype(str) != expected).sum())
+    if mismatches:
+        raise ValueError(f"Bộ dự đoán native lệch {mismatches}/{len(expected)} nhãn so với sklearn")
+    if meta['has_proba'] and hasattr(model, 'predict_proba'):
+        max_error = float(np.abs(predictor.predict_proba_encoded(letters.astype(object)) - model.predict_proba(df)).max())
+        meta['proba_max_error'] = max_error
+        if max_error > atol:
+            logger.warning("Xác suất native lệch %.2e so với sklearn cho %s, tắt predict_proba", max_error, model_path)
+            meta['has_proba'] = False
+
+    arrays['verify_letters'] = letters
+    arrays['verify_labels'] = expected
+    output_path = native_path_for(model_path)
+    # Tên file tạm riêng cho từng tiến trình: nhiều worker có thể cùng xuất lại một lúc
+    tmp_path = output_path.with_name(f"{output_path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp_path, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+    os.replace(tmp_path, output_path)
+    logger.info("Đã xuất bộ dự đoán native %s (%s, %d nhãn kiểm tra khớp)", output_path, meta['kind'], len(expected))
+    return output_path
+
+
+# File native còn dùng được nếu tồn tại và được xuất từ đúng nội dung file mô hình gốc
+# hiện tại (so sha256, không so mtime); chỉ có file .npz (không có .pkl) cũng được dùng
+def is_fresh(model_path):
+    native_path = native_path_for(model_path)
+    if not native_path.exists():
+        return False
+    model_path = Path(model_path)
+    if not model_path.exists():
+        return True
+    with np.load(native_path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+    return meta.get('source_sha256') == file_sha256(model_path)
+
+
+# Tải bộ dự đoán native cho một file mô hình. File .npz thiếu hoặc không khớp file
+# .pkl được xuất lại nếu export=True; trả về None nếu không xuất được hoặc không tái
+# tạo được nhãn kiểm tra (khi đó dùng sklearn)
+def load_native_predictor(model_path, export=NATIVE_AUTO_EXPORT):
+    native_path = native_path_for(model_path)
+    try:
+        fresh = is_fresh(model_path)
+    except Exception as e:
+        logger.warning("Không đọc được %s: %s", native_path, str(e))
+        fresh = False
+    if not fresh:
+        if not export or not Path(model_path).exists():
+            if native_path.exists():
+                logger.warning("Bỏ qua %s: không được xuất từ file %s hiện tại", native_path, model_path)
+            return None
+        try:
+            export_native(model_path)
+        except Exception as e:
+            logger.warning("Không xuất được bộ dự đoán native cho %s, dùng sklearn: %s", model_path, str(e))
+            return None
+    try:
+        with np.load(native_path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files if key != 'meta'}
+            meta = json.loads(str(data['meta']))
+        if meta.get('format_version') != FORMAT_VERSION:
+            logger.warning("Bỏ qua %s: phiên bản định dạng %s không hỗ trợ", native_path, meta.get('format_version'))
+            return None
+        predictor = NativePredictor(arrays, meta, path=native_path)
+        if not predictor.verify():
+            logger.warning("Bộ dự đoán native %s không khớp tập kiểm tra, dùng sklearn", native_path)
+            return None
+        return predictor
+    except Exception as e:
+        logger.error("Lỗi khi tải bộ dự đoán native %s: %s", native_path, str(e))
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xuất các pipeline sklearn sang bộ dự đoán thuần NumPy")
+    parser.add_argument('paths', nargs='*', help="Các file .pkl (mặc định: %s)" % DEFAULT_MODEL_GLOB)
+    parser.add_argument('--verify-size', type=int, default=512, help="Số bảng điểm ngẫu nhiên trong tập kiểm tra")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    paths = args.paths or sorted(Path('.').glob(DEFAULT_MODEL_GLOB))
+    exported = 0
+    for path in paths:
+        try:
+            export_native(path, n_verify=args.verify_size)
+            exported += 1
+        except ValueError as e:
+            logger.error("Không xuất được %s: %s", path, str(e))
+    logger.info("Đã xuất %d/%d bộ dự đoán native", exported, len(paths))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+# Cache LRU có thời hạn (TTL) cho kết quả dự đoán của mô hình.
+# Khóa là năm học + băm của vector đặc trưng đã căn chỉnh, nên hai bảng điểm
+# tương đương (khác thứ tự môn, môn thiếu = 'F') dùng chung một mục.
+class PredictionCache:
+    def __init__(self, max_entries=4096, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Băm vector đặc trưng (mỗi phần tử là một điểm chữ) thành khóa cố định;
+    # phiên bản mô hình nằm trong khóa nên kết quả của phiên bản cũ không bao giờ được dùng lại
+    @staticmethod
+    def make_key(year, feature_row, model_version=None):
+        digest = hashlib.blake2b('\x1f'.join(feature_row).encode('utf-8'), digest_size=16).digest()
+        return (year, model_version, digest)
+
+    def get(self, key):
+        if self.max_entries <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Xóa toàn bộ cache, hoặc chỉ các mục của một năm học
+    def clear(self, year=None):
+        with self._lock:
+            if year is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == year]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
@@ -0,0 +1,281 @@
+# Chế độ profiling request (bật theo cấu hình, mặc định tắt).
+#
+# PROFILE_MODE=off:    không profile; mỗi request chỉ tốn một phép kiểm tra cờ.
+# PROFILE_MODE=header: chỉ profile request có header X-Profile: 1.
+# PROFILE_MODE=sample: profile ngẫu nhiên tỉ lệ PROFILE_SAMPLE_RATE request (và request có header).
+#
+# Request được chọn chạy dưới cProfile (thời gian chính xác theo hàm, file .pstats)
+# và được một luồng nền lấy mẫu ngăn xếp mỗi PROFILE_INTERVAL_MS (file .collapsed
+# dùng cho flamegraph.pl/speedscope). Kết quả cộng dồn theo (endpoint, năm; server
+# gộp các năm không có mô hình vào 'other') và ghi định kỳ vào PROFILE_DIR, mỗi
+# tiến trình một bộ file <endpoint>.<năm>.<pid>.*;
+# summary() gộp file của mọi worker. Mỗi tiến trình chỉ profile một request tại
+# một thời điểm (request khác cùng lúc được bỏ qua) nên cProfile không chồng nhau.
+# Suy luận chạy trong pool tiến trình (INFERENCE_BACKEND=pool) không nằm trong profile.
+import cProfile
+import glob
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('off', 'header', 'sample')
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def _file_part(value):
+    return _UNSAFE_NAME.sub('_', str(value))[:64] or '_'
+
+
+# Đường dẫn rút gọn: phần sau site-packages/ hoặc tính từ web_version/
+def _short_path(filename):
+    path = filename.replace('\\', '/')
+    if '/site-packages/' in path:
+        return path.split('/site-packages/', 1)[1]
+    if '/web_version/' in path:
+        return 'web_version/' + path.split('/web_version/', 1)[1]
+    return path.rsplit('/', 1)[-1]
+
+
+# Gói chứa hàm: pandas, sklearn, numpy, web_version, ... (thư viện chuẩn: 'stdlib')
+def _package(filename):
+    if filename == '~':
+        return 'builtins'
+    path = filename.replace('\\', '/')
+    if '/site-packages/' in path:
+        return path.split('/site-packages/', 1)[1].split('/', 1)[0]
+    if '/web_version/' in path:
+        return 'web_version'
+    return 'stdlib'
+
+
+def _function_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{_short_path(filename)}:{line}({name})"
+
+
+# Luồng nền lấy mẫu ngăn xếp của các luồng đang được profile; ngủ khi không có luồng nào
+class _StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self._watched = {}
+        self._labels = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def watch(self, ident):
+        self._watched[ident] = Counter()
+        # Luồng không còn trong tiến trình con sau khi gunicorn fork
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def unwatch(self, ident):
+        return self._watched.pop(ident, Counter())
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{_short_path(code.co_filename)}:{code.co_name}"
+        return label
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            if not self._watched:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for ident, counter in list(self._watched.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    counter[self._stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+# Kết quả cộng dồn của một (endpoint, năm) trong tiến trình hiện tại
+class _ProfileEntry:
+    def __init__(self):
+        self.stats = None
+        self.stacks = Counter()
+        self.requests = 0
+        self.seconds = 0.0
+
+
+class RequestProfiler:
+    def __init__(self, output_dir, mode='off', sample_rate=0.01, header='X-Profile',
+                 interval=0.001, flush_interval=10.0):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"PROFILE_MODE phải là một trong {', '.join(PROFILE_MODES)}, nhận {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.enabled = mode != 'off'
+        self.sample_rate = sample_rate
+        self.header = header
+        self.flush_interval = flush_interval
+        self._sampler = _StackSampler(interval)
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def _selected(self, headers):
+        if headers.get(self.header, '').lower() in ('1', 'true', 'yes'):
+            return True
+        return self.mode == 'sample' and random.random() < self.sample_rate
+
+    # Bắt đầu profile request hiện tại nếu được chọn; trả về phiên profile hoặc None
+    def start(self, headers):
+        if not self.enabled or not self._selected(headers):
+            return None
+        if not self._active.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        ident = threading.get_ident()
+        profile = cProfile.Profile()
+        self._sampler.watch(ident)
+        started = time.perf_counter()
+        profile.enable()
+        return profile, ident, started
+
+    # Kết thúc phiên profile và cộng dồn vào (endpoint, năm)
+    def stop(self, session, endpoint, year):
+        profile, ident, started = session
+        profile.disable()
+        elapsed = time.perf_counter() - started
+        stacks = self._sampler.unwatch(ident)
+        self._active.release()
+
+        key = (str(endpoint), str(year))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _ProfileEntry()
+            if entry.stats is None:
+                entry.stats = pstats.Stats(profile)
+            else:
+                entry.stats.add(profile)
+            entry.stacks.update(stacks)
+            entry.requests += 1
+            entry.seconds += elapsed
+            self._dirty.add(key)
+            self.profiled += 1
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _paths(self, key, pid):
+        prefix = os.path.join(self.output_dir, f"{_file_part(key[0])}.{_file_part(key[1])}.{pid}")
+        return prefix + '.pstats', prefix + '.collapsed', prefix + '.json'
+
+    # Ghi các (endpoint, năm) có dữ liệu mới ra PROFILE_DIR (ghi file tạm rồi đổi tên)
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            pid = os.getpid()
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                for key in dirty:
+                    entry = self._entries[key]
+                    stats_path, collapsed_path, meta_path = self._paths(key, pid)
+                    entry.stats.dump_stats(stats_path + '.tmp')
+                    os.replace(stats_path + '.tmp', stats_path)
+                    with open(collapsed_path + '.tmp', 'w', encoding='utf-8') as f:
+                        for stack, count in entry.stacks.most_common():
+                            f.write(f"{stack} {count}\n")
+                    os.replace(collapsed_path + '.tmp', collapsed_path)
+                    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                        json.dump({'endpoint': key[0], 'year': key[1], 'pid': pid,
+                                   'requests': entry.requests, 'seconds': entry.seconds}, f)
+                    os.replace(meta_path + '.tmp', meta_path)
+            except OSError as e:
+                self._dirty |= dirty
+                logger.error("Lỗi khi ghi kết quả profiling vào %s: %s", self.output_dir, str(e))
+
+    # Các hàm tốn thời gian nhất theo (endpoint, năm), gộp từ file của mọi tiến trình;
+    # thời gian (ms) là trung bình mỗi request được profile.
+    # sort: 'tottime' (thời gian trong chính hàm) hoặc 'cumtime' (kể cả hàm con).
+    def summary(self, endpoint=None, year=None, limit=20, sort='tottime'):
+        self.flush()
+        groups = {}
+        for meta_path in glob.glob(os.path.join(self.output_dir, '*.json')):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if endpoint and meta['endpoint'] != endpoint or year and meta['year'] != str(year):
+                continue
+            group = groups.setdefault((meta['endpoint'], meta['year']), {'requests': 0, 'seconds': 0.0, 'files': []})
+            group['requests'] += meta['requests']
+            group['seconds'] += meta['seconds']
+            group['files'].append(meta_path[:-len('.json')] + '.pstats')
+
+        column = 2 if sort == 'tottime' else 3
+        profiles = []
+        for (group_endpoint, group_year), group in sorted(groups.items()):
+            files = [path for path in group['files'] if os.path.exists(path)]
+            if not files:
+                continue
+            stats = pstats.Stats(*files).stats
+            requests = max(group['requests'], 1)
+            by_package = Counter()
+            for func, (_, _, tottime, _, _) in stats.items():
+                by_package[_package(func[0])] += tottime
+            top = sorted(stats.items(), key=lambda item: item[1][column], reverse=True)[:limit]
+            profiles.append({
+                'endpoint': group_endpoint,
+                'year': group_year,
+                'requests': group['requests'],
+                'mean_ms': round(group['seconds'] / requests * 1000, 3),
+                'by_package': [
+                    {'package': package, 'ms': round(seconds / requests * 1000, 3)}
+                    for package, seconds in by_package.most_common()
+                ],
+                'top': [
+                    {
+                        'function': _function_label(func),
+                        'calls': calls,
+                        'tottime_ms': round(tottime / requests * 1000, 4),
+                        'cumtime_ms': round(cumtime / requests * 1000, 4),
+                    }
+                    for func, (_, calls, tottime, cumtime, _) in top
+                ],
+            })
+        return {
+            'mode': self.mode,
+            'sample_rate': self.sample_rate if self.mode == 'sample' else None,
+            'output_dir': self.output_dir,
+            'sort': sort,
+            'profiles': profiles,
+        }
+
+    def stats(self):
+        return {'profiled': self.profiled, 'skipped_busy': self.skipped_busy}
@@ -0,0 +1,108 @@
+# Nhiều chương trình đào tạo, mỗi chương trình có khung chương trình và bộ mô hình riêng.
+#
+# Chương trình <tên> nằm trong thư mục PROGRAMS_DIR/<tên>/ gồm file Excel khung
+# chương trình và các file best_model_Year_<n>_*.pkl. Chương trình chỉ được dựng
+# khi có request đầu tiên chọn nó (mô hình trong đó cũng tải theo từng năm khi
+# cần) và được giữ trong một LRU có giới hạn, nên bộ nhớ không tăng theo số
+# chương trình. Chương trình gốc (không chọn program) luôn được giữ.
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROGRAM = 'default'
+
+# Tên chương trình hợp lệ cũng là tên thư mục, không cho phép '..' hay '/'
+PROGRAM_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+# curriculum: CurriculumCache, registry: ModelRegistry của riêng chương trình
+Program = namedtuple('Program', ['name', 'path', 'curriculum', 'registry', 'loaded_at'])
+
+
+class ProgramStore:
+    # factory(name, path) -> Program, được gọi khi chương trình chưa có trong LRU
+    def __init__(self, programs_dir, factory, max_loaded=8, default=None):
+        self.programs_dir = Path(programs_dir) if programs_dir else None
+        self.factory = factory
+        self.max_loaded = max(1, max_loaded)
+        self.default = default
+        self._loaded = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    # Thư mục của chương trình, hoặc None nếu tên không hợp lệ / không tồn tại
+    def path_for(self, name):
+        if self.programs_dir is None or not PROGRAM_NAME_PATTERN.match(name):
+            return None
+        path = self.programs_dir / name
+        return path if path.is_dir() else None
+
+    # Chương trình theo tên; None hoặc '' là chương trình gốc. Trả về None nếu không có.
+    def get(self, name=None):
+        if not name or name == DEFAULT_PROGRAM:
+            return self.default
+        name = str(name)
+        with self._lock:
+            program = self._loaded.get(name)
+            if program is not None:
+                self._loaded.move_to_end(name)
+                return program
+        path = self.path_for(name)
+        if path is None:
+            return None
+        with self._name_lock(name):
+            with self._lock:
+                program = self._loaded.get(name)
+                if program is not None:
+                    self._loaded.move_to_end(name)
+                    return program
+            started = time.perf_counter()
+            program = self.factory(name, path)
+            with self._lock:
+                self._loaded[name] = program
+                self.loads += 1
+                while len(self._loaded) > self.max_loaded:
+                    evicted, _ = self._loaded.popitem(last=False)
+                    self.evictions += 1
+                    logger.info("Bỏ chương trình %s khỏi bộ nhớ (giữ tối đa %d chương trình)", evicted, self.max_loaded)
+            logger.info("Đã nạp chương trình %s từ %s trong %.3f giây", name, path, time.perf_counter() - started)
+            return program
+
+    # Chương trình đã có trong bộ nhớ (lấy ra không phải đọc Excel/dựng registry)
+    def is_loaded(self, name=None):
+        if not name or name == DEFAULT_PROGRAM:
+            return self.default is not None
+        with self._lock:
+            return str(name) in self._loaded
+
+    # Các chương trình có trong thư mục (kể cả chưa nạp)
+    def available(self):
+        if self.programs_dir is None or not self.programs_dir.is_dir():
+            return []
+        return sorted(
+            path.name for path in self.programs_dir.iterdir()
+            if path.is_dir() and PROGRAM_NAME_PATTERN.match(path.name)
+        )
+
+    def stats(self):
+        with self._lock:
+            loaded = list(self._loaded)
+        return {
+            'programs_dir': str(self.programs_dir) if self.programs_dir else None,
+            'default': DEFAULT_PROGRAM,
+            'available': self.available(),
+            'loaded': loaded,
+            'max_loaded': self.max_loaded,
+            'loads': self.loads,
+            'evictions': self.evictions,
+        }
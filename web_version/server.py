@@ -1,142 +1,489 @@
+import time
+# Mốc bắt đầu import module, dùng cho báo cáo thời gian khởi động (/api/startup)
+_import_started = time.perf_counter()
 import os
+import sys
 import json
-import pandas as pd
-import joblib
+import re
+import hmac
 import numpy as np
 import io
-import openpyxl
 import logging
-from flask import Flask, jsonify, request, send_from_directory, Response, make_response
+import logging.handlers
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, g, jsonify, request, send_file, send_from_directory, Response, make_response
 from pathlib import Path
 import pickle
+import atexit
+
+try:
+    from .catalog import SubjectCatalog
+    from . import compact_format
+    from .confidence import confidence_payload, predict_with_confidence
+    from .curriculum import CurriculumCache
+    from .excel_export import XLSX_MIMETYPE, write_scores_workbook
+    from .features import FeatureEncoder
+    from .grading import DEFAULT_SCALE as grade_scale, LETTER_TO_NUMERIC, numeric_to_letter
+    from .inference_pool import InferencePool
+    from .metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry
+    from .model_registry import ModelRegistry, discover_model_paths
+    from .model_store import load_model_file, resolve_model_path
+    from .native_predictor import NATIVE_PREDICTORS, load_native_predictor
+    from .prediction_cache import PredictionCache
+    from .profiling import RequestProfiler
+    from .programs import DEFAULT_PROGRAM, Program, ProgramStore
+    from .student_state import RevisionConflict, StateAccessDenied, StudentStateStore
+    from .submission_store import SubmissionStore
+    from .what_if import analyze as analyze_what_if
+except ImportError:
+    from catalog import SubjectCatalog
+    import compact_format
+    from confidence import confidence_payload, predict_with_confidence
+    from curriculum import CurriculumCache
+    from excel_export import XLSX_MIMETYPE, write_scores_workbook
+    from features import FeatureEncoder
+    from grading import DEFAULT_SCALE as grade_scale, LETTER_TO_NUMERIC, numeric_to_letter
+    from inference_pool import InferencePool
+    from metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry
+    from model_registry import ModelRegistry, discover_model_paths
+    from model_store import load_model_file, resolve_model_path
+    from native_predictor import NATIVE_PREDICTORS, load_native_predictor
+    from prediction_cache import PredictionCache
+    from profiling import RequestProfiler
+    from programs import DEFAULT_PROGRAM, Program, ProgramStore
+    from student_state import RevisionConflict, StateAccessDenied, StudentStateStore
+    from submission_store import SubmissionStore
+    from what_if import analyze as analyze_what_if
 
 app = Flask(__name__, static_folder='.')
 
-# Cấu hình logging
+# Cấu hình logging: luồng request chỉ đưa bản ghi vào hàng đợi (QueueHandler),
+# việc ghi file/console do một luồng nền (QueueListener) đảm nhận
+_log_handlers = [
+    logging.FileHandler('app.log'),
+    logging.StreamHandler()
+]
+_log_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+_log_listener = logging.handlers.QueueListener(_log_queue_handler.queue, *_log_handlers, respect_handler_level=True)
+_log_listener.start()
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[_log_queue_handler]
 )
 logger = logging.getLogger(__name__)
 
+# Luồng listener không tồn tại trong tiến trình con sau khi gunicorn fork,
+# nên mỗi worker tạo hàng đợi và listener mới
+def _restart_log_listener():
+    global _log_listener
+    _log_queue_handler.queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(_log_queue_handler.queue, *_log_handlers, respect_handler_level=True)
+    _log_listener.start()
+
+os.register_at_fork(after_in_child=_restart_log_listener)
+atexit.register(lambda: _log_listener.stop())
+
+# Metric của tiến trình (mỗi worker một bộ đếm), xuất tại /metrics theo định dạng Prometheus
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.counter('http_requests_total', "Số request HTTP theo endpoint và mã trạng thái", ['endpoint', 'method', 'status'])
+HTTP_LATENCY = metrics.histogram('http_request_duration_seconds', "Thời gian xử lý request HTTP", ['endpoint'])
+STAGE_LATENCY = metrics.histogram('request_stage_seconds', "Thời gian từng giai đoạn xử lý dự đoán", ['stage'])
+PREDICTION_OUTCOMES = metrics.counter('prediction_outcomes_total', "Số kết quả dự đoán theo nguồn (mô hình hoặc GPA dự phòng)", ['year', 'source'])
+
 # Đường dẫn tới file Excel
 EXCEL_FILE_PATH = './attached_assets/GiaoDien_KhungChuongTrinh.xlsx'
 
-# Đường dẫn tới các mô hình
-MODEL_PATHS = {
-    'nam1': './attached_assets/best_model_Year_1_SVM.pkl',
-    'nam2': './attached_assets/best_model_Year_2_SVM.pkl',
-    'nam3': './attached_assets/best_model_Year_3_Logistic_Regression.pkl',
-    'nam4': './attached_assets/best_model_Year_4_Logistic_Regression.pkl'
-}
+# File JSON môn học sinh ra từ Excel (frontend đọc trực tiếp qua /data/subjects.json)
+SUBJECTS_JSON_PATH = './web_version/data/subjects.json'
+
+# Cache khung chương trình đã phân tích (khóa theo sha256 của file Excel), dựng sẵn
+# bằng python -m web_version.curriculum để khởi động không cần pandas/openpyxl
+CURRICULUM_CACHE_PATH = os.environ.get('CURRICULUM_CACHE_PATH', './web_version/data/curriculum.cache.json')
+
+# Chu kỳ kiểm tra file Excel khung chương trình thay đổi (giây)
+CURRICULUM_CHECK_INTERVAL = float(os.environ.get('CURRICULUM_CHECK_INTERVAL', '5'))
+
+# Thư mục chứa các mô hình best_model_Year_<n>_*.pkl, được registry theo dõi để tải lại nóng
+MODEL_DIR = os.environ.get('MODEL_DIR', './attached_assets')
+MODEL_CHECK_INTERVAL = float(os.environ.get('MODEL_CHECK_INTERVAL', '5'))
+
+# Đường dẫn tới các mô hình (năm học -> file .pkl), cập nhật khi registry phát hiện file mới
+MODEL_PATHS = discover_model_paths(MODEL_DIR)
+
+# Nhãn năm cho metric: chỉ các năm có mô hình, năm khác gộp vào 'unknown' để số
+# chuỗi metric không tăng theo giá trị client gửi lên
+def _metric_year(year):
+    return year if year in MODEL_PATHS else 'unknown'
+
+# Các chương trình đào tạo khác: PROGRAMS_DIR/<tên>/ chứa file Excel khung chương
+# trình (cùng tên file với EXCEL_FILE_PATH) và các best_model_Year_<n>_*.pkl riêng.
+# Chọn bằng trường 'program' của request; tối đa MAX_LOADED_PROGRAMS chương trình
+# được giữ trong bộ nhớ (LRU), chương trình gốc luôn được giữ.
+PROGRAMS_DIR = os.environ.get('PROGRAMS_DIR', './programs')
+MAX_LOADED_PROGRAMS = int(os.environ.get('MAX_LOADED_PROGRAMS', '8'))
+
+# Luồng nạp nền mô hình của tiến trình hiện tại (xem _ensure_model_warmup)
+_warmup_thread = None
+_warmup_lock = threading.Lock()
 
-# Cache cho mô hình
-_model_cache = {}
+# Cache kết quả dự đoán theo năm + vector đặc trưng đã căn chỉnh
+_prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', '4096')),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', '600'))
+)
+
+@metrics.register_collector
+def _inference_pool_metrics():
+    if _inference_pool is None:
+        return []
+    stats = _inference_pool.stats()
+    return [
+        ('inference_pool_batches_total', 'counter', "Số micro-batch đã gửi tới pool suy luận", [({}, stats['batches'])]),
+        ('inference_pool_batched_rows_total', 'counter', "Số hàng đã dự đoán qua micro-batch", [({}, stats['batched_rows'])]),
+    ]
+
+@metrics.register_collector
+def _startup_metrics():
+    return [
+        ('startup_phase_seconds', 'gauge', "Thời gian các giai đoạn khởi động tiến trình",
+         [({'phase': phase}, round(seconds, 6)) for phase, seconds in STARTUP_PHASES.items()]),
+    ]
+
+@metrics.register_collector
+def _prediction_cache_metrics():
+    stats = _prediction_cache.stats()
+    return [
+        ('prediction_cache_hits_total', 'counter', "Số lần trúng cache dự đoán", [({}, stats['hits'])]),
+        ('prediction_cache_misses_total', 'counter', "Số lần trượt cache dự đoán", [({}, stats['misses'])]),
+        ('prediction_cache_evictions_total', 'counter', "Số mục bị loại khỏi cache dự đoán", [({}, stats['evictions'])]),
+        ('prediction_cache_entries', 'gauge', "Số mục hiện có trong cache dự đoán", [({}, stats['size'])]),
+    ]
+
+# Backend suy luận: 'inline' (mặc định, predict ngay trong luồng request) hoặc
+# 'pool' (pool tiến trình giữ sẵn mô hình, gom request thành micro-batch).
+# Với 'pool' nên chạy ít worker gunicorn (ví dụ 1 worker nhiều luồng) vì mỗi
+# worker có pool INFERENCE_WORKERS tiến trình riêng.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'inline')
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', '30'))
+_inference_pool = InferencePool(
+    MODEL_PATHS,
+    workers=int(os.environ.get('INFERENCE_WORKERS', '0')) or None,
+    batch_window=float(os.environ.get('INFERENCE_BATCH_WINDOW_MS', '2')) / 1000,
+    max_batch=int(os.environ.get('INFERENCE_MAX_BATCH', '256'))
+) if INFERENCE_BACKEND == 'pool' else None
+
+# Kho lưu bài nộp (SQLite WAL, ghi nền theo lô). Dữ liệu chứa điểm của sinh viên nên
+# không có endpoint xuất; xuất bằng dòng lệnh: python -m web_version.submission_store
+SUBMISSIONS_DB_PATH = os.environ.get('SUBMISSIONS_DB_PATH', 'data/submissions.db')
+_submission_store = SubmissionStore(
+    SUBMISSIONS_DB_PATH, max_queue=int(os.environ.get('SUBMISSIONS_MAX_QUEUE', '10000'))
+)
+
+# File JSON bài nộp của phiên bản cũ, nhập vào SQLite khi khởi động (mỗi nội dung chỉ nhập một lần)
+LEGACY_SUBMISSIONS_PATHS = [
+    path for path in os.environ.get(
+        'SUBMISSIONS_LEGACY_JSON', 'data/submissions.json,./web_version/data/submissions.json'
+    ).split(',') if path
+]
+for _legacy_path in LEGACY_SUBMISSIONS_PATHS:
+    try:
+        _submission_store.import_json(_legacy_path)
+    except Exception as e:
+        logger.error("Không nhập được bài nộp cũ từ %s: %s", _legacy_path, str(e))
+
+@metrics.register_collector
+def _submission_store_metrics():
+    stats = _submission_store.stats()
+    return [
+        ('submission_writer_healthy', 'gauge', "Luồng ghi bài nộp hoạt động và lần ghi gần nhất thành công", [({}, int(stats['healthy']))]),
+        ('submission_queue_depth', 'gauge', "Số bài nộp đang chờ ghi", [({}, stats['queued'])]),
+        ('submissions_written_total', 'counter', "Số bài nộp đã ghi xuống SQLite", [({}, stats['written'])]),
+        ('submissions_dropped_total', 'counter', "Số bài nộp bị bỏ do hàng đợi đầy hoặc ghi lỗi", [({}, stats['dropped'])]),
+        ('submission_write_errors_total', 'counter', "Số lần ghi lô bài nộp bị lỗi", [({}, stats['write_errors'])]),
+    ]
+
+# Trạng thái điểm tăng dần theo mã sinh viên/mã phiên (/api/students/<id>/grades);
+# trạng thái không cập nhật quá STUDENT_STATE_TTL_DAYS ngày sẽ bị xóa
+STUDENT_STATE_DB_PATH = os.environ.get('STUDENT_STATE_DB_PATH', 'data/student_state.db')
+_student_states = StudentStateStore(
+    STUDENT_STATE_DB_PATH, ttl=float(os.environ.get('STUDENT_STATE_TTL_DAYS', '30')) * 86400
+)
+
+# Mã sinh viên/mã phiên hợp lệ trong URL
+STUDENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,128}$')
+
+# Token bí mật client tạo khi gửi điểm lần đầu; trạng thái chỉ đọc/sửa/xóa được
+# khi gửi lại đúng token này trong header
+STUDENT_TOKEN_HEADER = 'X-Student-Token'
+STUDENT_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,256}$')
+
+# Kiểm tra mã sinh viên trong URL và token trong header; trả về (token, None) hoặc (None, response lỗi)
+def _student_token(student_id):
+    if not STUDENT_ID_PATTERN.match(student_id):
+        return None, (jsonify({'status': 'error', 'message': "Mã sinh viên không hợp lệ."}), 400)
+    token = request.headers.get(STUDENT_TOKEN_HEADER)
+    if not token or not STUDENT_TOKEN_PATTERN.match(token):
+        return None, (jsonify({'status': 'error', 'message': f"Thiếu hoặc sai định dạng header {STUDENT_TOKEN_HEADER}."}), 401)
+    return token, None
+
+@metrics.register_collector
+def _student_state_metrics():
+    stats = _student_states.stats()
+    return [
+        ('student_state_updates_total', 'counter', "Số lần cập nhật trạng thái điểm tăng dần", [({}, stats['updates'])]),
+        ('student_state_feature_rebuilds_total', 'counter', "Số lần dựng lại hàng đặc trưng từ toàn bộ điểm", [({}, stats['feature_rebuilds'])]),
+    ]
+
+# Profiling request theo cấu hình (xem profiling.py): PROFILE_MODE=off|header|sample
+_profiler = RequestProfiler(
+    os.environ.get('PROFILE_DIR', 'data/profiles'),
+    mode=os.environ.get('PROFILE_MODE', 'off'),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0.01')),
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', '1')) / 1000,
+    flush_interval=float(os.environ.get('PROFILE_FLUSH_INTERVAL', '10'))
+)
+atexit.register(_profiler.flush)
+
+@metrics.register_collector
+def _profiling_metrics():
+    stats = _profiler.stats()
+    return [
+        ('profiled_requests_total', 'counter', "Số request đã được profile", [({}, stats['profiled'])]),
+        ('profile_skipped_busy_total', 'counter', "Số request được chọn nhưng bỏ qua vì đang profile request khác", [({}, stats['skipped_busy'])]),
+    ]
+
+# Kích thước tối đa của body sau khi giải nén (request gzip/deflate)
+MAX_DECODED_BODY_BYTES = int(os.environ.get('MAX_DECODED_BODY_BYTES', str(16 << 20)))
 
 # Dữ liệu về các môn học và số tín chỉ
 subjects_data = []
 
-# Định nghĩa chuyển đổi từ điểm chữ sang điểm số (GPA)
-LETTER_TO_NUMERIC = {
-    'A': 4.0,
-    'B': 3.0,
-    'C': 2.0,
-    'D': 1.0,
-    'F': 0.0
-}
-
-# Hàm chuyển điểm số sang điểm chữ theo thang điểm
-def numeric_to_letter(score):
-    try:
-        score = float(score)
-        if score >= 8.5:
-            return 'A'
-        elif score >= 7.0:
-            return 'B'
-        elif score >= 5.5:
-            return 'C'
-        elif score >= 4.0:
-            return 'D'
+# Danh mục môn học có chỉ mục theo tên/mã, dựng lại mỗi lần đọc Excel
+subject_catalog = SubjectCatalog([])
+
+# Cache khung chương trình: chỉ đọc lại Excel khi file thay đổi
+_curriculum = CurriculumCache(
+    EXCEL_FILE_PATH, SUBJECTS_JSON_PATH,
+    check_interval=CURRICULUM_CHECK_INTERVAL,
+    cache_path=CURRICULUM_CACHE_PATH
+)
+
+# Thời gian các giai đoạn khởi động của tiến trình (giây): curriculum, models,
+# first_request (tính từ lúc bắt đầu import module)
+STARTUP_PHASES = {}
+
+# Các module nặng được theo dõi trong báo cáo khởi động để kiểm tra việc import trễ
+HEAVY_MODULES = ('pandas', 'openpyxl', 'joblib', 'sklearn')
+
+# Quy đổi điểm hệ 10 của nhiều bảng điểm sang điểm chữ trong một lượt np.digitize.
+# Điểm số nằm ở 'original_score' (frontend gửi kèm điểm chữ đã quy đổi) hoặc trực
+# tiếp ở 'score'; điểm chữ do server tính theo ngưỡng hiện hành ghi đè lên 'score'.
+# Trả về {chỉ số bảng điểm: điểm đầu tiên nằm ngoài khoảng hợp lệ}.
+def _apply_numeric_grades(score_lists):
+    entries, values, owners = [], [], []
+    for i, scores in enumerate(score_lists):
+        for score in scores:
+            value = score.get('original_score', score.get('score'))
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                entries.append(score)
+                values.append(value)
+                owners.append(i)
+    if not entries:
+        return {}
+    letters, out_of_range = grade_scale.grade(values)
+    invalid = {}
+    for score, letter, bad, owner, value in zip(entries, letters.tolist(), out_of_range.tolist(), owners, values):
+        if bad:
+            invalid.setdefault(owner, value)
         else:
-            return 'F'
-    except:
-        return 'F'
+            score['score'] = letter
+    return invalid
 
-# Hàm tải mô hình machine learning với caching và validation
+def _score_range_message(value):
+    return f"Điểm {value} nằm ngoài khoảng {grade_scale.score_min:g}-{grade_scale.score_max:g}."
+
+# Hàm tải mô hình machine learning (phiên bản đang phục vụ trong registry)
 def load_model(year):
-    global _model_cache
+    version = _model_version(year)
+    return version.model if version is not None else None
+
+# Phiên bản mô hình đang phục vụ cho một năm của một chương trình (mặc định:
+# chương trình gốc); lần đầu được tải đồng bộ
+def _model_version(year, program=None):
+    registry = (program or _default_program).registry
+    version = registry.get(year)
+    if version is not None:
+        return version
+    return registry.load(year)
+
+# Đọc một file mô hình cho registry, trả về (mô hình, bộ mã hóa, file đã đọc)
+def _load_model_file(year, model_path):
     try:
-        if year in _model_cache:
-            logger.debug("Lấy mô hình cho năm %s từ cache", year)
-            return _model_cache[year]
-        
-        model_path = MODEL_PATHS.get(year)
-        if not model_path:
-            logger.error("Không có đường dẫn mô hình cho năm %s", year)
-            return None
-        
-        model_path = Path(model_path)
-        if not model_path.exists():
-            logger.error("Không tìm thấy file mô hình tại %s cho năm %s", model_path, year)
-            return None
-        
-        with open(model_path, 'rb') as f:
-            model = joblib.load(f)
-        
-        # Kiểm tra mô hình
-        required_attrs = ['predict']
-        optional_attrs = ['feature_names_in_']
-        for attr in required_attrs:
-            if not hasattr(model, attr):
-                logger.error("Mô hình cho năm %s không hợp lệ: thiếu thuộc tính %s", year, attr)
+        # Ưu tiên bộ dự đoán NumPy đã xuất (python -m web_version.native_predictor),
+        # không cần import sklearn; nếu không có hoặc không khớp tập kiểm tra thì dùng pipeline gốc
+        model = load_native_predictor(model_path) if NATIVE_PREDICTORS else None
+        if model is not None:
+            model_path = model.path
+        else:
+            # Dùng bản .joblib memory-map nếu đã chuyển đổi (python -m web_version.model_store)
+            model_path = resolve_model_path(model_path)
+            if not model_path.exists():
+                logger.error("Không tìm thấy file mô hình tại %s cho năm %s", model_path, year)
                 return None
+            model = load_model_file(model_path)
         
-        for attr in optional_attrs:
-            if hasattr(model, attr):
-                logger.debug("Mô hình cho năm %s có %s: %s", year, attr, getattr(model, attr))
-        
-        # Lưu mô hình vào cache
-        _model_cache[year] = model
-        logger.info("Đã tải và lưu mô hình cho năm %s từ %s vào cache", year, model_path)
-        return model
+        # Dựng sẵn bộ mã hóa tên môn học -> chỉ số cột
+        encoder = FeatureEncoder(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else None
+        logger.info("Đã tải mô hình cho năm %s từ %s", year, model_path)
+        return model, encoder, model_path
     
     except pickle.UnpicklingError as e:
         logger.error("Lỗi unpickle mô hình cho năm %s: %s", year, str(e))
         return None
+
+# Kiểm tra mô hình trước khi đưa vào phục vụ: có predict và feature_names_in_,
+# mọi môn học của mô hình có trong khung chương trình, dự đoán thử trên bảng
+# điểm toàn 'F' trả về nhãn hợp lệ. Trả về thông báo lỗi hoặc None.
+def _validate_model(year, model, encoder, catalog=None):
+    catalog = catalog if catalog is not None else subject_catalog
+    if not hasattr(model, 'predict'):
+        return "thiếu thuộc tính predict"
+    if encoder is None:
+        return "thiếu thuộc tính feature_names_in_"
+    if catalog.by_name:
+        known = {name.casefold(): name for name in catalog.by_name}
+        missing = [name for name in encoder.feature_names if name.casefold() not in known]
+        if missing:
+            return f"các môn không có trong khung chương trình: {', '.join(missing)}"
+        inexact = [name for name in encoder.feature_names if name not in catalog.by_name]
+        if inexact:
+            logger.warning("Mô hình năm %s có môn chỉ khớp khung chương trình khi bỏ qua hoa/thường "
+                           "(luôn nhận điểm mặc định): %s", year, ", ".join(inexact))
+    try:
+        prediction = _predict_features(model, encoder, encoder.encode_many([[]]))[0]
     except Exception as e:
-        logger.error("Lỗi không xác định khi tải mô hình cho năm %s: %s", year, str(e))
+        return f"dự đoán thử thất bại: {e}"
+    if prediction not in VALID_GRAD_TYPES:
+        return f"dự đoán thử trả về nhãn không hợp lệ: {prediction}"
+    return None
+
+# Sau mỗi lần hoán đổi phiên bản: bỏ cache dự đoán của năm đó. Pool suy luận không
+# cần khởi động lại: mỗi tác vụ mang mã phiên bản, tiến trình con tự nạp file mới.
+def _on_model_swap(year, old_version, new_version):
+    _prediction_cache.clear(year)
+
+_model_registry = ModelRegistry(
+    MODEL_DIR, _load_model_file, _validate_model,
+    check_interval=MODEL_CHECK_INTERVAL, on_swap=_on_model_swap, paths=MODEL_PATHS
+)
+
+# Chương trình gốc: EXCEL_FILE_PATH + MODEL_DIR, dùng khi request không chọn program
+_default_program = Program(DEFAULT_PROGRAM, None, _curriculum, _model_registry, time.time())
+
+# Dựng một chương trình từ thư mục của nó; mô hình được registry tải theo năm khi cần
+def _build_program(name, path):
+    curriculum = CurriculumCache(
+        str(path / Path(EXCEL_FILE_PATH).name), str(path / 'subjects.json'),
+        check_interval=CURRICULUM_CHECK_INTERVAL,
+        cache_path=str(path / 'curriculum.cache.json')
+    )
+    catalog = curriculum.refresh().catalog
+    if not len(catalog):
+        logger.warning("Chương trình %s không có môn học nào trong %s", name, path)
+    registry = ModelRegistry(
+        str(path), _load_model_file,
+        lambda year, model, encoder: _validate_model(year, model, encoder, curriculum.snapshot.catalog),
+        check_interval=MODEL_CHECK_INTERVAL, on_swap=_on_model_swap
+    )
+    return Program(name, str(path), curriculum, registry, time.time())
+
+_programs = ProgramStore(PROGRAMS_DIR, _build_program, max_loaded=MAX_LOADED_PROGRAMS, default=_default_program)
+
+# Chương trình theo trường 'program' của request; trả về (chương trình, response lỗi)
+def _request_program(name):
+    program = _programs.get(name)
+    if program is None:
+        return None, (jsonify({'status': 'error', 'message': f"Không có chương trình đào tạo {name}"}), 404)
+    return program, None
+
+# Body request: JSON thông thường, hoặc JSON/msgpack có nén gzip/deflate (định dạng gọn)
+def _request_data():
+    if not request.content_encoding and request.mimetype not in compact_format.MSGPACK_MIMETYPES:
+        return request.get_json()
+    return compact_format.read_payload(
+        request.get_data(cache=False), request.mimetype, request.content_encoding, MAX_DECODED_BODY_BYTES
+    )
+
+def _compact_error(e):
+    return jsonify({'status': 'error', 'message': str(e), **e.details}), e.status
+
+# Nạp sẵn và kiểm tra toàn bộ mô hình song song khi khởi động worker
+def preload_models(max_workers=None):
+    def _preload(year):
+        return year, _model_registry.load(year) is not None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or len(MODEL_PATHS), thread_name_prefix='model-preload') as executor:
+        results = dict(executor.map(_preload, MODEL_PATHS))
+    STARTUP_PHASES.setdefault('models', time.perf_counter() - started)
+    logger.info("Đã nạp sẵn mô hình: %s", ", ".join(f"{year}={'ok' if ok else 'lỗi'}" for year, ok in results.items()))
+    return all(results.values())
+
+# Nạp sẵn mô hình trong luồng nền để không chặn quá trình khởi động
+def start_model_warmup():
+    if _inference_pool is not None:
+        # Pool suy luận thuộc về từng tiến trình worker nên luôn khởi động tại đây
+        threading.Thread(target=_inference_pool.warm_up, name='inference-warmup', daemon=True).start()
+    return _ensure_model_warmup()
+
+# Chạy preload_models trong luồng nền nếu còn mô hình chưa tải và chưa có luồng nào
+# đang chạy (sau fork, luồng của master không còn nên is_alive() là False)
+def _ensure_model_warmup():
+    global _warmup_thread
+    if models_ready():
         return None
+    with _warmup_lock:
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return _warmup_thread
+        _warmup_thread = threading.Thread(target=preload_models, name='model-warmup', daemon=True)
+        _warmup_thread.start()
+        return _warmup_thread
 
-# Hàm đọc dữ liệu từ Excel và chuyển thành JSON
+# Trạng thái mô hình của một năm lấy trực tiếp từ registry nên đúng cả khi mô hình
+# được tải lười ở request đầu tiên: 'ready' | 'error' | 'loading'
+def _model_state(year):
+    if year in _model_registry:
+        return 'ready'
+    return 'error' if _model_registry.error(year) else 'loading'
+
+# Chỉ sẵn sàng khi mọi mô hình đã được tải và kiểm tra
+def models_ready():
+    return all(year in _model_registry for year in MODEL_PATHS)
+
+# Cập nhật dữ liệu môn học toàn cục theo ảnh chụp khung chương trình
+def _apply_curriculum(snapshot):
+    global subjects_data, subject_catalog
+    if snapshot.catalog is not subject_catalog:
+        subjects_data = snapshot.subjects
+        subject_catalog = snapshot.catalog
+    return snapshot
+
+# Hàm đọc dữ liệu từ Excel và chuyển thành JSON (chỉ đọc lại khi file Excel thay đổi)
 def read_excel_to_json():
-    try:
-        df = pd.read_excel(EXCEL_FILE_PATH)
-        global subjects_data
-        subjects_data = []
-        for _, row in df.iterrows():
-            if pd.notna(row['Mã Học Phần']) and pd.notna(row['Học Kỳ']):
-                subjects_data.append({
-                    'tenHocPhan': row['Tên Học Phần'],
-                    'maHocPhan': row['Mã Học Phần'],
-                    'soTinChi': int(row['Số Tín Chỉ']) if pd.notna(row['Số Tín Chỉ']) else 0,
-                    'hocKy': int(row['Học Kỳ'])
-                })
-        os.makedirs('data', exist_ok=True)
-        with open('./web_version/data/subjects.json', 'w', encoding='utf-8') as f:
-            json.dump(subjects_data, f, ensure_ascii=False, indent=2)
-        logger.info("Đã đọc và lưu dữ liệu môn học vào subjects.json")
-        return subjects_data
-    except Exception as e:
-        logger.error("Lỗi khi đọc file Excel: %s", str(e))
-        return []
+    snapshot = _apply_curriculum(_curriculum.refresh())
+    logger.info("Đã đọc và lưu dữ liệu môn học vào subjects.json")
+    return snapshot.subjects
+
+_curriculum_started = time.perf_counter()
 read_excel_to_json()
+STARTUP_PHASES['curriculum'] = time.perf_counter() - _curriculum_started
 
 # Hàm tính điểm trung bình theo tín chỉ (dựa trên điểm chữ)
-def calculate_weighted_average(scores):
+def calculate_weighted_average(scores, catalog=None):
+    catalog = catalog if catalog is not None else subject_catalog
     total_weighted_score = 0
     total_credits = 0
     
@@ -149,10 +496,10 @@ def calculate_weighted_average(scores):
             continue
         subject_score = LETTER_TO_NUMERIC[letter_grade]
         
-        subject_info = next((s for s in subjects_data if s['tenHocPhan'] == subject_name), None)
+        subject_info = catalog.get_by_name(subject_name)
         
         if subject_info:
-            credits = subject_info['soTinChi']
+            credits = subject_info.credits
             total_weighted_score += subject_score * credits
             total_credits += credits
         else:
@@ -180,89 +527,249 @@ def gpa_to_graduation_type(avg_score):
     else:
         return "Tốt nghiệp không đúng hạn"
 
-# Hàm dự đoán kết quả tốt nghiệp
-def predict_graduation(year, scores):
+# Các loại tốt nghiệp hợp lệ mà mô hình có thể trả về
+VALID_GRAD_TYPES = ["Xuất Sắc", "Giỏi", "Khá", "Trung Bình", "Ra trường không đúng hạn"]
+
+# Kết quả dựa trên GPA dự phòng
+def _fallback_result(avg_score):
+    fallback_grad_type = gpa_to_graduation_type(avg_score)
+    result_message = f"Bạn tốt nghiệp Loại {fallback_grad_type}" if fallback_grad_type != "Tốt nghiệp không đúng hạn" else "Bạn ra trường không đúng hạn"
+    return {
+        'status': 'success',
+        'prediction': 1 if avg_score >= 2.0 else 0,
+        'message': result_message,
+        'average_score': round(avg_score, 2),
+        'model_version': None,
+        'confidence': None
+    }
+
+# Kết quả dựa trên nhãn mô hình dự đoán (dùng GPA dự phòng nếu nhãn không hợp lệ)
+def _model_result(prediction, avg_score, model_version, confidence=None):
+    if prediction not in VALID_GRAD_TYPES:
+        return None
+    result_message = f"Bạn sẽ tốt nghiệp Loại {prediction}" if prediction != "Ra trường không đúng hạn" else "Bạn sẽ ra trường không đúng hạn"
+    return {
+        'status': 'success',
+        'prediction': 1 if prediction != "Ra trường không đúng hạn" else 0,
+        'message': result_message,
+        'average_score': round(avg_score, 2),
+        'model_version': model_version,
+        'confidence': confidence
+    }
+
+# Dự đoán trên ma trận điểm chữ đã mã hóa; bộ dự đoán native nhận trực tiếp
+# ma trận, pipeline sklearn cần DataFrame có tên cột
+def _predict_features(model, encoder, features):
+    if hasattr(model, 'predict_encoded'):
+        return model.predict_encoded(features)
+    return model.predict(encoder.to_frame(features))
+
+# Nhãn kèm độ tin cậy (xác suất hoặc biên quyết định) cho từng hàng trong một lượt suy luận
+def _predict_with_confidence(model, encoder, features):
+    labels, scores, score_type = predict_with_confidence(model, features, encoder.to_frame)
+    classes = model.classes_
+    return [
+        (label, confidence_payload(classes, scores[i] if scores is not None else None, score_type))
+        for i, label in enumerate(labels)
+    ]
+
+# Pool suy luận chỉ phục vụ phiên bản hiện hành của chương trình gốc (tiến trình con
+# nạp được từ file trên đĩa); phiên bản đã rollback, phiên bản cũ và mô hình của các
+# chương trình khác dự đoán ngay trong tiến trình
+def _use_inference_pool(version):
+    return (_inference_pool is not None and not version.rolled_back
+            and _model_registry.get(version.year) is version)
+
+# Danh mục môn học của một chương trình (chương trình gốc: subject_catalog hiện hành)
+def _program_catalog(program):
+    if program is None or program is _default_program:
+        return subject_catalog
+    return program.curriculum.get().catalog
+
+# Dự đoán (nhãn, độ tin cậy) cho một sinh viên; bảng điểm tương đương đã gặp
+# được lấy từ cache mà không cần dựng DataFrame hay gọi model.predict.
+# encode(version) dựng hàng đặc trưng (ma trận 1 x n) cho mô hình của version.
+def _predict_one(version, encode):
+    with STAGE_LATENCY.time(stage='alignment'):
+        features = encode(version)
+    return _predict_row(version, features)
+
+# Dự đoán (nhãn, độ tin cậy, từ cache) cho một hàng đặc trưng đã căn chỉnh (ma trận 1 x n)
+def _predict_row(version, features):
+    cache_key = PredictionCache.make_key(version.year, features[0], version.version)
+    prediction = _prediction_cache.get(cache_key)
+    if prediction is not None:
+        return prediction[0], prediction[1], True
+    with STAGE_LATENCY.time(stage='predict'):
+        prediction = None
+        if _use_inference_pool(version):
+            try:
+                prediction = _inference_pool.predict_one(
+                    version.year, features[0], timeout=INFERENCE_TIMEOUT,
+                    version=version.version, model_path=version.source_path
+                )
+            except Exception as e:
+                logger.warning("Pool suy luận lỗi với mô hình năm %s: %s, dự đoán trong tiến trình", version.year, str(e))
+        if prediction is None:
+            prediction = _predict_with_confidence(version.model, version.encoder, features)[0]
+    _prediction_cache.put(cache_key, prediction)
+    return prediction[0], prediction[1], False
+
+# Hàm dự đoán kết quả tốt nghiệp (program: chương trình đào tạo, mặc định chương trình gốc)
+def predict_graduation(year, scores, program=None):
+    # Tính GPA làm dự phòng
+    with STAGE_LATENCY.time(stage='gpa'):
+        avg_score = calculate_weighted_average(scores, _program_catalog(program))
+    return _predict_graduation(year, avg_score, lambda version: version.encoder.encode(scores), program)
+
+# Dự đoán từ GPA đã tính và hàm dựng hàng đặc trưng encode(version) (xem _predict_one)
+def _predict_graduation(year, avg_score, encode, program=None):
     try:
-        # Tính GPA làm dự phòng
-        avg_score = calculate_weighted_average(scores)
         fallback_grad_type = gpa_to_graduation_type(avg_score)
         logger.info("Kết quả GPA dự phòng: Loại %s (GPA: %.2f)", fallback_grad_type, avg_score)
         
-        # Tải mô hình
-        model = load_model(year)
-        if not model:
+        # Lấy phiên bản mô hình đang phục vụ (file mới được tải lại ở nền)
+        (program or _default_program).registry.check()
+        version = _model_version(year, program)
+        if version is None:
             logger.warning("Không tải được mô hình cho năm %s, sử dụng kết quả GPA dự phòng", year)
-            result_message = f"Bạn tốt nghiệp Loại {fallback_grad_type}" if fallback_grad_type != "Tốt nghiệp không đúng hạn" else "Bạn ra trường không đúng hạn"
-            logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result_message)
-            return {
-                'status': 'success',
-                'prediction': 1 if avg_score >= 2.0 else 0,
-                'message': result_message,
-                'average_score': round(avg_score, 2)
-            }
-        
-        # Chuẩn bị dữ liệu đầu vào cho mô hình
-        subject_scores = {}
-        for score in scores:
-            subject_name = score['subjectName']
-            letter_grade = score['score'].upper() if isinstance(score['score'], str) else score['score']
-            if letter_grade in LETTER_TO_NUMERIC:
-                subject_scores[subject_name] = letter_grade
-            else:
-                logger.warning("Điểm chữ %s không hợp lệ cho môn %s", letter_grade, subject_name)
-
-        # Tạo DataFrame với tên môn học làm cột
-        df = pd.DataFrame([subject_scores])
+            PREDICTION_OUTCOMES.inc(year=_metric_year(year), source='gpa_fallback')
+            result = _fallback_result(avg_score)
+            logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result['message'])
+            return result
         
         # Dự đoán với mô hình
         try:
-            if hasattr(model, 'feature_names_in_'):
-                for feature in model.feature_names_in_:
-                    if feature not in df.columns:
-                        df[feature] = 'F'
-                df = df[model.feature_names_in_]
-            
-            prediction = model.predict(df)[0]
-            logger.info("Mô hình năm %s dự đoán: Loại %s", year, prediction)
+            prediction, confidence, cached = _predict_one(version, encode)
+            logger.info("Mô hình năm %s (phiên bản %s) dự đoán: Loại %s%s", year, version.version, prediction, " (từ cache)" if cached else "")
             
-            valid_grad_types = ["Xuất Sắc", "Giỏi", "Khá", "Trung Bình", "Ra trường không đúng hạn"]
-            if prediction in valid_grad_types:
-                result_message = f"Bạn sẽ tốt nghiệp Loại {prediction}" if prediction != "Ra trường không đúng hạn" else "Bạn sẽ ra trường không đúng hạn"
-                prediction_value = 1 if prediction != "Ra trường không đúng hạn" else 0
-                logger.info("Kết quả cuối cùng: %s (dựa trên mô hình)", result_message)
+            result = _model_result(prediction, avg_score, version.version, confidence)
+            if result:
+                PREDICTION_OUTCOMES.inc(year=_metric_year(year), source='model')
+                logger.info("Kết quả cuối cùng: %s (dựa trên mô hình)", result['message'])
             else:
                 logger.warning("Dự đoán không hợp lệ từ mô hình: %s, sử dụng GPA dự phòng: %s", prediction, fallback_grad_type)
-                result_message = f"Bạn tốt nghiệp Loại {fallback_grad_type}" if fallback_grad_type != "Tốt nghiệp không đúng hạn" else "Bạn ra trường không đúng hạn"
-                prediction_value = 1 if avg_score >= 2.0 else 0
-                logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result_message)
-            
-            return {
-                'status': 'success',
-                'prediction': prediction_value,
-                'message': result_message,
-                'average_score': round(avg_score, 2)
-            }
+                PREDICTION_OUTCOMES.inc(year=_metric_year(year), source='gpa_fallback')
+                result = _fallback_result(avg_score)
+                logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result['message'])
+            return result
         except Exception as e:
             logger.error("Lỗi khi dự đoán với mô hình năm %s: %s, sử dụng GPA dự phòng: %s", year, str(e), fallback_grad_type)
-            result_message = f"Bạn tốt nghiệp Loại {fallback_grad_type}" if fallback_grad_type != "Tốt nghiệp không đúng hạn" else "Bạn ra trường không đúng hạn"
-            logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result_message)
-            return {
-                'status': 'success',
-                'prediction': 1 if avg_score >= 2.0 else 0,
-                'message': result_message,
-                'average_score': round(avg_score, 2)
-            }
+            PREDICTION_OUTCOMES.inc(year=_metric_year(year), source='gpa_fallback')
+            result = _fallback_result(avg_score)
+            logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result['message'])
+            return result
             
     except Exception as e:
-        logger.error("Lỗi không xác định trong predict_graduation: %s, sử dụng GPA dự phòng: %s", str(e), fallback_grad_type)
-        result_message = f"Bạn tốt nghiệp Loại {fallback_grad_type}" if fallback_grad_type != "Tốt nghiệp không đúng hạn" else "Bạn ra trường không đúng hạn"
-        logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result_message)
-        return {
-            'status': 'success',
-            'prediction': 1 if avg_score >= 2.0 else 0,
-            'message': result_message,
-            'average_score': round(avg_score, 2)
-        }
+        logger.error("Lỗi không xác định trong _predict_graduation: %s, sử dụng GPA dự phòng: %s", str(e), fallback_grad_type)
+        PREDICTION_OUTCOMES.inc(year=_metric_year(year), source='gpa_fallback')
+        result = _fallback_result(avg_score)
+        logger.info("Kết quả cuối cùng: %s (dựa trên GPA dự phòng)", result['message'])
+        return result
+
+# Hàm dự đoán kết quả tốt nghiệp cho nhiều sinh viên cùng năm học
+# Chỉ dựng một ma trận đặc trưng và gọi model.predict một lần cho cả nhóm
+def predict_graduation_batch(year, students_scores, program=None):
+    if not students_scores:
+        return []
+    with STAGE_LATENCY.time(stage='gpa'):
+        avg_scores = _program_catalog(program).weighted_averages(students_scores, LETTER_TO_NUMERIC).tolist()
+
+    (program or _default_program).registry.check()
+    version = _model_version(year, program)
+    if version is None:
+        logger.warning("Không tải được mô hình cho năm %s, sử dụng GPA dự phòng cho %d sinh viên", year, len(students_scores))
+        PREDICTION_OUTCOMES.inc(len(students_scores), year=_metric_year(year), source='gpa_fallback')
+        return [_fallback_result(avg_score) for avg_score in avg_scores]
+
+    try:
+        with STAGE_LATENCY.time(stage='alignment'):
+            features = version.encoder.encode_many(students_scores)
+        with STAGE_LATENCY.time(stage='predict'):
+            predictions = None
+            if _use_inference_pool(version):
+                try:
+                    predictions = _inference_pool.predict_many(
+                        year, features, timeout=INFERENCE_TIMEOUT,
+                        version=version.version, model_path=version.source_path
+                    )
+                except Exception as e:
+                    logger.warning("Pool suy luận lỗi với mô hình năm %s: %s, dự đoán trong tiến trình", year, str(e))
+            if predictions is None:
+                predictions = _predict_with_confidence(version.model, version.encoder, features)
+    except Exception as e:
+        logger.error("Lỗi khi dự đoán hàng loạt với mô hình năm %s: %s, sử dụng GPA dự phòng", year, str(e))
+        PREDICTION_OUTCOMES.inc(len(students_scores), year=_metric_year(year), source='gpa_fallback')
+        return [_fallback_result(avg_score) for avg_score in avg_scores]
+
+    results = []
+    invalid_count = 0
+    for (prediction, confidence), avg_score in zip(predictions, avg_scores):
+        result = _model_result(prediction, avg_score, version.version, confidence)
+        if not result:
+            invalid_count += 1
+            result = _fallback_result(avg_score)
+        results.append(result)
+    PREDICTION_OUTCOMES.inc(len(results) - invalid_count, year=_metric_year(year), source='model')
+    if invalid_count:
+        PREDICTION_OUTCOMES.inc(invalid_count, year=_metric_year(year), source='gpa_fallback')
+        logger.warning("Mô hình năm %s trả về %d dự đoán không hợp lệ, sử dụng GPA dự phòng", year, invalid_count)
+    logger.info("Mô hình năm %s (phiên bản %s) đã dự đoán hàng loạt cho %d sinh viên", year, version.version, len(results))
+    return results
+
+# Bắt đầu profile request nếu được chọn (đăng ký trước các hook khác để tính cả chúng);
+# không profile chính endpoint tổng hợp kết quả
+@app.before_request
+def _start_request_profile():
+    if _profiler.enabled and request.endpoint != 'profiling_summary':
+        g.profile = _profiler.start(request.headers)
+
+# Năm học của request để nhóm kết quả profiling (body JSON đã được Flask cache khi parse).
+# Chỉ các năm có mô hình được giữ nguyên, năm khác gộp vào 'other' để số nhóm và số
+# file profile không tăng theo giá trị client gửi lên.
+def _request_year():
+    data = request.get_json(silent=True) if request.is_json else None
+    year = data.get('year') if isinstance(data, dict) else None
+    year = year or request.args.get('year')
+    if not year:
+        return '-'
+    return year if isinstance(year, str) and year in MODEL_PATHS else 'other'
+
+@app.teardown_request
+def _finish_request_profile(exc):
+    session = g.pop('profile', None)
+    if session is not None:
+        _profiler.stop(session, request.endpoint or 'unmatched', _request_year())
+
+# Kiểm tra file Excel thay đổi (có giới hạn tần suất) trước mỗi request
+@app.before_request
+def _refresh_curriculum():
+    g.request_started = time.perf_counter()
+    _apply_curriculum(_curriculum.get())
+
+@app.after_request
+def _record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+    if 'first_request' not in STARTUP_PHASES:
+        STARTUP_PHASES['first_request'] = time.perf_counter() - _import_started
+        logger.info("Thời gian khởi động: %s", startup_report()['phases'])
+    return response
+
+# Báo cáo thời gian khởi động của tiến trình hiện tại
+def startup_report():
+    return {
+        'pid': os.getpid(),
+        'phases': {phase: round(seconds, 4) for phase, seconds in STARTUP_PHASES.items()},
+        'heavy_modules_loaded': {name: name in sys.modules for name in HEAVY_MODULES},
+        'native_predictors': sorted(
+            year for year in MODEL_PATHS
+            if year in _model_registry and hasattr(_model_registry.get(year).model, 'predict_encoded')
+        ),
+    }
 
 @app.route('/')
 def index():
@@ -280,13 +787,100 @@ def send_js(path):
 def send_data(path):
     return send_from_directory('data', path)
 
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    models = {year: _model_state(year) for year in MODEL_PATHS}
+    if not models_ready():
+        # Worker chạy không qua gunicorn/asgi (không ai gọi start_model_warmup) vẫn tự tải
+        # mô hình thay vì trả 503 mãi; năm bị lỗi được thử tải lại ở lần kiểm tra sau
+        _ensure_model_warmup()
+    # Lỗi ghi bài nộp không chặn dự đoán nên chỉ báo cáo, không làm worker mất sẵn sàng
+    submissions = _submission_store.stats()
+    if models_ready():
+        return jsonify({'status': 'ready', 'models': models, 'submission_writer': submissions})
+    return jsonify({'status': 'not_ready', 'models': models, 'submission_writer': submissions}), 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/startup', methods=['GET'])
+def startup_stats():
+    return jsonify(startup_report())
+
+# Phiên bản mô hình đang phục vụ/phiên bản trước của worker hiện tại
+@app.route('/api/models', methods=['GET'])
+def model_versions():
+    program, error = _request_program(request.args.get('program'))
+    if error:
+        return error
+    return jsonify({'pid': os.getpid(), 'program': program.name, **program.registry.stats()})
+
+# Token quản trị cho các thao tác thay đổi trạng thái server (rollback mô hình),
+# gửi qua header X-Admin-Token; không đặt ADMIN_TOKEN thì các thao tác này bị tắt
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+# None nếu request có token quản trị hợp lệ, ngược lại là response lỗi
+def _require_admin():
+    if not ADMIN_TOKEN:
+        return jsonify({'status': 'error', 'message': "Thao tác quản trị bị tắt (chưa đặt ADMIN_TOKEN)."}), 403
+    token = request.headers.get(ADMIN_TOKEN_HEADER, '')
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        logger.warning("Từ chối thao tác quản trị %s từ %s", request.path, request.remote_addr)
+        return jsonify({'status': 'error', 'message': f"Thiếu hoặc sai header {ADMIN_TOKEN_HEADER}."}), 401
+    return None
+
+# Quay về phiên bản mô hình trước đó (cần token quản trị). Registry nằm trong từng tiến trình nên
+# với nhiều worker gunicorn, thao tác chỉ áp dụng cho worker nhận request.
+@app.route('/api/models/<year>/rollback', methods=['POST'])
+def rollback_model(year):
+    error = _require_admin()
+    if error:
+        return error
+    program, error = _request_program(request.args.get('program'))
+    if error:
+        return error
+    version = program.registry.rollback(year)
+    if version is None:
+        return jsonify({'status': 'error', 'message': f"Không có phiên bản trước để rollback cho năm {year}"}), 404
+    return jsonify({'status': 'success', 'pid': os.getpid(), 'program': program.name, 'year': year, 'model_version': version.version})
+
+# Các chương trình đào tạo có sẵn và đang được giữ trong bộ nhớ của worker này
+@app.route('/api/programs', methods=['GET'])
+def list_programs():
+    return jsonify({'pid': os.getpid(), **_programs.stats()})
+
+# Các hàm tốn thời gian nhất theo endpoint và năm (?endpoint=&year=&limit=&sort=tottime|cumtime)
+@app.route('/api/profiling', methods=['GET'])
+def profiling_summary():
+    sort = request.args.get('sort', 'tottime')
+    if sort not in ('tottime', 'cumtime'):
+        return jsonify({'status': 'error', 'message': "Tham số 'sort' phải là 'tottime' hoặc 'cumtime'."}), 400
+    return jsonify(_profiler.summary(
+        endpoint=request.args.get('endpoint'), year=request.args.get('year'),
+        limit=request.args.get('limit', 20, type=int), sort=sort
+    ))
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(_prediction_cache.stats())
+
 @app.route('/api/subjects', methods=['GET'])
 def get_subjects():
     try:
-        with open('./web_version/data/subjects.json', 'r', encoding='utf-8') as f:
-            subjects_data = json.load(f)
-        logger.info("Đã gửi dữ liệu môn học từ subjects.json")
-        return jsonify(subjects_data)
+        # Phục vụ nội dung JSON đã tuần tự hóa sẵn; trình duyệt/proxy nhận 304 nếu ETag khớp
+        program, error = _request_program(request.args.get('program'))
+        if error:
+            return error
+        snapshot = program.curriculum.get()
+        response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.last_modified = snapshot.last_modified
+        response.cache_control.no_cache = True
+        response = response.make_conditional(request)
+        logger.debug("Đã gửi dữ liệu môn học (HTTP %d)", response.status_code)
+        return response
     except Exception as e:
         logger.error("Lỗi khi đọc subjects.json: %s", str(e))
         return jsonify({'error': str(e)}), 500
@@ -294,38 +888,328 @@ def get_subjects():
 @app.route('/api/submit', methods=['POST'])
 def submit_scores():
     try:
-        data = request.get_json()
+        with STAGE_LATENCY.time(stage='json_parse'):
+            data = _request_data()
+        if compact_format.is_compact(data):
+            return _submit_compact(data)
         scores = data.get('scores', [])
         year = data.get('year', 'nam1')
+        program, error = _request_program(data.get('program'))
+        if error:
+            return error
         
         # Validate and ensure scores are letter grades
+        with STAGE_LATENCY.time(stage='validation'):
+            out_of_range = _apply_numeric_grades([scores])
+            if out_of_range:
+                return jsonify({'status': 'error', 'message': _score_range_message(out_of_range[0])}), 400
+            for score in scores:
+                letter_grade = score['score']
+                if letter_grade not in LETTER_TO_NUMERIC:
+                    return jsonify({'status': 'error', 'message': f"Điểm {letter_grade} không hợp lệ. Điểm phải là A, B, C, D hoặc F."}), 400
+                logger.debug("Đã nhận điểm chữ %s cho môn %s", letter_grade, score['subjectCode'])
+        
+        # Lưu dữ liệu (ghi nền, không chờ đĩa)
+        _submission_store.append(data)
+        logger.info("Đã đưa bài nộp vào hàng đợi lưu trữ")
+        
+        # Thực hiện dự đoán
+        prediction_result = predict_graduation(year, scores, program)
+        
+        with STAGE_LATENCY.time(stage='serialization'):
+            return jsonify(prediction_result)
+    except compact_format.CompactFormatError as e:
+        return _compact_error(e)
+    except Exception as e:
+        logger.error("Lỗi trong submit_scores: %s", str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# /api/submit với định dạng gọn (xem compact_format): chuỗi điểm theo chỉ mục khung
+# chương trình được giải mã thẳng thành GPA và hàng đặc trưng của mô hình
+def _submit_compact(data):
+    year = data.get('year', 'nam1')
+    program, error = _request_program(data.get('program'))
+    if error:
+        return error
+    snapshot = program.curriculum.get()
+    with STAGE_LATENCY.time(stage='validation'):
+        codes = compact_format.decode_grades(data, snapshot)
+    
+    # Lưu bài nộp ở dạng chuỗi điểm chuẩn hóa (msgpack có thể gửi mảng byte)
+    _submission_store.append({
+        'year': year, 'program': program.name, 'curriculum': snapshot.etag,
+        'grades': compact_format.grades_text(codes)
+    })
+    
+    with STAGE_LATENCY.time(stage='gpa'):
+        avg_score = compact_format.weighted_average(codes, snapshot.catalog)
+    prediction_result = _predict_graduation(
+        year, avg_score,
+        lambda version: compact_format.encode_features(codes, snapshot.catalog, version.encoder),
+        program
+    )
+    with STAGE_LATENCY.time(stage='serialization'):
+        return jsonify(prediction_result)
+
+@app.route('/api/predict-batch', methods=['POST'])
+def predict_batch():
+    try:
+        data = request.get_json()
+        students = data.get('students', [])
+        if not isinstance(students, list):
+            return jsonify({'status': 'error', 'message': "Trường 'students' phải là một danh sách."}), 400
+
+        # Nhóm sinh viên theo chương trình + năm học, mỗi nhóm dùng một mô hình
+        # ('program' của từng sinh viên, mặc định theo 'program' của request)
+        results = [None] * len(students)
+        groups = {}
+        out_of_range = _apply_numeric_grades([student.get('scores', []) for student in students])
+        for i, student in enumerate(students):
+            if i in out_of_range:
+                results[i] = {'status': 'error', 'message': _score_range_message(out_of_range[i])}
+                continue
+            scores = student.get('scores', [])
+            invalid = next((score['score'] for score in scores if score['score'] not in LETTER_TO_NUMERIC), None)
+            if invalid is not None:
+                results[i] = {'status': 'error', 'message': f"Điểm {invalid} không hợp lệ. Điểm phải là A, B, C, D hoặc F."}
+                continue
+            program = _programs.get(student.get('program', data.get('program')))
+            if program is None:
+                results[i] = {'status': 'error', 'message': f"Không có chương trình đào tạo {student.get('program', data.get('program'))}"}
+                continue
+            groups.setdefault((program, student.get('year', 'nam1')), []).append(i)
+
+        for (program, year), indices in groups.items():
+            predictions = predict_graduation_batch(year, [students[i].get('scores', []) for i in indices], program)
+            for i, result in zip(indices, predictions):
+                results[i] = result
+
+        for student, result in zip(students, results):
+            result['id'] = student.get('id')
+            result['year'] = student.get('year', 'nam1')
+
+        logger.info("Đã dự đoán hàng loạt cho %d sinh viên (%d nhóm chương trình/năm học)", len(students), len(groups))
+        return jsonify({'status': 'success', 'count': len(results), 'results': results})
+    except Exception as e:
+        logger.error("Lỗi trong predict_batch: %s", str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Số môn tối đa được nâng điểm khi tìm đường lên loại kế tiếp
+WHAT_IF_MAX_CHANGES = int(os.environ.get('WHAT_IF_MAX_CHANGES', '5'))
+
+# Phân tích "nếu... thì": đổi điểm từng môn (A-F) thì loại tốt nghiệp dự đoán thay đổi ra sao,
+# và cần nâng điểm tối thiểu bao nhiêu môn để lên loại kế tiếp
+@app.route('/api/what-if', methods=['POST'])
+def what_if():
+    try:
+        data = request.get_json()
+        scores = data.get('scores', [])
+        year = data.get('year', 'nam1')
+        max_changes = data.get('max_changes', WHAT_IF_MAX_CHANGES)
+        if isinstance(max_changes, bool) or not isinstance(max_changes, int) or max_changes < 0:
+            return jsonify({'status': 'error', 'message': "Trường 'max_changes' phải là số nguyên không âm."}), 400
+        max_changes = min(max_changes, WHAT_IF_MAX_CHANGES)
+        program, error = _request_program(data.get('program'))
+        if error:
+            return error
+        catalog = _program_catalog(program)
+        
+        out_of_range = _apply_numeric_grades([scores])
+        if out_of_range:
+            return jsonify({'status': 'error', 'message': _score_range_message(out_of_range[0])}), 400
         for score in scores:
             letter_grade = score['score']
             if letter_grade not in LETTER_TO_NUMERIC:
                 return jsonify({'status': 'error', 'message': f"Điểm {letter_grade} không hợp lệ. Điểm phải là A, B, C, D hoặc F."}), 400
-            logger.debug("Đã nhận điểm chữ %s cho môn %s", letter_grade, score['subjectCode'])
         
-        # Lưu dữ liệu
-        os.makedirs('data', exist_ok=True)
-        with open('data/submissions.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info("Đã lưu dữ liệu vào submissions.json")
+        program.registry.check()
+        version = _model_version(year, program)
+        if version is None:
+            return jsonify({'status': 'error', 'message': f"Không tải được mô hình cho năm {year}"}), 503
         
-        # Thực hiện dự đoán
-        prediction_result = predict_graduation(year, scores)
+        model, encoder = version.model, version.encoder
+        with STAGE_LATENCY.time(stage='alignment'):
+            base_row = encoder.encode(scores)[0]
+            # Chỉ thay đổi các môn sinh viên có thể nhập (tên khớp khung chương trình)
+            columns = [i for i, name in enumerate(encoder.feature_names) if name in catalog.by_name]
+        with STAGE_LATENCY.time(stage='what_if'):
+            analysis = analyze_what_if(
+                base_row, columns,
+                predict_scores=lambda matrix: predict_with_confidence(model, matrix, encoder.to_frame),
+                classes=list(model.classes_),
+                max_changes=max_changes
+            )
         
-        return jsonify(prediction_result)
+        taken = {score['subjectName'] for score in scores}
+        def describe(change):
+            name = encoder.feature_names[change.pop('column')]
+            record = catalog.get_by_name(name)
+            return {'subjectName': name, 'subjectCode': record.code if record else None, 'taken': name in taken, **change}
+        
+        analysis['flips'] = [describe(flip) for flip in analysis['flips']]
+        if analysis['next_tier'] is not None:
+            analysis['next_tier']['changes'] = [describe(change) for change in analysis['next_tier']['changes']]
+        logger.info("Phân tích what-if năm %s: %d phương án, %d phương án đổi loại", year, analysis['evaluated'], len(analysis['flips']))
+        return jsonify({'status': 'success', 'year': year, 'model_version': version.version, **analysis})
     except Exception as e:
-        logger.error("Lỗi trong submit_scores: %s", str(e))
+        logger.error("Lỗi trong what_if: %s", str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Kết quả dự đoán từ trạng thái tăng dần: GPA lấy từ tổng đang chạy, chỉ gọi predict
+# trên hàng đặc trưng đã lưu (kết quả GPA dự phòng nếu không có mô hình)
+def _student_state_result(state, version, features):
+    avg_score = state.weighted_points / state.credits if state.credits > 0 else 0
+    year = version.year if version is not None else None
+    result = None
+    if version is not None and features is not None:
+        try:
+            prediction, confidence, _ = _predict_row(version, features.reshape(1, -1))
+            result = _model_result(prediction, avg_score, version.version, confidence)
+        except Exception as e:
+            logger.error("Lỗi khi dự đoán với mô hình năm %s: %s, sử dụng GPA dự phòng", year, str(e))
+    if result is None:
+        result = _fallback_result(avg_score)
+    if year is not None:
+        PREDICTION_OUTCOMES.inc(year=_metric_year(year), source='model' if result['model_version'] else 'gpa_fallback')
+    result.update({'student_id': state.student_id, 'revision': state.revision, 'subjects': state.subjects})
+    return result
+
+# Cập nhật điểm tăng dần: body {year, program, revision, replace, changes: [{subjectName, score | original_score}]},
+# score null xóa môn. revision là phiên bản trạng thái client đã nhận (0 nếu chưa
+# gửi lần nào); lệch với server thì trả 409 và client gửi lại toàn bộ bảng điểm
+# với replace=true (các môn không có trong changes bị xóa). Chỉ các môn thay đổi được ghi; GPA và hàng đặc trưng được
+# cập nhật theo phần chênh lệch nên chi phí không phụ thuộc số học kỳ đã nhập.
+@app.route('/api/students/<student_id>/grades', methods=['POST'])
+def update_student_grades(student_id):
+    try:
+        token, error = _student_token(student_id)
+        if error:
+            return error
+        data = request.get_json()
+        changes = data.get('changes', [])
+        year = data.get('year', 'nam1')
+        if not isinstance(changes, list):
+            return jsonify({'status': 'error', 'message': "Trường 'changes' phải là một danh sách."}), 400
+        expected_revision = data.get('revision')
+        if expected_revision is not None and (
+                isinstance(expected_revision, bool) or not isinstance(expected_revision, int) or expected_revision < 0):
+            return jsonify({'status': 'error', 'message': "Trường 'revision' phải là số nguyên không âm."}), 400
+        replace = data.get('replace', False)
+        if not isinstance(replace, bool):
+            return jsonify({'status': 'error', 'message': "Trường 'replace' phải là true hoặc false."}), 400
+        program, error = _request_program(data.get('program'))
+        if error:
+            return error
+        
+        with STAGE_LATENCY.time(stage='validation'):
+            out_of_range = _apply_numeric_grades([changes])
+            if out_of_range:
+                return jsonify({'status': 'error', 'message': _score_range_message(out_of_range[0])}), 400
+            for change in changes:
+                if not change.get('subjectName'):
+                    return jsonify({'status': 'error', 'message': "Mỗi thay đổi phải có 'subjectName'."}), 400
+                letter_grade = change.get('score')
+                if isinstance(letter_grade, str):
+                    letter_grade = change['score'] = letter_grade.upper()
+                if letter_grade is not None and letter_grade not in LETTER_TO_NUMERIC:
+                    return jsonify({'status': 'error', 'message': f"Điểm {letter_grade} không hợp lệ. Điểm phải là A, B, C, D hoặc F."}), 400
+        
+        catalog = _program_catalog(program)
+        entries = []
+        for change in changes:
+            record = catalog.get_by_name(change['subjectName'])
+            # Môn ngoài khung chương trình không tính vào GPA (như calculate_weighted_average)
+            entries.append((change['subjectName'], change.get('score'), record.credits if record else 0))
+        
+        program.registry.check()
+        version = _model_version(year, program)
+        with STAGE_LATENCY.time(stage='state'):
+            state, features = _student_states.update(
+                student_id, program.name, entries, token, year=year,
+                model_version=version.version if version else None,
+                encoder=version.encoder if version else None,
+                expected_revision=expected_revision, replace=replace
+            )
+        _submission_store.append({
+            'student_id': student_id, 'program': program.name, 'year': year, 'replace': replace, 'changes': changes
+        })
+        result = _student_state_result(state, version, features)
+        logger.info("Sinh viên %s: %d thay đổi, phiên bản %d, %s", student_id, len(changes), state.revision, result['message'])
+        return jsonify(result)
+    except RevisionConflict as e:
+        logger.warning("Sinh viên %s: %s, yêu cầu gửi lại toàn bộ bảng điểm", student_id, str(e))
+        return jsonify({'status': 'error', 'message': str(e), 'revision': e.actual}), 409
+    except StateAccessDenied as e:
+        logger.warning("Sinh viên %s: từ chối cập nhật: %s", student_id, str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 403
+    except Exception as e:
+        logger.error("Lỗi trong update_student_grades: %s", str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Trạng thái hiện tại và dự đoán cho năm ?year= (không gửi lại điểm)
+@app.route('/api/students/<student_id>', methods=['GET'])
+def get_student_state(student_id):
+    try:
+        token, error = _student_token(student_id)
+        if error:
+            return error
+        program, error = _request_program(request.args.get('program'))
+        if error:
+            return error
+        year = request.args.get('year', 'nam1')
+        program.registry.check()
+        version = _model_version(year, program)
+        state, features = _student_states.get(
+            student_id, program.name, token, year=year,
+            model_version=version.version if version else None,
+            encoder=version.encoder if version else None
+        )
+        if state is None:
+            return jsonify({'status': 'error', 'message': f"Không có trạng thái cho sinh viên {student_id}"}), 404
+        return jsonify(_student_state_result(state, version, features))
+    except StateAccessDenied as e:
+        logger.warning("Sinh viên %s: từ chối đọc trạng thái: %s", student_id, str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 403
+    except Exception as e:
+        logger.error("Lỗi trong get_student_state: %s", str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/students/<student_id>', methods=['DELETE'])
+def delete_student_state(student_id):
+    try:
+        token, error = _student_token(student_id)
+        if error:
+            return error
+        program, error = _request_program(request.args.get('program'))
+        if error:
+            return error
+        if not _student_states.delete(student_id, program.name, token):
+            return jsonify({'status': 'error', 'message': f"Không có trạng thái cho sinh viên {student_id}"}), 404
+        return jsonify({'status': 'success', 'student_id': student_id})
+    except StateAccessDenied as e:
+        logger.warning("Sinh viên %s: từ chối xóa trạng thái: %s", student_id, str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 403
+    except Exception as e:
+        logger.error("Lỗi trong delete_student_state: %s", str(e))
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/export-excel', methods=['POST'])
 def export_excel():
     try:
-        data = request.get_json()
-        scores = data.get('scores', [])
+        data = _request_data()
         year = data.get('year', 'nam1')
-        avg_score = calculate_weighted_average(scores)
+        program, error = _request_program(data.get('program'))
+        if error:
+            return error
+        if compact_format.is_compact(data):
+            snapshot = program.curriculum.get()
+            scores = compact_format.expand_scores(compact_format.decode_grades(data, snapshot), snapshot.catalog)
+        else:
+            scores = data.get('scores', [])
+        out_of_range = _apply_numeric_grades([scores])
+        if out_of_range:
+            return jsonify({'status': 'error', 'message': _score_range_message(out_of_range[0])}), 400
+        avg_score = calculate_weighted_average(scores, _program_catalog(program))
         
         # Validate that scores are letter grades
         for score in scores:
@@ -333,7 +1217,15 @@ def export_excel():
             if letter_grade not in LETTER_TO_NUMERIC:
                 return jsonify({'status': 'error', 'message': f"Điểm {letter_grade} không hợp lệ. Điểm phải là A, B, C, D hoặc F."}), 400
         
-        # Tạo workbook
+        # Chế độ nhanh: workbook write-only với style dùng chung, trả về dạng luồng
+        if data.get('mode', request.args.get('mode')) == 'fast':
+            excel_file = write_scores_workbook([{'scores': scores}], [avg_score])
+            logger.info("Đã xuất file Excel (chế độ nhanh) cho năm %s", year)
+            return send_file(excel_file, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                             download_name=f'ket-qua-diem-{year}.xlsx')
+        
+        # Tạo workbook (openpyxl chỉ được import khi có request xuất file)
+        import openpyxl
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.title = "Kết quả điểm"
@@ -411,15 +1303,49 @@ def export_excel():
         
         logger.info("Đã xuất file Excel cho năm %s", year)
         return response
+    except compact_format.CompactFormatError as e:
+        return _compact_error(e)
     except Exception as e:
         logger.error("Lỗi trong export_excel: %s", str(e))
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/export-excel-batch', methods=['POST'])
+def export_excel_batch():
+    try:
+        data = request.get_json()
+        students = data.get('students', [])
+        layout = data.get('layout', 'sheets')
+        if not isinstance(students, list) or not students:
+            return jsonify({'status': 'error', 'message': "Trường 'students' phải là một danh sách không rỗng."}), 400
+        if layout not in ('sheets', 'class'):
+            return jsonify({'status': 'error', 'message': "Trường 'layout' phải là 'sheets' hoặc 'class'."}), 400
+        program, error = _request_program(data.get('program'))
+        if error:
+            return error
+
+        out_of_range = _apply_numeric_grades([student.get('scores', []) for student in students])
+        if out_of_range:
+            return jsonify({'status': 'error', 'message': _score_range_message(next(iter(out_of_range.values())))}), 400
+        for student in students:
+            for score in student.get('scores', []):
+                letter_grade = score['score']
+                if letter_grade not in LETTER_TO_NUMERIC:
+                    return jsonify({'status': 'error', 'message': f"Điểm {letter_grade} không hợp lệ. Điểm phải là A, B, C, D hoặc F."}), 400
+
+        avg_scores = _program_catalog(program).weighted_averages([student.get('scores', []) for student in students], LETTER_TO_NUMERIC)
+        excel_file = write_scores_workbook(students, avg_scores.tolist(), layout=layout)
+        logger.info("Đã xuất file Excel cho %d sinh viên (layout %s)", len(students), layout)
+        return send_file(excel_file, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                         download_name='ket-qua-diem-lop.xlsx')
+    except Exception as e:
+        logger.error("Lỗi trong export_excel_batch: %s", str(e))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+STARTUP_PHASES['import'] = time.perf_counter() - _import_started
+
 if __name__ == '__main__':
-    os.makedirs('data', exist_ok=True)
-    if not os.path.exists('data/submissions.json'):
-        with open('data/submissions.json', 'w', encoding='utf-8') as f:
-            json.dump([], f)
     read_excel_to_json()
+    preload_models()
+    start_model_warmup()
     logger.info("Khởi tạo ứng dụng và tạo subjects.json")
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
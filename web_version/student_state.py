@@ -0,0 +1,342 @@
+# Trạng thái điểm tăng dần của từng sinh viên (theo mã sinh viên hoặc mã phiên), lưu trên SQLite.
+#
+# Thay vì gửi lại toàn bộ bảng điểm mỗi lần nhập thêm học kỳ, client chỉ gửi các môn
+# thêm/sửa/xóa. Kho giữ tổng điểm có trọng số tín chỉ và tổng tín chỉ đang chạy,
+# điểm từng môn (một hàng mỗi môn) và hàng đặc trưng đã căn chỉnh theo mô hình của
+# từng năm (chuỗi điểm chữ, mỗi đặc trưng một ký tự). Mỗi lần cập nhật chỉ đọc/ghi
+# các môn thay đổi nên chi phí không tăng theo số học kỳ; hàng đặc trưng chỉ dựng
+# lại từ đầu khi phiên bản mô hình thay đổi hoặc khi điểm đã đổi trong lúc client
+# dự đoán cho năm khác (mỗi thay đổi xóa hàng đặc trưng đã lưu của các năm còn lại).
+# Client gửi kèm phiên bản trạng thái mong đợi; nếu trạng thái trên server đã mất
+# (hết hạn, instance khác, DB bị xóa) hoặc lệch, server báo xung đột để client gửi
+# lại toàn bộ bảng điểm với replace=True.
+# Mỗi trạng thái thuộc về token của client đã tạo ra nó (chỉ lưu sha256 của token):
+# đọc, cập nhật hay xóa đều phải gửi đúng token đó.
+import hashlib
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from .grading import LETTER_TO_NUMERIC
+except ImportError:
+    from grading import LETTER_TO_NUMERIC
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS student_states (
+    student_id TEXT NOT NULL,
+    program TEXT NOT NULL,
+    weighted_points REAL NOT NULL,
+    credits REAL NOT NULL,
+    subjects INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    owner_hash TEXT,
+    PRIMARY KEY (student_id, program)
+);
+CREATE INDEX IF NOT EXISTS student_states_updated_at ON student_states (updated_at);
+CREATE TABLE IF NOT EXISTS student_grades (
+    student_id TEXT NOT NULL,
+    program TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    letter TEXT NOT NULL,
+    credits REAL NOT NULL,
+    PRIMARY KEY (student_id, program, subject)
+);
+CREATE TABLE IF NOT EXISTS student_features (
+    student_id TEXT NOT NULL,
+    program TEXT NOT NULL,
+    year TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    letters TEXT NOT NULL,
+    PRIMARY KEY (student_id, program, year)
+);
+"""
+
+# weighted_points / credits là GPA hệ 4; subjects là số môn đã có điểm
+StudentState = namedtuple(
+    'StudentState', ['student_id', 'program', 'weighted_points', 'credits', 'subjects', 'revision', 'updated_at']
+)
+
+
+# Phiên bản trạng thái trên server khác phiên bản client mong đợi
+class RevisionConflict(Exception):
+    def __init__(self, expected, actual):
+        super().__init__(f"Phiên bản trạng thái là {actual}, client mong đợi {expected}")
+        self.expected = expected
+        self.actual = actual
+
+
+# Token gửi kèm không phải token đã tạo trạng thái
+class StateAccessDenied(Exception):
+    pass
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _connect(db_path):
+    # isolation_level=None: tự quản lý transaction bằng BEGIN IMMEDIATE
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    conn.executescript(_SCHEMA)
+    # DB tạo trước khi có cột owner_hash; trạng thái cũ chưa có chủ cho tới lần cập nhật kế tiếp
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(student_states)')}
+    if 'owner_hash' not in columns:
+        try:
+            conn.execute('ALTER TABLE student_states ADD COLUMN owner_hash TEXT')
+        except sqlite3.OperationalError as e:
+            # Worker khác vừa thêm cột
+            if 'duplicate column' not in str(e):
+                raise
+    return conn
+
+
+class StudentStateStore:
+    # ttl: trạng thái không được cập nhật quá ttl giây sẽ bị xóa (kiểm tra tối đa mỗi purge_interval giây)
+    def __init__(self, db_path, ttl=30 * 86400, purge_interval=3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = time.monotonic()
+        self.updates = 0
+        self.rebuilds = 0
+
+    # Mỗi luồng (và mỗi tiến trình sau khi gunicorn fork) có kết nối riêng
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = _connect(self.db_path)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _read_state(conn, student_id, program):
+        row = conn.execute(
+            'SELECT weighted_points, credits, subjects, revision, updated_at FROM student_states '
+            'WHERE student_id = ? AND program = ?', (student_id, program)
+        ).fetchone()
+        if row is None:
+            return StudentState(student_id, program, 0.0, 0.0, 0, 0, None)
+        return StudentState(student_id, program, *row)
+
+    # Kiểm tra token của client với chủ của trạng thái; trả về sha256 token cần lưu.
+    # Trạng thái chưa có (hoặc chưa có chủ, tạo trước khi có cột owner_hash) chỉ được
+    # nhận chủ khi cập nhật (claim=True); đọc/xóa trạng thái chưa có chủ bị từ chối.
+    @staticmethod
+    def _check_owner(conn, student_id, program, token, claim):
+        row = conn.execute(
+            'SELECT owner_hash FROM student_states WHERE student_id = ? AND program = ?', (student_id, program)
+        ).fetchone()
+        token_hash = _token_hash(token)
+        if row is None or row[0] is None:
+            if row is not None and not claim:
+                raise StateAccessDenied("Trạng thái chưa có chủ, hãy gửi lại toàn bộ bảng điểm")
+            return token_hash
+        if not hmac.compare_digest(row[0], token_hash):
+            raise StateAccessDenied("Token không khớp với trạng thái của sinh viên này")
+        return row[0]
+
+    # Hàng đặc trưng cho (năm, phiên bản mô hình): áp các môn vừa đổi lên hàng đã lưu,
+    # hoặc dựng lại từ toàn bộ điểm nếu chưa có / mô hình đã đổi phiên bản
+    def _feature_row(self, conn, student_id, program, year, model_version, encoder, changed):
+        stored = conn.execute(
+            'SELECT model_version, letters FROM student_features WHERE student_id = ? AND program = ? AND year = ?',
+            (student_id, program, year)
+        ).fetchone()
+        if stored is not None and stored[0] == model_version and len(stored[1]) == len(encoder):
+            if not changed:
+                return np.array(list(stored[1]), dtype=object)
+            row = list(stored[1])
+            for subject, letter in changed.items():
+                i = encoder.index.get(subject)
+                if i is not None:
+                    row[i] = letter or encoder.default
+        else:
+            self.rebuilds += 1
+            row = [encoder.default] * len(encoder)
+            for subject, letter in conn.execute(
+                'SELECT subject, letter FROM student_grades WHERE student_id = ? AND program = ?', (student_id, program)
+            ):
+                i = encoder.index.get(subject)
+                if i is not None:
+                    row[i] = letter
+        conn.execute(
+            'INSERT OR REPLACE INTO student_features (student_id, program, year, model_version, letters) VALUES (?, ?, ?, ?, ?)',
+            (student_id, program, year, model_version, ''.join(row))
+        )
+        return np.array(row, dtype=object)
+
+    # Áp dụng thay đổi điểm: changes = [(tên môn, điểm chữ hoặc None để xóa, số tín chỉ)].
+    # token: token của client; trạng thái mới thuộc về token này, trạng thái đã có chủ
+    # khác thì ném StateAccessDenied.
+    # expected_revision: phiên bản client đã thấy (trạng thái chưa có là 0); lệch thì
+    # ném RevisionConflict. replace=True: changes là toàn bộ bảng điểm, các môn khác bị xóa.
+    # Nếu có encoder thì trả về kèm hàng đặc trưng đã căn chỉnh cho (year, model_version).
+    # Trả về (StudentState mới, hàng đặc trưng hoặc None).
+    def update(self, student_id, program, changes, token, year=None, model_version=None, encoder=None,
+               expected_revision=None, replace=False):
+        latest = {}
+        for subject, letter, credits in changes:
+            latest[subject] = (letter, float(credits))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            owner_hash = self._check_owner(conn, student_id, program, token, claim=True)
+            state = self._read_state(conn, student_id, program)
+            if expected_revision is not None and expected_revision != state.revision:
+                raise RevisionConflict(expected_revision, state.revision)
+            if replace:
+                for (subject,) in conn.execute(
+                    'SELECT subject FROM student_grades WHERE student_id = ? AND program = ?', (student_id, program)
+                ).fetchall():
+                    latest.setdefault(subject, (None, 0.0))
+            weighted_points, total_credits, subjects = state.weighted_points, state.credits, state.subjects
+            previous = {}
+            if latest:
+                placeholders = ','.join('?' * len(latest))
+                previous = {
+                    subject: (letter, credits) for subject, letter, credits in conn.execute(
+                        f'SELECT subject, letter, credits FROM student_grades '
+                        f'WHERE student_id = ? AND program = ? AND subject IN ({placeholders})',
+                        (student_id, program, *latest)
+                    )
+                }
+            changed = {}
+            for subject, (letter, credits) in latest.items():
+                old = previous.get(subject)
+                if old is not None:
+                    if old == (letter, credits):
+                        continue
+                    weighted_points -= LETTER_TO_NUMERIC[old[0]] * old[1]
+                    total_credits -= old[1]
+                    subjects -= 1
+                if letter is None:
+                    if old is not None:
+                        conn.execute(
+                            'DELETE FROM student_grades WHERE student_id = ? AND program = ? AND subject = ?',
+                            (student_id, program, subject)
+                        )
+                        changed[subject] = None
+                    continue
+                weighted_points += LETTER_TO_NUMERIC[letter] * credits
+                total_credits += credits
+                subjects += 1
+                conn.execute(
+                    'INSERT OR REPLACE INTO student_grades (student_id, program, subject, letter, credits) VALUES (?, ?, ?, ?, ?)',
+                    (student_id, program, subject, letter, credits)
+                )
+                changed[subject] = letter
+
+            now = time.time()
+            state = StudentState(
+                student_id, program, weighted_points, max(total_credits, 0.0), subjects,
+                state.revision + (1 if changed or state.updated_at is None else 0), now
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO student_states '
+                '(student_id, program, weighted_points, credits, subjects, revision, updated_at, owner_hash) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (*state, owner_hash)
+            )
+            # Hàng đặc trưng đã lưu của các năm khác (và của năm này nếu không vá được
+            # vì chưa có mô hình) không còn khớp điểm hiện tại
+            if changed:
+                conn.execute(
+                    'DELETE FROM student_features WHERE student_id = ? AND program = ? AND year IS NOT ?',
+                    (student_id, program, year if encoder is not None else None)
+                )
+            features = None
+            if encoder is not None:
+                features = self._feature_row(conn, student_id, program, year, model_version, encoder, changed)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.updates += 1
+        self._maybe_purge()
+        return state, features
+
+    # Trạng thái hiện tại (None nếu chưa có); kèm hàng đặc trưng nếu có encoder
+    def get(self, student_id, program, token, year=None, model_version=None, encoder=None):
+        conn = self._conn()
+        state = self._read_state(conn, student_id, program)
+        if state.updated_at is None:
+            return None, None
+        self._check_owner(conn, student_id, program, token, claim=False)
+        if encoder is None:
+            return state, None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            features = self._feature_row(conn, student_id, program, year, model_version, encoder, {})
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return state, features
+
+    # Xóa trạng thái; False nếu chưa có, StateAccessDenied nếu token không phải của chủ
+    def delete(self, student_id, program, token):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._check_owner(conn, student_id, program, token, claim=False)
+            deleted = conn.execute(
+                'DELETE FROM student_states WHERE student_id = ? AND program = ?', (student_id, program)
+            ).rowcount
+            for table in ('student_grades', 'student_features'):
+                conn.execute(f'DELETE FROM {table} WHERE student_id = ? AND program = ?', (student_id, program))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return deleted > 0
+
+    # Xóa trạng thái đã lâu không cập nhật (mã phiên của trình duyệt không còn dùng)
+    def purge_expired(self, now=None):
+        cutoff = (now or time.time()) - self.ttl
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for table in ('student_grades', 'student_features'):
+                conn.execute(
+                    f'DELETE FROM {table} WHERE (student_id, program) IN '
+                    f'(SELECT student_id, program FROM student_states WHERE updated_at < ?)', (cutoff,)
+                )
+            purged = conn.execute('DELETE FROM student_states WHERE updated_at < ?', (cutoff,)).rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if purged:
+            logger.info("Đã xóa %d trạng thái sinh viên không cập nhật quá %.0f ngày", purged, self.ttl / 86400)
+        return purged
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            self.purge_expired()
+        except sqlite3.Error as e:
+            logger.error("Lỗi khi xóa trạng thái sinh viên hết hạn trong %s: %s", self.db_path, str(e))
+
+    def stats(self):
+        return {'db_path': self.db_path, 'updates': self.updates, 'feature_rebuilds': self.rebuilds}
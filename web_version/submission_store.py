@@ -0,0 +1,278 @@
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    year TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    imported_at REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    # WAL cho phép nhiều worker gunicorn cùng ghi nối tiếp và đọc song song
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    conn.executescript(_SCHEMA)
+    conn.commit()
+    return conn
+
+
+# Kho lưu bài nộp chỉ ghi nối tiếp (append-only) trên SQLite ở chế độ WAL.
+# Request chỉ đưa bản ghi vào hàng đợi; luồng ghi nền gom nhiều bản ghi
+# vào một transaction nên độ trễ submit không phụ thuộc vào đĩa.
+# Hàng đợi có giới hạn max_queue: khi đĩa chậm/lỗi và hàng đợi đầy, bài nộp mới bị
+# bỏ (đếm trong stats()['dropped']) thay vì làm tràn bộ nhớ hay chặn request.
+# Lỗi kết nối/ghi được log và thử lại tối đa max_retries lần (kết nối lại từ đầu,
+# chờ tăng dần) trước khi bỏ lô đó; luồng ghi không bao giờ dừng vì lỗi.
+class SubmissionStore:
+    def __init__(self, db_path, batch_size=200, flush_interval=0.5, max_queue=10000,
+                 max_retries=5, retry_interval=0.5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._written = 0
+        self._dropped = 0
+        self._write_errors = 0
+        self._last_error = None
+        atexit.register(self.close)
+
+    # Luồng ghi được khởi tạo theo từng tiến trình: sau khi gunicorn fork,
+    # worker không kế thừa luồng của master nên phải tạo lại
+    def _ensure_writer(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                if self._thread.is_alive():
+                    return
+                # Không nên xảy ra (_run bắt mọi lỗi), nhưng nếu luồng ghi đã chết thì tạo lại
+                # và giữ nguyên hàng đợi để không mất các bài nộp đang chờ
+                logger.error("Luồng ghi bài nộp đã dừng, khởi động lại")
+            else:
+                directory = os.path.dirname(self.db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+            self._thread.start()
+
+    # Đưa bài nộp vào hàng đợi ghi; False nếu hàng đợi đầy và bài nộp bị bỏ
+    def append(self, payload):
+        self._ensure_writer()
+        year = payload.get('year') if isinstance(payload, dict) else None
+        try:
+            self._queue.put_nowait((time.time(), year, json.dumps(payload, ensure_ascii=False)))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+                dropped = self._dropped
+            # Log thưa để không làm ngập log khi đĩa hỏng kéo dài
+            if dropped & (dropped - 1) == 0:
+                logger.error("Hàng đợi ghi bài nộp đầy (%d), đã bỏ %d bài nộp", self.max_queue, dropped)
+            return False
+        return True
+
+    def _run(self):
+        pending = self._queue
+        conn = None
+        running = True
+        while running:
+            try:
+                batch = [pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            # None là tín hiệu dừng do close() gửi
+            records = [item for item in batch if item is not None]
+            running = len(records) == len(batch)
+            if records:
+                conn = self._write(conn, records, retry=running)
+            for _ in batch:
+                pending.task_done()
+        if conn is not None:
+            conn.close()
+
+    # Ghi một lô, kết nối lại khi lỗi; trả về kết nối dùng cho lô sau (None nếu đã hỏng)
+    def _write(self, conn, records, retry=True):
+        attempt = 0
+        while True:
+            try:
+                if conn is None:
+                    conn = _connect(self.db_path)
+                with conn:
+                    conn.executemany('INSERT INTO submissions (created_at, year, payload) VALUES (?, ?, ?)', records)
+                with self._lock:
+                    self._written += len(records)
+                    self._last_error = None
+                return conn
+            except Exception as e:
+                attempt += 1
+                with self._lock:
+                    self._write_errors += 1
+                    self._last_error = str(e)
+                logger.error("Lỗi khi ghi %d bài nộp vào %s (lần %d): %s", len(records), self.db_path, attempt, str(e))
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    conn = None
+                if not retry or attempt >= self.max_retries:
+                    with self._lock:
+                        self._dropped += len(records)
+                    logger.error("Bỏ %d bài nộp sau %d lần ghi lỗi", len(records), attempt)
+                    return None
+                time.sleep(self.retry_interval * 2 ** (attempt - 1))
+
+    # Tình trạng luồng ghi của tiến trình hiện tại (cho /api/ready và /metrics).
+    # healthy=False khi luồng ghi đã chết hoặc lần ghi gần nhất lỗi.
+    def stats(self):
+        started = self._pid == os.getpid() and self._thread is not None
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'healthy': (not started or self._thread.is_alive()) and self._last_error is None,
+                'queued': self._queue.qsize() if started else 0,
+                'max_queue': self.max_queue,
+                'written': self._written,
+                'dropped': self._dropped,
+                'write_errors': self._write_errors,
+                'last_error': self._last_error,
+            }
+
+    # Chờ tới khi mọi bản ghi trong hàng đợi đã được ghi xuống đĩa
+    def flush(self):
+        if self._pid == os.getpid() and self._queue is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=10)
+        except queue.Full:
+            logger.error("Không dừng được luồng ghi bài nộp: hàng đợi vẫn đầy")
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    # Nhập bài nộp từ file JSON cũ (data/submissions.json của phiên bản trước khi có
+    # SQLite: một object hoặc một danh sách object). Mỗi nội dung file chỉ được nhập
+    # một lần (theo sha256) nên gọi lại khi khởi động hay từ nhiều worker đều an toàn.
+    # Trả về số bài nộp đã nhập (0 nếu không có file, file rỗng hoặc đã nhập trước đó).
+    def import_json(self, path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        data = json.loads(raw.decode('utf-8'))
+        items = data if isinstance(data, list) else [data]
+        created_at = os.path.getmtime(path)
+        records = [
+            (created_at, item.get('year') if isinstance(item, dict) else None, json.dumps(item, ensure_ascii=False))
+            for item in items
+        ]
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = _connect(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM legacy_imports WHERE sha256 = ?', (digest,)).fetchone():
+                conn.rollback()
+                return 0
+            conn.executemany('INSERT INTO submissions (created_at, year, payload) VALUES (?, ?, ?)', records)
+            conn.execute('INSERT INTO legacy_imports (sha256, path, imported_at, count) VALUES (?, ?, ?, ?)',
+                         (digest, os.path.abspath(path), time.time(), len(records)))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        logger.info("Đã nhập %d bài nộp từ %s vào %s", len(records), path, self.db_path)
+        return len(records)
+
+    # Đọc lại các bài nộp theo thứ tự id, theo từng lô để không nạp toàn bộ vào bộ nhớ
+    def iter_submissions(self, since_id=0, batch_size=1000):
+        if not os.path.exists(self.db_path):
+            return
+        conn = _connect(self.db_path)
+        try:
+            last_id = since_id
+            while True:
+                rows = conn.execute(
+                    'SELECT id, created_at, year, payload FROM submissions WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                for row_id, created_at, year, payload in rows:
+                    yield {'id': row_id, 'created_at': created_at, 'year': year, 'data': json.loads(payload)}
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    # Xuất bài nộp ra dạng JSON lines (mỗi dòng một bài nộp)
+    def export_jsonl(self, since_id=0):
+        for submission in self.iter_submissions(since_id=since_id):
+            yield json.dumps(submission, ensure_ascii=False) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xuất các bài nộp đã lưu ra JSON lines để huấn luyện lại mô hình")
+    parser.add_argument('--db', default=os.environ.get('SUBMISSIONS_DB_PATH', 'data/submissions.db'))
+    parser.add_argument('--since-id', type=int, default=0)
+    parser.add_argument('--output', '-o', help="File đầu ra (mặc định: stdout)")
+    parser.add_argument('--import-json', action='append', default=[], metavar='PATH',
+                        help="Nhập bài nộp từ file JSON cũ trước khi xuất (có thể lặp lại)")
+    args = parser.parse_args(argv)
+
+    store = SubmissionStore(args.db)
+    for path in args.import_json:
+        print(f"{path}: đã nhập {store.import_json(path)} bài nộp", file=sys.stderr)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for line in store.export_jsonl(since_id=args.since_id):
+            out.write(line)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
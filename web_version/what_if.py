@@ -0,0 +1,128 @@
+# Phân tích "nếu... thì": độ nhạy của kết quả dự đoán với từng điểm môn học.
+#
+# Từ hàng đặc trưng hiện tại của sinh viên, sinh một ma trận gồm mọi phương án
+# đổi đúng một môn sang một điểm chữ khác (số môn x 4 hàng) và dự đoán cả ma
+# trận trong một lần gọi. Để tìm số môn cần cải thiện để lên loại kế tiếp, mỗi
+# bước đánh giá mọi phương án nâng điểm một môn (một lần gọi cho cả ma trận, nhãn
+# và độ tin cậy cùng lúc) và chọn phương án làm tăng nhiều nhất xác suất (hoặc
+# biên quyết định) của loại mục tiêu. Tìm kiếm tham lam nên 'changes_needed' là
+# số môn của lộ trình tìm được, tức một cận trên (1 thì chắc chắn là tối thiểu);
+# có thể tồn tại lộ trình ít môn hơn.
+import numpy as np
+
+GRADE_LETTERS = ('A', 'B', 'C', 'D', 'F')
+
+# Thứ hạng điểm chữ, càng lớn càng tốt
+LETTER_RANK = {'F': 0, 'D': 1, 'C': 2, 'B': 3, 'A': 4}
+
+# Thứ tự các loại tốt nghiệp từ thấp đến cao
+TIER_ORDER = ("Ra trường không đúng hạn", "Trung Bình", "Khá", "Giỏi", "Xuất Sắc")
+TIER_RANK = {label: rank for rank, label in enumerate(TIER_ORDER)}
+
+
+# Ma trận (1 + số phương án) x số đặc trưng: hàng 0 là hiện trạng, mỗi hàng sau
+# đổi đúng một cột trong columns sang một điểm chữ khác. upgrades_only chỉ giữ
+# các phương án nâng điểm.
+def single_change_matrix(base_row, columns, upgrades_only=False):
+    changes = []
+    for col in columns:
+        current = base_row[col]
+        for letter in GRADE_LETTERS:
+            if letter == current:
+                continue
+            if upgrades_only and LETTER_RANK[letter] <= LETTER_RANK.get(current, -1):
+                continue
+            changes.append((col, letter))
+    matrix = np.empty((len(changes) + 1, len(base_row)), dtype=object)
+    matrix[:] = base_row
+    if changes:
+        rows = np.arange(1, len(changes) + 1)
+        matrix[rows, [col for col, _ in changes]] = [letter for _, letter in changes]
+    return matrix, changes
+
+
+# Mức độ gần loại mục tiêu của từng hàng: tổng xác suất các loại >= mục tiêu,
+# hoặc biên quyết định lớn nhất trong các loại đó
+def _target_scores(scores, score_type, target_columns):
+    if score_type == 'probability':
+        return scores[:, target_columns].sum(axis=1)
+    return scores[:, target_columns].max(axis=1)
+
+
+# Tìm tham lam một lộ trình nâng điểm (tối đa max_changes môn) để dự đoán đạt target_tier.
+def _greedy_path(base_row, columns, predict_scores, classes, target_rank, max_changes):
+    target_columns = np.array([TIER_RANK.get(label, -1) >= target_rank for label in classes])
+    row = np.array(base_row, dtype=object)
+    steps = []
+    for _ in range(max_changes):
+        matrix, changes = single_change_matrix(row, columns, upgrades_only=True)
+        if not changes:
+            break
+        labels, scores, score_type = predict_scores(matrix[1:])
+        reached = [i for i, label in enumerate(labels) if TIER_RANK.get(label, -1) >= target_rank]
+        if reached:
+            # Ưu tiên phương án đạt mục tiêu với mức nâng điểm nhỏ nhất
+            i = min(reached, key=lambda i: LETTER_RANK[changes[i][1]] - LETTER_RANK.get(row[changes[i][0]], 0))
+            steps.append((changes[i][0], row[changes[i][0]], changes[i][1]))
+            return steps, labels[i], True
+        if scores is None or scores.shape[1] != len(classes):
+            break
+        i = int(np.argmax(_target_scores(scores, score_type, target_columns)))
+        col, letter = changes[i]
+        steps.append((col, row[col], letter))
+        row[col] = letter
+    return steps, None, False
+
+
+# Phân tích đầy đủ cho một sinh viên.
+# base_row: hàng điểm chữ theo thứ tự đặc trưng của mô hình
+# columns: các cột được phép thay đổi (môn có trong khung chương trình)
+# predict_scores(matrix) -> (nhãn, điểm theo thứ tự classes hoặc None, loại điểm)
+def analyze(base_row, columns, predict_scores, classes, max_changes=5):
+    matrix, changes = single_change_matrix(base_row, columns)
+    labels, _, _ = predict_scores(matrix)
+    labels = list(labels)
+    current = labels[0]
+    current_rank = TIER_RANK.get(current, -1)
+
+    flips = []
+    for (col, letter), label in zip(changes, labels[1:]):
+        if label == current:
+            continue
+        flips.append({
+            'column': col,
+            'from': base_row[col],
+            'to': letter,
+            'classification': label,
+            'direction': 'up' if TIER_RANK.get(label, -1) > current_rank else 'down',
+        })
+
+    next_tier = None
+    if 0 <= current_rank < len(TIER_ORDER) - 1:
+        target_rank = current_rank + 1
+        upgrades = [
+            (i, col, letter) for i, ((col, letter), label) in enumerate(zip(changes, labels[1:]))
+            if TIER_RANK.get(label, -1) >= target_rank and LETTER_RANK[letter] > LETTER_RANK.get(base_row[col], -1)
+        ]
+        if upgrades:
+            # Đạt được chỉ với một môn: chọn mức nâng điểm nhỏ nhất
+            i, col, letter = min(upgrades, key=lambda u: LETTER_RANK[u[2]] - LETTER_RANK.get(base_row[u[1]], 0))
+            steps, reached_label, reachable = [(col, base_row[col], letter)], labels[i + 1], True
+        else:
+            steps, reached_label, reachable = _greedy_path(
+                base_row, columns, predict_scores, classes, target_rank, max_changes
+            )
+        next_tier = {
+            'target': TIER_ORDER[target_rank],
+            'reachable': reachable,
+            'classification': reached_label,
+            'changes_needed': len(steps) if reachable else None,
+            'changes': [{'column': col, 'from': old, 'to': new} for col, old, new in steps] if reachable else [],
+        }
+
+    return {
+        'classification': current,
+        'evaluated': len(changes),
+        'flips': flips,
+        'next_tier': next_tier,
+    }